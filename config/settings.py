@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -151,4 +152,49 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_FILTER_BACKEND': 'django_filters.rest_framework.DjangoFilterBackend',
-}
\ No newline at end of file
+    # Paginación por cursor (keyset) en todos los listados; ver core/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', 50)),
+}
+
+# Caché del plan activo por empresa (core/plans.py), en segundos. Sin CACHES
+# configurado cada proceso tiene su propio LocMemCache: un cambio de plan puede
+# tardar hasta PLAN_CACHE_TIMEOUT + PLAN_CACHE_LOCAL_TTL (330 s) en verse en los
+# demás workers; con un caché compartido, hasta PLAN_CACHE_LOCAL_TTL (30 s).
+PLAN_CACHE_TIMEOUT = 300
+PLAN_CACHE_LOCAL_TTL = 30
+PLAN_CACHE_MAX_ENTRIES = 1024
+
+# Estrategia para repartir los pedidos web entre sucursales (core/allocation.py)
+ORDER_ALLOCATION_STRATEGY = os.getenv('ORDER_ALLOCATION_STRATEGY', 'fewest_splits')
+
+# Duración (segundos) de la reserva de stock al agregar al carrito (core/reservations.py)
+CART_RESERVATION_TTL = int(os.getenv('CART_RESERVATION_TTL', 900))
+
+# Caché del catálogo de product_list_view por tenant y rol (core/product_cache.py), en segundos
+PRODUCT_LIST_CACHE_TIMEOUT = int(os.getenv('PRODUCT_LIST_CACHE_TIMEOUT', 600))
+PRODUCT_LIST_REBUILD_TIMEOUT = 10
+
+# Instrumentación de queries por request (core/middleware.py, core/instrumentation.py)
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', '1') == '1'
+QUERY_LOG_SAMPLE_RATE = float(os.getenv('QUERY_LOG_SAMPLE_RATE', 0.01))
+# En tests: exceder el presupuesto de queries de una vista lanza QueryBudgetExceeded
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', '0') == '1'
+
+# Trabajos en segundo plano (core/jobs.py, manage.py runworker)
+JOB_RESULTS_DIR = Path(os.getenv('JOB_RESULTS_DIR', BASE_DIR / 'job_results'))
+# Segundos sin latido (ver core/jobs.py Heartbeat) tras los cuales un trabajo en ejecución se considera abandonado
+JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', 600))
+JOB_MAX_ATTEMPTS = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.queries': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'core.jobs': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Subscription, Branch, Supplier, Product, Inventory, Sale, SaleItem, Order, OrderItem, Purchase, PurchaseItem, CartItem
+from .models import User, Subscription, Branch, Supplier, Product, Inventory, Sale, SaleItem, Order, OrderItem, Purchase, PurchaseItem, CartItem, SalesDailyRollup, Tenant, StockReservation
 
 # --- Usuario ---
 @admin.register(User)
@@ -63,6 +63,25 @@ class CartItemAdmin(admin.ModelAdmin):
     list_filter = ('user', 'added_at')
     search_fields = ['user__username', 'product__name']
 
+# --- Reservas de stock de carritos ---
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'product', 'quantity', 'expires_at')
+    search_fields = ['user__username', 'product__name']
+
+# --- Rollup diario de ventas (sólo lectura: se mantiene automáticamente) ---
+@admin.register(SalesDailyRollup)
+class SalesDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'branch', 'payment_method', 'total_amount', 'transactions', 'items')
+    list_filter = ('branch', 'payment_method', 'date')
+    readonly_fields = ('branch', 'date', 'payment_method', 'total_amount', 'transactions', 'items')
+
+# --- Tenants (empresas cliente) ---
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code', 'created_at')
+    search_fields = ['name', 'code']
+
 # --- Registros Simples (Ya no incluye Product porque se registró arriba) ---
 admin.site.register(Subscription)
 admin.site.register(Branch)
@@ -0,0 +1,236 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .ledger import record_movements
+from .models import Inventory, Order, OrderItem, Product
+from .reservations import held_quantities, release
+from .stock import InsufficientStock, apply_stock_decrement
+
+
+class AllocationStrategy:
+    """
+    Decide desde qué sucursales se despacha un pedido web.
+
+    `allocate` recibe la demanda por producto ({product_id: cantidad}) y las filas
+    de inventario candidatas ya bloqueadas ({product_id: [Inventory, ...]}, sólo
+    con stock > 0) y retorna {product_id: [(branch_id, cantidad), ...]}. Si un
+    producto no alcanza se asigna lo que haya; el motor detecta el faltante.
+    """
+    name = None
+
+    def allocate(self, demand, candidates):
+        raise NotImplementedError
+
+
+class FirstAvailableStrategy(AllocationStrategy):
+    """Recorre las sucursales por id y toma stock de la primera que tenga (comportamiento histórico)."""
+    name = 'first_available'
+
+    def branch_order(self, inventory):
+        return inventory.branch_id
+
+    def allocate(self, demand, candidates):
+        allocation = {}
+        for product_id, quantity in demand.items():
+            allocation[product_id] = picks = []
+            for inventory in sorted(candidates.get(product_id, []), key=self.branch_order):
+                if quantity <= 0:
+                    break
+                take = min(quantity, inventory.stock)
+                picks.append((inventory.branch_id, take))
+                quantity -= take
+        return allocation
+
+
+class PreferredBranchStrategy(FirstAvailableStrategy):
+    """
+    Igual que first_available, pero recorre primero las sucursales indicadas en
+    `branch_ids` y en ese orden (ej: la sucursal elegida por el cliente, o las
+    sucursales ordenadas por cercanía a la dirección de entrega).
+    """
+    name = 'preferred_branch'
+
+    def __init__(self, branch_ids=()):
+        self.rank = {branch_id: position for position, branch_id in enumerate(branch_ids)}
+
+    def branch_order(self, inventory):
+        return (self.rank.get(inventory.branch_id, len(self.rank)), inventory.branch_id)
+
+
+class FewestSplitsStrategy(AllocationStrategy):
+    """
+    Minimiza la cantidad de sucursales que participan en el despacho.
+
+    Greedy de cobertura: en cada ronda elige la sucursal que completa más líneas
+    pendientes (y, a igualdad, más unidades), le asigna todo lo que puede y repite
+    con lo que falte.
+    """
+    name = 'fewest_splits'
+
+    def allocate(self, demand, candidates):
+        stock = {
+            (inventory.branch_id, product_id): inventory.stock
+            for product_id, rows in candidates.items()
+            for inventory in rows
+        }
+        remaining = {product_id: quantity for product_id, quantity in demand.items() if quantity > 0}
+        allocation = {product_id: [] for product_id in demand}
+
+        while remaining:
+            score = defaultdict(lambda: [0, 0])
+            for (branch_id, product_id), available in stock.items():
+                needed = remaining.get(product_id)
+                if not needed or not available:
+                    continue
+                score[branch_id][0] += available >= needed
+                score[branch_id][1] += min(available, needed)
+            if not score:
+                break
+            best = max(score, key=lambda branch_id: (*score[branch_id], -branch_id))
+
+            for product_id in list(remaining):
+                take = min(remaining[product_id], stock.get((best, product_id), 0))
+                if not take:
+                    continue
+                allocation[product_id].append((best, take))
+                stock[(best, product_id)] -= take
+                remaining[product_id] -= take
+                if not remaining[product_id]:
+                    del remaining[product_id]
+        return allocation
+
+
+ALLOCATION_STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (FirstAvailableStrategy, PreferredBranchStrategy, FewestSplitsStrategy)
+}
+
+
+def get_strategy(name=None, **options):
+    """Instancia la estrategia `name` (por defecto settings.ORDER_ALLOCATION_STRATEGY)."""
+    name = name or settings.ORDER_ALLOCATION_STRATEGY
+    try:
+        return ALLOCATION_STRATEGIES[name](**options)
+    except KeyError:
+        raise ValueError(f"Estrategia de asignación desconocida: {name}")
+
+
+def place_order(lines, strategy=None, **order_fields):
+    """
+    Crea un pedido web descontando stock de una o más sucursales: todo o nada.
+
+    `lines` es un iterable de (product_id, quantity) y `order_fields` los campos
+    del Order (user, customer_name, customer_email, status). Usa un número fijo
+    de queries sin importar el tamaño del carrito:
+      1. Productos del pedido (precios).
+      2. SELECT ... FOR UPDATE de todas las filas de inventario candidatas,
+         ordenadas por id como en core/stock.py para evitar deadlocks.
+      3. Un único UPDATE del stock asignado (apply_stock_decrement).
+      4. INSERT del Order y bulk_create de los OrderItems (uno por producto y sucursal).
+      5. bulk_create de los movimientos del libro de inventario (core/ledger.py).
+
+    El stock reservado por otros carritos vigentes (core/reservations.py) no se
+    considera disponible; las reservas del propio usuario se consumen.
+
+    Si algún producto no existe o no alcanza el stock sumando todas las sucursales
+    se lanza InsufficientStock con el detalle por línea y no se modifica nada.
+    """
+    lines = list(lines)
+    strategy = strategy or get_strategy()
+    demand = defaultdict(int)
+    for product_id, quantity in lines:
+        demand[product_id] += quantity
+
+    with transaction.atomic():
+        products = Product.objects.in_bulk(list(demand))
+        candidates = defaultdict(list)
+        rows = (
+            Inventory.objects.select_for_update(of=('self',))
+            .filter(product_id__in=list(products), stock__gt=0)
+            .order_by('id')
+        )
+        for inventory in rows:
+            candidates[inventory.product_id].append(inventory)
+
+        # Las reservas vigentes de otros carritos no se pueden vender
+        customer = order_fields.get('user')
+        held = held_quantities(products, exclude_user=customer)
+
+        allocation = strategy.allocate(dict(demand), candidates) if products else {}
+        allocated = {
+            product_id: sum(quantity for _, quantity in allocation.get(product_id, []))
+            for product_id in demand
+        }
+        failures = _describe_shortages(lines, demand, products, candidates, allocated, held)
+        if failures:
+            raise InsufficientStock(failures)
+
+        requested = {
+            (branch_id, product_id): quantity
+            for product_id, picks in allocation.items()
+            for branch_id, quantity in picks
+        }
+        if apply_stock_decrement(requested) != len(requested):
+            # Igual que en decrement_stock: sólo si el motor no soporta FOR UPDATE
+            raise InsufficientStock([
+                {
+                    "line": index,
+                    "product": product_id,
+                    "requested": quantity,
+                    "available": None,
+                    "error": "El stock cambió durante la operación, reintente.",
+                }
+                for index, (product_id, quantity) in enumerate(lines)
+            ])
+
+        order = Order.objects.create(
+            total=sum(products[product_id].price * quantity for product_id, quantity in demand.items()),
+            **order_fields,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=product_id,
+                branch_id=branch_id,
+                quantity=quantity,
+                price=products[product_id].price,
+            )
+            for product_id, picks in allocation.items()
+            for branch_id, quantity in picks
+        ])
+        record_movements('order', [
+            (branch_id, product_id, -quantity)
+            for (branch_id, product_id), quantity in requested.items()
+        ], reference=order.id, user=customer)
+        if customer is not None:
+            # El pedido consume las reservas del propio carrito
+            release(customer, products)
+    return order
+
+
+def _describe_shortages(lines, demand, products, candidates, allocated, held):
+    failures = []
+    for index, (product_id, quantity) in enumerate(lines):
+        product = products.get(product_id)
+        on_hand = sum(inventory.stock for inventory in candidates.get(product_id, []))
+        available = max(on_hand - held.get(product_id, 0), 0)
+        if product is None:
+            available = 0
+            error = "Producto no encontrado"
+        elif allocated[product_id] < demand[product_id] or available < demand[product_id]:
+            error = (
+                f"Stock insuficiente de {product.name}. "
+                f"Disponible: {available}, Solicitado: {demand[product_id]}"
+            )
+        else:
+            continue
+        failures.append({
+            "line": index,
+            "product": product_id,
+            "requested": quantity,
+            "available": available,
+            "error": error,
+        })
+    return failures
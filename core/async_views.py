@@ -0,0 +1,132 @@
+"""
+Versiones async de los reportes de gerencia (/api/async/reports/...).
+
+Las secciones de cada reporte (core/reports.py) son queries agregadas
+independientes; aquí se lanzan todas a la vez con asyncio.gather, así la
+respuesta tarda lo que la sección más lenta y no la suma de todas.
+
+El ORM async de Django 4.2 (aget, aaggregate, ...) ejecuta cada query con
+sync_to_async(thread_sensitive=True), es decir, en un único hilo y una única
+conexión: las queries de una request quedarían en fila igual que en la vista
+síncrona. Por eso cada sección corre con thread_sensitive=False, en un hilo del
+executor con su propia conexión, que se cierra al terminar la sección
+(close_old_connections respeta CONN_MAX_AGE). Cada request usa como máximo una
+conexión por sección a la vez.
+
+Las secciones leen fuera de una transacción común, igual que la vista síncrona
+en autocommit. Sus queries no aparecen en QueryInstrumentationMiddleware porque
+corren en otras conexiones.
+
+Se sirven con un servidor ASGI (uvicorn config.asgi:application); bajo WSGI
+también funcionan, con un event loop por request.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .permissions import IsGerente
+from .reports import (
+    build_dashboard, build_sales_report, dashboard_filters, dashboard_sections,
+    sales_filters, sales_filters_echo, sales_sections, stock_summaries, supplier_report,
+)
+
+
+async def gather_sections(sections):
+    """Ejecuta en paralelo las secciones {nombre: (función, *argumentos)} y retorna {nombre: resultado}."""
+    names = list(sections)
+    results = await asyncio.gather(*(
+        sync_to_async(_run_section, thread_sensitive=False)(*sections[name]) for name in names
+    ))
+    return dict(zip(names, results))
+
+
+def _run_section(function, *args):
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+def _authorize(request):
+    """Autentica como DRF (JWT o sesión) y aplica IsGerente; retorna la respuesta de error o None."""
+    authenticators = [cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        user = drf_request.user
+        error = None
+    except APIException as exc:
+        error = _error(exc.detail, exc.status_code)
+    if error is None and not user.is_authenticated:
+        error = _error("Las credenciales de autenticación no se proveyeron.", 401)
+    if error is not None:
+        if error.status_code == 401:
+            error['WWW-Authenticate'] = authenticators[0].authenticate_header(drf_request)
+        return error
+    if not IsGerente().has_permission(drf_request, None):
+        return _error("Usted no tiene permiso para realizar esta acción.", 403)
+    return None
+
+
+def report_view(view):
+    """Sólo GET y sólo gerentes o superiores, como ReportViewSet."""
+    @functools.wraps(view)
+    async def wrapper(request):
+        if request.method != 'GET':
+            return _error(f'Método "{request.method}" no permitido.', 405)
+        error = await sync_to_async(_authorize)(request)
+        if error:
+            return error
+        return await view(request)
+    return wrapper
+
+
+def _error(detail, status):
+    return _json(detail if isinstance(detail, dict) else {"detail": detail}, status=status)
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+@report_view
+async def stock_report_async(request):
+    """GET /api/async/reports/stock/?branch= — Valorización de stock por sucursal (sin ?detail)."""
+    if request.GET.get('detail') == '1':
+        return _json({"error": "El detalle por producto se transmite en /api/reports/stock/?detail=1"}, status=400)
+    results = await gather_sections({'stock': (stock_summaries, request.GET.get('branch'))})
+    return _json(results['stock'])
+
+
+@report_view
+async def sales_report_async(request):
+    """GET /api/async/reports/sales/ — Mismos filtros y respuesta que /api/reports/sales/."""
+    filters, error = sales_filters(request.GET)
+    if error:
+        return _json({"error": error}, status=400)
+    results = await gather_sections(sales_sections(filters))
+    return _json({
+        "filters": sales_filters_echo(request.GET, filters),
+        "branches": build_sales_report(filters, results['closed'], results['today_totals'], results['today_units']),
+    })
+
+
+@report_view
+async def suppliers_report_async(request):
+    """GET /api/async/reports/suppliers/"""
+    results = await gather_sections({'suppliers': (supplier_report,)})
+    return _json(results['suppliers'])
+
+
+@report_view
+async def dashboard_async(request):
+    """GET /api/async/reports/dashboard/ — Panel de gerencia con todas sus secciones en paralelo."""
+    filters = dashboard_filters()
+    results = await gather_sections(dashboard_sections(filters))
+    return _json(build_dashboard(filters, results))
@@ -0,0 +1,84 @@
+"""
+Feed incremental del catálogo para el POS.
+
+Cada fila de producto o inventario queda marcada con la versión del catálogo de
+la transacción que la modificó (Product.save, Inventory.save y
+apply_stock_decrement; ver TenantManager.next_catalog_version). En PostgreSQL la
+versión es el id de la transacción y no se bloquea nada compartido: las ventas
+de un tenant siguen serializándose sólo por fila de inventario. La versión que
+recibe el cliente es el límite bajo el cual todas las transacciones ya
+terminaron (current_catalog_version): con la versión N sólo necesita las filas
+con catalog_version > N.
+
+Las bajas se informan con CatalogTombstone (señales post_delete en core/signals.py).
+"""
+from .models import Branch, CatalogTombstone, Inventory, Product, Tenant
+
+
+def catalog_changes(tenant_id, since=0):
+    """
+    Cambios del catálogo del tenant posteriores a la versión `since`; con
+    tenant_id=None, de todos los tenants (sólo superusuarios: la vista lo controla).
+
+    La versión actual se lee antes que las filas: lo que se confirme mientras
+    tanto puede venir repetido en la próxima consulta, pero nunca se pierde.
+    Con since=0 (o una versión desconocida, mayor a la actual) se entrega el
+    catálogo completo y `full` indica al cliente que descarte su copia.
+    """
+    version = Tenant.objects.current_catalog_version(tenant_id)
+    full = since <= 0 or since > version
+    if tenant_id is None:
+        products = Product.objects.all()
+        inventory = Inventory.objects.all()
+        tombstones = CatalogTombstone.objects.all()
+    else:
+        products = Product.objects.for_tenant(tenant_id)
+        branch_ids = list(Branch.objects.for_tenant(tenant_id).values_list('id', flat=True))
+        inventory = Inventory.objects.filter(branch_id__in=branch_ids)
+        tombstones = CatalogTombstone.objects.filter(tenant_id=tenant_id)
+    if full:
+        # Sin filtro por versión: las filas cargadas por fuera de save() (bulk,
+        # COPY, datos anteriores a la migración) tienen catalog_version 0
+        deleted_products, deleted_inventory = [], []
+    else:
+        products = products.filter(catalog_version__gt=since)
+        inventory = inventory.filter(catalog_version__gt=since)
+        tombstones = tombstones.filter(catalog_version__gt=since)
+        deleted_products = list(
+            tombstones.filter(branch_id__isnull=True).values_list('product_id', flat=True)
+        )
+        deleted_inventory = [
+            list(pair) for pair in
+            tombstones.filter(branch_id__isnull=False).values_list('product_id', 'branch_id')
+        ]
+
+    return {
+        'version': version,
+        'full': full,
+        'products': _product_rows(products),
+        'inventory': _inventory_rows(inventory),
+        'deleted': {'products': deleted_products, 'inventory': deleted_inventory},
+    }
+
+
+def _product_rows(products):
+    return list(products.order_by('id').values('id', 'sku', 'name', 'price'))
+
+
+def _inventory_rows(inventory):
+    return [
+        {'product': product_id, 'branch': branch_id, 'stock': stock}
+        for product_id, branch_id, stock in
+        inventory.order_by('id').values_list('product_id', 'branch_id', 'stock')
+    ]
+
+
+def record_deletion(tenant_id, product_id, branch_id=None):
+    """Registra la baja de un producto (o de una fila de inventario si viene branch_id)."""
+    if tenant_id is None:
+        return
+    version = Tenant.objects.next_catalog_version(tenant_id)
+    if version:
+        CatalogTombstone.objects.create(
+            tenant_id=tenant_id, product_id=product_id, branch_id=branch_id, catalog_version=version,
+        )
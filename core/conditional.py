@@ -0,0 +1,128 @@
+"""
+GET condicionales (ETag / If-None-Match) para los listados que el POS y la
+tienda consultan periódicamente.
+
+Cada escritura sobre productos, inventario, sucursales o proveedores
+incrementa un contador en TableVersion (señales en core/signals.py y
+apply_stock_decrement). El ETag de una respuesta se arma con esos contadores
+más la URL pedida, así que para responder 304 basta una query de agregación
+sobre una tabla de pocas filas: no se cargan filas del modelo ni se pasa por
+el serializer. Los mismos contadores versionan el caché de product_list_view
+(core/product_cache.py).
+
+Los contadores se incrementan en transaction.on_commit, en autocommit: la fila
+del contador se bloquea sólo durante ese UPDATE (no durante toda la venta) y
+nunca se publica una versión nueva antes de que sus datos sean visibles. Un
+cliente que lea entre el commit y el incremento recibe datos nuevos con el
+ETag anterior y simplemente los vuelve a descargar en la consulta siguiente.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import TableVersion
+
+PRODUCTS = 'product'
+INVENTORY = 'inventory'
+BRANCHES = 'branch'
+SUPPLIERS = 'supplier'
+
+
+def bump_table_version(table, scopes):
+    """Incrementa (al confirmar la transacción en curso) el contador de `table` para cada ámbito de `scopes`."""
+    scopes = sorted({scope or 0 for scope in scopes})
+    if scopes:
+        transaction.on_commit(lambda: _increment(table, scopes))
+
+
+def _increment(table, scopes):
+    counters = TableVersion.objects.filter(table=table)
+    if counters.filter(scope__in=scopes).update(version=F('version') + 1) == len(scopes):
+        return
+    # Primer cambio del ámbito: se crea el contador y se incrementa igual que el resto
+    existing = set(counters.filter(scope__in=scopes).values_list('scope', flat=True))
+    missing = [scope for scope in scopes if scope not in existing]
+    TableVersion.objects.bulk_create(
+        [TableVersion(table=table, scope=scope) for scope in missing], ignore_conflicts=True,
+    )
+    counters.filter(scope__in=missing).update(version=F('version') + 1)
+
+
+def current_versions(selectors):
+    """
+    Suma de los contadores de cada selector (table, scope) en una sola query;
+    scope=None suma todos los ámbitos de la tabla y un iterable (o queryset de
+    ids) suma los ámbitos indicados. Como los contadores sólo crecen,
+    cualquier escritura cambia la suma.
+    """
+    aggregates = {}
+    for index, (table, scope) in enumerate(selectors):
+        condition = Q(table=table)
+        if isinstance(scope, int):
+            condition &= Q(scope=scope)
+        elif scope is not None:
+            condition &= Q(scope__in=scope)
+        aggregates[f'v{index}'] = Sum('version', filter=condition)
+    totals = TableVersion.objects.aggregate(**aggregates)
+    return tuple(totals[f'v{index}'] or 0 for index in range(len(selectors)))
+
+
+class ConditionalGetMixin:
+    """
+    Agrega ETag a `list` y `retrieve` de un ViewSet y responde 304 Not Modified
+    cuando el If-None-Match del cliente coincide, antes de consultar el queryset.
+
+    `etag_tables` indica de qué tablas depende la representación (ej: el
+    inventario muestra nombres de productos y sucursales); `etag_selectors`
+    puede acotar el ámbito según la request.
+    """
+    etag_tables = ()
+
+    def etag_selectors(self, request):
+        return [(table, None) for table in self.etag_tables]
+
+    def get_etag(self, request):
+        versions = current_versions(self.etag_selectors(request))
+        key = '|'.join([
+            self.basename or '',
+            self.action or '',
+            str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, '')),
+            request.accepted_renderer.format or '',
+            '&'.join(sorted(f'{name}={value}' for name, value in request.query_params.lists())),
+            *map(str, versions),
+        ])
+        return 'W/"%s"' % hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def _conditional_response(self, request, handler, *args, **kwargs):
+        etag = self.get_etag(request)
+        if _etag_matches(etag, request.headers.get('If-None-Match')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+def _etag_matches(etag, if_none_match):
+    """Comparación débil (RFC 9110): se ignora el prefijo W/."""
+    if not if_none_match:
+        return False
+    candidates = parse_etags(if_none_match)
+    return '*' in candidates or _opaque(etag) in {_opaque(candidate) for candidate in candidates}
+
+
+def _opaque(etag):
+    return etag[2:] if etag.startswith('W/') else etag
@@ -0,0 +1,206 @@
+"""
+Conteo físico (inventario cíclico) de una sucursal: fija el stock de muchos
+productos a la vez y entrega el reporte de diferencias.
+
+El conteo llega como lista JSON de {sku | product, counted} o como el archivo
+de texto que exporta el lector de códigos de barras (ver parse_scanner_file).
+apply_count usa un número fijo de queries sin importar el tamaño del conteo:
+  1. Resuelve los SKU a productos del tenant.
+  2. SELECT ... FOR UPDATE de las filas de inventario de la sucursal (stock actual).
+  3. INSERT de las filas que aún no existen (producto nunca cargado en la sucursal).
+  4. Un único UPDATE con CASE que fija el stock contado y la versión del catálogo.
+  5. Un INSERT con los ajustes en el libro de movimientos.
+
+El conteo es todo o nada: si una línea es inválida no se modifica ninguna fila.
+"""
+import csv
+import io
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+
+from .conditional import INVENTORY, bump_table_version
+from .ledger import record_movements
+from .models import Inventory, Product, Tenant
+
+MAX_COUNT_LINES = 50000
+
+
+class CountError(Exception):
+    """
+    El conteo tiene líneas inválidas; `errors` trae el detalle por línea.
+    Con `retryable` el conteo es válido pero chocó con otra operación y puede reintentarse.
+    """
+
+    def __init__(self, errors, retryable=False):
+        self.errors = errors
+        self.retryable = retryable
+        super().__init__(
+            "El inventario cambió durante el conteo, reintente." if retryable
+            else f"{len(errors)} línea(s) inválida(s)"
+        )
+
+
+def parse_count_entries(entries):
+    """
+    Convierte la lista JSON [{'sku' o 'product', 'counted'}, ...] en líneas
+    (número, sku, product_id, contado). Lanza CountError si alguna es inválida.
+    """
+    lines, errors = [], []
+    for index, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            errors.append({"line": index, "error": "Cada línea debe ser un objeto {sku|product, counted}"})
+            continue
+        sku = str(entry.get('sku') or '').strip()
+        product_id = entry.get('product')
+        counted = entry.get('counted')
+        if not sku and product_id is None:
+            errors.append({"line": index, "error": "Indique sku o product"})
+        elif product_id is not None and (isinstance(product_id, bool) or not isinstance(product_id, int)):
+            errors.append({"line": index, "error": "product debe ser un id entero"})
+        elif isinstance(counted, bool) or not isinstance(counted, int) or counted < 0:
+            errors.append({"line": index, "error": "counted debe ser un entero >= 0"})
+        else:
+            lines.append((index, sku or None, product_id if not sku else None, counted))
+    if errors:
+        raise CountError(errors)
+    return lines
+
+
+def parse_scanner_file(upload):
+    """
+    Lee el archivo del lector de códigos (binario, UTF-8). Cada línea es
+    `sku` (una lectura por unidad) o `sku;cantidad` (también con coma o
+    tabulador). Se admite un encabezado y las líneas del mismo SKU se suman.
+    """
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    delimiter = max(';,\t', key=sample.count) if any(char in sample for char in ';,\t') else ';'
+    lines, errors = [], []
+    for number, values in enumerate(csv.reader(text, delimiter=delimiter), start=1):
+        values = [value.strip() for value in values]
+        if not values or not values[0]:
+            continue
+        quantity = values[1] if len(values) > 1 and values[1] else '1'
+        if not quantity.isdigit():
+            if number == 1:
+                continue  # encabezado (sku;cantidad)
+            errors.append({"line": number, "sku": values[0], "error": "La cantidad debe ser un entero >= 0"})
+            continue
+        lines.append((number, values[0], None, int(quantity)))
+    if errors:
+        raise CountError(errors)
+    return lines
+
+
+def apply_count(branch, lines, zero_missing=False, dry_run=False, user=None):
+    """
+    Fija el stock de `branch` según `lines` (ver parse_*) y retorna el reporte
+    de diferencias; las líneas del mismo producto se suman (varios contadores
+    en distintos pasillos). Con zero_missing=True (conteo completo) los productos de la
+    sucursal que no aparecen en el conteo quedan en 0. Con dry_run=True sólo
+    calcula el reporte. Las diferencias quedan como ajustes en el libro de
+    inventario (core/ledger.py) a nombre de `user`.
+    """
+    if len(lines) > MAX_COUNT_LINES:
+        raise CountError([{"line": None, "error": f"Máximo {MAX_COUNT_LINES} líneas por conteo"}])
+
+    with transaction.atomic():
+        products = _resolve_products(branch.tenant_id, lines)
+        counted = defaultdict(int)
+        for _, _, product_id, quantity in products:
+            counted[product_id] += quantity
+
+        inventory = Inventory.objects.select_for_update(of=('self',)).filter(branch=branch).order_by('id')
+        if not zero_missing:
+            inventory = inventory.filter(product_id__in=list(counted))
+        current = dict(inventory.values_list('product_id', 'stock'))
+        if zero_missing:
+            for product_id in current:
+                counted.setdefault(product_id, 0)
+
+        report = _variance_report(branch, counted, current)
+        missing = [product_id for product_id in counted if product_id not in current]
+        changed = {
+            product_id: quantity for product_id, quantity in counted.items()
+            if product_id in current and current[product_id] != quantity
+        }
+        if dry_run or not (changed or missing):
+            return report
+
+        try:
+            # Savepoint: si otra operación creó alguna de estas filas mientras tanto,
+            # el stock leído ya no sirve de base para los movimientos
+            with transaction.atomic():
+                Inventory.objects.bulk_create([
+                    Inventory(branch=branch, product_id=product_id, stock=counted[product_id])
+                    for product_id in missing
+                ])
+        except IntegrityError:
+            raise CountError([
+                {"line": None, "product": product_id, "error": "La fila de inventario se creó durante el conteo"}
+                for product_id in missing
+            ], retryable=True)
+        # Al final el contador del tenant (orden de bloqueo: filas y luego tenant)
+        version = Tenant.objects.next_catalog_version(branch.tenant_id)
+        values = {'stock': Case(
+            *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in changed.items()],
+            default=F('stock'),
+        )}
+        if version:
+            values['catalog_version'] = version
+        Inventory.objects.filter(branch=branch, product_id__in=list(changed) + missing).update(**values)
+        bump_table_version(INVENTORY, [branch.id])
+        record_movements('adjustment', [
+            (branch.id, product_id, counted[product_id] - current.get(product_id, 0))
+            for product_id in list(changed) + missing
+        ], user=user)
+    return report
+
+
+def _resolve_products(tenant_id, lines):
+    """Reemplaza los SKU por ids y verifica que todos los productos sean del tenant."""
+    skus = {sku for _, sku, _, _ in lines if sku}
+    ids = {product_id for _, _, product_id, _ in lines if product_id is not None}
+    found = Product.objects.for_tenant(tenant_id).filter(sku__in=skus) if skus else Product.objects.none()
+    by_sku = dict(found.values_list('sku', 'id'))
+    if ids:
+        ids &= set(Product.objects.for_tenant(tenant_id).filter(id__in=ids).values_list('id', flat=True))
+
+    resolved, errors = [], []
+    for number, sku, product_id, quantity in lines:
+        if sku:
+            product_id = by_sku.get(sku)
+            if product_id is None:
+                errors.append({"line": number, "sku": sku, "error": "No existe un producto con ese SKU"})
+                continue
+        elif product_id not in ids:
+            errors.append({"line": number, "product": product_id, "error": "No existe el producto"})
+            continue
+        resolved.append((number, sku, product_id, quantity))
+    if errors:
+        raise CountError(errors)
+    return resolved
+
+
+def _variance_report(branch, counted, current):
+    """Diferencia por producto (contado - sistema) valorizada a costo, con totales."""
+    details = Product.objects.filter(id__in=list(counted)).values_list('id', 'sku', 'name', 'cost')
+    items = []
+    summary = {"branch": branch.id, "counted": len(counted), "adjusted": 0,
+               "units_over": 0, "units_short": 0, "value_variance": 0}
+    for product_id, sku, name, cost in sorted(details, key=lambda row: row[1]):
+        previous = current.get(product_id, 0)
+        difference = counted[product_id] - previous
+        if difference:
+            summary['adjusted'] += 1
+            summary['units_over' if difference > 0 else 'units_short'] += abs(difference)
+            summary['value_variance'] += difference * cost
+        items.append({
+            "product": product_id, "sku": sku, "name": name,
+            "system": previous, "counted": counted[product_id],
+            "difference": difference, "value_difference": difference * cost,
+        })
+    return {"summary": summary, "items": items}
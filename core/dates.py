@@ -0,0 +1,48 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def day_start(day):
+    """Inicio (00:00 en la zona horaria activa) del día indicado, como datetime aware."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_range_q(field, date_from=None, date_to=None):
+    """
+    Filtro por rango de días (ambos inclusive) sobre un DateTimeField.
+
+    Equivale a `field__date__gte` / `field__date__lte`, pero compara la columna
+    directamente contra [inicio de date_from, inicio del día siguiente a date_to),
+    de modo que el motor puede usar los índices sobre `field`; `__date` aplica
+    una conversión a cada fila y obliga a recorrer la tabla completa.
+    """
+    condition = Q()
+    if date_from:
+        condition &= Q(**{f'{field}__gte': day_start(date_from)})
+    if date_to:
+        condition &= Q(**{f'{field}__lt': day_start(date_to + timedelta(days=1))})
+    return condition
+
+
+def parse_date_range(params):
+    """
+    Lee date_from/date_to (YYYY-MM-DD) de los parámetros de un reporte.
+    Retorna (date_from, date_to, error); las fechas no pueden ser futuras.
+    """
+    today = timezone.localdate()
+    parsed = {}
+    for key, label in (('date_from', 'desde'), ('date_to', 'hasta')):
+        value = params.get(key)
+        try:
+            parsed[key] = parse_date(value) if value else None
+        except ValueError:
+            parsed[key] = None
+        if value and not parsed[key]:
+            return None, None, "Formato de fecha inválido, use YYYY-MM-DD."
+        # Validar que las fechas no sean futuras
+        if parsed[key] and parsed[key] > today:
+            return None, None, f"La fecha '{label}' no puede ser mayor a hoy."
+    return parsed['date_from'], parsed['date_to'], None
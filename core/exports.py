@@ -0,0 +1,55 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: retorna la línea en vez de acumularla."""
+    def write(self, value):
+        return value
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def _batched(lines, size=500):
+    # Agrupa líneas para no emitir un write() por fila
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_response(filename, header, queryset, output='csv'):
+    """
+    StreamingHttpResponse con el contenido de `queryset` (un values_list con
+    las columnas de `header`) en CSV o NDJSON. Las filas se leen con
+    .iterator(chunk_size=...) y se escriben a medida que llegan, por lo que la
+    memoria usada no depende del número de filas.
+    """
+    rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if output == 'ndjson':
+        lines, content_type, extension = _ndjson_lines(header, rows), 'application/x-ndjson', 'ndjson'
+    else:
+        lines, content_type, extension = _csv_lines(header, rows), 'text/csv; charset=utf-8', 'csv'
+    response = StreamingHttpResponse(_batched(lines), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
@@ -0,0 +1,87 @@
+"""
+Registro de las queries que ejecuta cada request (ver QueryInstrumentationMiddleware
+en core/middleware.py) y presupuestos de queries por vista.
+
+Un presupuesto se declara en el ViewSet con `query_budget` (un entero para
+todas las acciones o un dict {acción: máximo}), o en una vista de función con
+el decorador @query_budget(n). Al excederse se registra una advertencia; con
+settings.QUERY_BUDGET_STRICT (tests) se lanza QueryBudgetExceeded. El
+presupuesto cuenta todas las queries de la request, incluidas las de sesión,
+usuario y permisos.
+"""
+import re
+import time
+from collections import Counter
+
+_PLACEHOLDER = re.compile(r'%s')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r'\(\?(?:\s*,\s*\?)+\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Una vista ejecutó más queries que su presupuesto."""
+
+
+def fingerprint(sql):
+    """
+    SQL normalizado para agrupar queries iguales salvo los valores: parámetros y
+    literales pasan a `?` y las listas IN/VALUES de cualquier largo a `(...)`.
+    Varias queries con la misma huella en una request suelen ser un N+1.
+    """
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _LITERAL.sub('?', sql)
+    sql = _VALUE_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """execute_wrapper que mide cada query ejecutada en la conexión."""
+
+    def __init__(self):
+        self.queries = []  # (sql, milisegundos)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(elapsed for _, elapsed in self.queries)
+
+    def duplicates(self):
+        """{huella: repeticiones} de las queries que se ejecutaron más de una vez."""
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.most_common() if count > 1}
+
+    def slowest(self, limit=3):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+
+def query_budget(limit):
+    """Declara el máximo de queries de una vista de función."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def view_budget(view_func, method):
+    """
+    Nombre legible y presupuesto de la vista que atiende la request. Para los
+    ViewSets de DRF el nombre es Clase.acción y el presupuesto puede ser por acción.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return view_func.__name__, getattr(view_func, 'query_budget', None)
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower(), method.lower())
+    budget = getattr(cls, 'query_budget', None)
+    if isinstance(budget, dict):
+        budget = budget.get(action)
+    return f'{cls.__name__}.{action}', budget
@@ -0,0 +1,309 @@
+"""
+Cola de trabajos en segundo plano respaldada por la tabla Job, sin broker
+externo. La web encola (enqueue) y responde de inmediato; `manage.py runworker`
+toma los trabajos y los ejecuta.
+
+Toma de trabajos (claim_next):
+  - En PostgreSQL, SELECT ... FOR UPDATE SKIP LOCKED: cada worker salta las
+    filas que otro está tomando en ese momento, sin esperas ni duplicados.
+  - En motores sin SKIP LOCKED (SQLite), un UPDATE condicionado a
+    status='queued' hace de compare-and-set: si otro worker ganó, el UPDATE
+    afecta 0 filas y se prueba con el siguiente.
+
+Cada tipo de trabajo se registra con @job_kind y recibe el Job y un Progress
+para informar el avance; escribe su resultado en JOB_RESULTS_DIR y retorna un
+resumen que queda en Job.result. Mientras el trabajo corre, un hilo (Heartbeat)
+renueva su latido cada JOB_HEARTBEAT_INTERVAL segundos, informe avance o no: un
+trabajo en ejecución sin latido por más de JOB_STALE_AFTER segundos (worker
+caído) se vuelve a encolar, hasta JOB_MAX_ATTEMPTS intentos.
+"""
+import json
+import logging
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Job
+from .product_import import import_products, read_rows
+from .reports import (
+    build_dashboard, build_sales_report, dashboard_filters, dashboard_sections, run_sections,
+    sales_filters, sales_filters_echo, sales_sections, stock_detail_rows, stock_summaries,
+    stream_stock_detail, supplier_report,
+)
+
+logger = logging.getLogger('core.jobs')
+
+JOB_RESULTS_DIR = Path(getattr(settings, 'JOB_RESULTS_DIR', settings.BASE_DIR / 'job_results'))
+JOB_STALE_AFTER = getattr(settings, 'JOB_STALE_AFTER', 600)
+JOB_MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+# Varios latidos por cada JOB_STALE_AFTER: uno perdido (BD ocupada) no reencola el trabajo
+JOB_HEARTBEAT_INTERVAL = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', JOB_STALE_AFTER / 4)
+PROGRESS_INTERVAL = 1.0  # segundos mínimos entre escrituras de avance
+
+# Reportes que se pueden encolar en POST /api/reports/<kind>/jobs/
+REPORT_JOB_KINDS = ('sales', 'stock', 'suppliers', 'dashboard')
+
+_KINDS = {}
+
+
+class JobError(Exception):
+    """Parámetros inválidos para el tipo de trabajo."""
+
+
+def job_kind(name, validate=None):
+    """
+    Registra la función que ejecuta los trabajos `name`. `validate(params)`, si
+    se indica, se llama al encolar y retorna un mensaje de error o None.
+    """
+    def decorator(function):
+        _KINDS[name] = (function, validate)
+        return function
+    return decorator
+
+
+def enqueue(kind, params=None, user=None):
+    """Valida los parámetros y deja el trabajo en cola. Lanza JobError si no son válidos."""
+    if kind not in _KINDS:
+        raise JobError(f"Tipo de trabajo desconocido: {kind}")
+    params = params or {}
+    validate = _KINDS[kind][1]
+    error = validate(params) if validate else None
+    if error:
+        raise JobError(error)
+    return Job.objects.create(
+        kind=kind, params=params, user=user, tenant_id=getattr(user, 'tenant_id', None),
+    )
+
+
+def result_path(job):
+    return JOB_RESULTS_DIR / job.result_file if job.result_file else None
+
+
+def upload_path(filename):
+    """Ruta (relativa a JOB_RESULTS_DIR) donde guardar un archivo subido que procesará un trabajo."""
+    return Path('uploads') / f'{uuid.uuid4().hex}{Path(filename).suffix.lower()}'
+
+
+# --- Worker ---
+
+def claim_next(worker):
+    """Toma el trabajo en cola más antiguo y lo marca en ejecución; None si no hay."""
+    now = timezone.now()
+    claim = {
+        'status': 'running', 'worker': worker, 'started_at': now, 'heartbeat_at': now,
+        'attempts': F('attempts') + 1, 'progress': 0, 'message': '',
+    }
+    queued = Job.objects.filter(status='queued').order_by('created_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_id = queued.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+            Job.objects.filter(id=job_id).update(**claim)
+    else:
+        # Sin transacción explícita: en SQLite un SELECT seguido de UPDATE en la
+        # misma transacción puede fallar con "database is locked" al escalar el bloqueo
+        for job_id in queued.values_list('id', flat=True)[:10]:
+            if Job.objects.filter(id=job_id, status='queued').update(**claim):
+                break
+        else:
+            return None
+    return Job.objects.get(id=job_id)
+
+
+def run_job(job):
+    """Ejecuta un trabajo ya tomado por claim_next y registra el resultado o el error."""
+    function = _KINDS.get(job.kind, (None, None))[0]
+    owned = Job.objects.filter(id=job.id, status='running', worker=job.worker)
+    started = time.monotonic()
+    try:
+        if function is None:
+            raise JobError(f"Tipo de trabajo desconocido: {job.kind}")
+        result = function(job, Progress(job))
+    except Exception as exc:
+        logger.exception("Job #%s (%s) falló", job.id, job.kind)
+        owned.update(
+            status='failed', finished_at=timezone.now(), message=str(exc)[:200],
+            error=traceback.format_exc() if not isinstance(exc, JobError) else str(exc),
+        )
+        return False
+    owned.update(
+        status='done', progress=100, message='', finished_at=timezone.now(),
+        result=json.loads(json.dumps(result, cls=JSONEncoder)), result_file=job.result_file,
+    )
+    logger.info("Job #%s (%s) terminado en %.1fs", job.id, job.kind, time.monotonic() - started)
+    return True
+
+
+def requeue_stale(stale_after=JOB_STALE_AFTER):
+    """
+    Trabajos en ejecución sin latido reciente (worker caído): vuelven a la cola,
+    o se marcan fallidos si ya agotaron sus intentos. Retorna cuántos se tocaron.
+    """
+    stale = Job.objects.filter(status='running', heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_after))
+    failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status='failed', finished_at=timezone.now(), message="El worker dejó de responder.",
+    )
+    return failed + stale.update(status='queued', worker='', message="Reencolado: el worker dejó de responder.")
+
+
+class Heartbeat:
+    """
+    Renueva heartbeat_at del trabajo cada `interval` segundos desde un hilo
+    propio mientras dura el bloque `with`, aunque el trabajo no informe avance
+    (ej: una sola query larga). Sólo deja de latir si el proceso muere, que es
+    lo que requeue_stale debe detectar.
+    """
+
+    def __init__(self, job, interval=JOB_HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'heartbeat-job-{job.id}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        running = Job.objects.filter(id=self.job.id, status='running', worker=self.job.worker)
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    running.update(heartbeat_at=timezone.now())
+                except Exception:
+                    logger.warning("No se pudo registrar el latido del job #%s", self.job.id, exc_info=True)
+        finally:
+            # El hilo tiene su propia conexión
+            connection.close()
+
+
+class Progress:
+    """Informa el avance del trabajo (y su latido) como mucho una vez por PROGRESS_INTERVAL."""
+
+    def __init__(self, job):
+        self.job = job
+        self._last = 0.0
+
+    def __call__(self, done, total=None, message=''):
+        now = time.monotonic()
+        if now - self._last < PROGRESS_INTERVAL:
+            return
+        self._last = now
+        percent = min(99, int(done * 100 / total)) if total else 0
+        Job.objects.filter(id=self.job.id, worker=self.job.worker).update(
+            progress=percent, message=message[:200], heartbeat_at=timezone.now(),
+        )
+
+
+def _write_result(job, chunks, extension='json'):
+    """Escribe el resultado del trabajo en JOB_RESULTS_DIR, lo asocia al Job y retorna su tamaño en bytes."""
+    JOB_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    job.result_file = f'job-{job.id}.{extension}'
+    path = JOB_RESULTS_DIR / job.result_file
+    partial = path.with_name(path.name + '.part')
+    with open(partial, 'w', encoding='utf-8') as output:
+        for chunk in chunks:
+            output.write(chunk)
+    partial.replace(path)  # un archivo visible siempre está completo
+    return path.stat().st_size
+
+
+def _dump(data):
+    return [json.dumps(data, cls=JSONEncoder, ensure_ascii=False)]
+
+
+# --- Tipos de trabajo ---
+
+def _validate_sales(params):
+    return sales_filters(params)[1]
+
+
+@job_kind('sales', validate=_validate_sales)
+def sales_job(job, progress):
+    filters, error = sales_filters(job.params)
+    if error:
+        raise JobError(error)
+    results = {}
+    sections = sales_sections(filters)
+    for position, (name, section) in enumerate(sections.items()):
+        progress(position, len(sections), f"Calculando {name}")
+        results.update(run_sections({name: section}))
+    report = {
+        "filters": sales_filters_echo(job.params, filters),
+        "branches": build_sales_report(filters, results['closed'], results['today_totals'], results['today_units']),
+    }
+    return {"bytes": _write_result(job, _dump(report)), "branches": len(report['branches'])}
+
+
+@job_kind('stock')
+def stock_job(job, progress):
+    """Valorización de stock; con params {'detail': '1'} incluye el detalle por producto."""
+    branch_id = job.params.get('branch')
+    summaries = stock_summaries(branch_id)
+    if str(job.params.get('detail')) != '1':
+        return {"bytes": _write_result(job, _dump(summaries)), "branches": len(summaries)}
+
+    total = sum(summary['total_items'] for summary in summaries)
+
+    def rows():
+        for count, row in enumerate(stock_detail_rows(branch_id).iterator(chunk_size=2000), start=1):
+            if count % 2000 == 0:
+                progress(count, total, f"{count} de {total} productos")
+            yield row
+
+    size = _write_result(job, stream_stock_detail(summaries, rows()))
+    return {"bytes": size, "branches": len(summaries), "products": total}
+
+
+@job_kind('suppliers')
+def suppliers_job(job, progress):
+    suppliers = supplier_report()
+    return {"bytes": _write_result(job, _dump(suppliers)), "suppliers": len(suppliers)}
+
+
+@job_kind('dashboard')
+def dashboard_job(job, progress):
+    filters = dashboard_filters()
+    report = build_dashboard(filters, run_sections(dashboard_sections(filters)))
+    return {"bytes": _write_result(job, _dump(report))}
+
+
+def _validate_import(params):
+    if not params.get('upload') or not (JOB_RESULTS_DIR / params['upload']).is_file():
+        return "Falta el archivo a importar."
+    return None
+
+
+@job_kind('product_import', validate=_validate_import)
+def product_import_job(job, progress):
+    """Importación de catálogo (core/product_import.py) de un archivo guardado en JOB_RESULTS_DIR/uploads."""
+    path = JOB_RESULTS_DIR / job.params['upload']
+    try:
+        with open(path, 'rb') as upload:
+            total = None  # en XLSX no se conoce el total de filas sin leer el libro
+            if path.suffix != '.xlsx':
+                total = sum(chunk.count(b'\n') for chunk in iter(lambda: upload.read(1 << 20), b''))
+                upload.seek(0)
+            report = import_products(
+                read_rows(upload, job.params.get('filename', path.name)), job.tenant_id,
+                dry_run=bool(job.params.get('dry_run')),
+                progress=lambda rows: progress(rows, total, f"{rows} filas procesadas"),
+            )
+    finally:
+        path.unlink(missing_ok=True)
+    _write_result(job, _dump(report))
+    return {key: report[key] for key in ('rows', 'created', 'updated', 'error_count')}
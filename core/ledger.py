@@ -0,0 +1,187 @@
+"""
+Libro de movimientos de inventario (InventoryMovement) y checkpoints de saldos
+(InventorySnapshot).
+
+Cada operación que cambia Inventory.stock (venta, pedido web, compra, ajuste,
+conteo, transferencia) registra sus deltas con record_movements, en un único
+bulk_create dentro de la misma transacción que el UPDATE del stock. El libro
+sólo crece: no se editan ni borran movimientos.
+
+Stock a una fecha (stock_at) sin recorrer todo el historial:
+  1. El checkpoint más reciente de la sucursal anterior a la fecha.
+  2. + la suma de los movimientos entre el checkpoint y la fecha, una query por
+     rango sobre el índice (branch, created_at).
+`manage.py snapshot_inventory` toma los checkpoints periódicamente, así el
+rango a sumar nunca supera el intervalo entre checkpoints.
+
+Los checkpoints se toman con un desfase (SNAPSHOT_LAG): el created_at de un
+movimiento se fija antes del COMMIT, y una transacción en curso podría
+confirmar después movimientos con fecha anterior al checkpoint.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Sum
+from django.utils import timezone
+
+from .models import Branch, Inventory, InventoryMovement, InventorySnapshot
+
+SNAPSHOT_LAG = timedelta(minutes=5)
+BATCH_SIZE = 2000
+
+
+def record_movements(kind, lines, reference=None, user=None):
+    """
+    Registra en un solo INSERT los deltas de stock `lines`: tuplas
+    (branch_id, product_id, quantity) o (branch_id, product_id, quantity, reference)
+    cuando cada línea pertenece a un documento distinto (lote de ventas).
+    Las líneas en 0 se omiten. Debe llamarse en la transacción que cambia el stock.
+    """
+    now = timezone.now()
+    user_id = user.pk if getattr(user, 'is_authenticated', False) else None
+    movements = [
+        InventoryMovement(
+            branch_id=line[0], product_id=line[1], quantity=line[2],
+            reference=line[3] if len(line) > 3 else reference,
+            kind=kind, user_id=user_id, created_at=now,
+        )
+        for line in lines
+        if line[2]
+    ]
+    return InventoryMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+
+
+def record_stock_change(before, inventory, kind='adjustment', user=None):
+    """
+    Registra el cambio de una fila de inventario editada a mano (stock absoluto).
+    `before` es (branch_id, product_id, stock) antes de guardar, o None si la
+    fila es nueva; `inventory` es la fila guardada, o None si se eliminó.
+    """
+    lines = []
+    if before is not None:
+        lines.append((before[0], before[1], -before[2]))
+    if inventory is not None:
+        lines.append((inventory.branch_id, inventory.product_id, inventory.stock))
+    deltas = defaultdict(int)
+    for branch_id, product_id, quantity in lines:
+        deltas[(branch_id, product_id)] += quantity
+    return record_movements(kind, [(*key, quantity) for key, quantity in deltas.items()], user=user)
+
+
+def record_opening_balances(branch_ids=None):
+    """
+    Saldo inicial ('opening') para las filas de inventario con stock que aún no
+    tienen movimientos (datos anteriores al libro o cargados por fuera de la API).
+    Retorna cuántos movimientos se crearon.
+    """
+    rows = Inventory.objects.exclude(stock=0).filter(
+        ~Exists(InventoryMovement.objects.filter(branch=OuterRef('branch'), product=OuterRef('product')))
+    )
+    if branch_ids is not None:
+        rows = rows.filter(branch_id__in=branch_ids)
+    created = 0
+    batch = []
+    for line in rows.order_by('id').values_list('branch_id', 'product_id', 'stock').iterator(chunk_size=BATCH_SIZE):
+        batch.append(line)
+        if len(batch) >= BATCH_SIZE:
+            created += len(record_movements('opening', batch))
+            batch = []
+    return created + len(record_movements('opening', batch))
+
+
+def latest_snapshot(branch_id, when):
+    """Fecha del último checkpoint de la sucursal en o antes de `when` (None si no hay)."""
+    return (
+        InventorySnapshot.objects.filter(branch_id=branch_id, taken_at__lte=when)
+        .aggregate(taken_at=Max('taken_at'))['taken_at']
+    )
+
+
+def stock_at(branch_id, when, product_ids=None):
+    """
+    Stock de la sucursal en la fecha `when`: {product_id: stock} (se omiten los
+    productos en 0). Dos queries: saldos del checkpoint + suma del rango.
+    """
+    checkpoint = latest_snapshot(branch_id, when)
+    balances = defaultdict(int)
+    if checkpoint is not None:
+        snapshot = InventorySnapshot.objects.filter(branch_id=branch_id, taken_at=checkpoint)
+        if product_ids is not None:
+            snapshot = snapshot.filter(product_id__in=product_ids)
+        balances.update(snapshot.values_list('product_id', 'stock'))
+
+    movements = InventoryMovement.objects.filter(branch_id=branch_id, created_at__lte=when)
+    if checkpoint is not None:
+        movements = movements.filter(created_at__gt=checkpoint)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    for product_id, quantity in movements.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total'):
+        balances[product_id] += quantity
+    return {product_id: stock for product_id, stock in balances.items() if stock}
+
+
+def take_snapshots(at=None, branch_ids=None):
+    """
+    Toma un checkpoint por sucursal con los saldos a la fecha `at` (por defecto
+    ahora - SNAPSHOT_LAG), calculados desde el checkpoint anterior. Retorna
+    {branch_id: filas escritas}; las sucursales sin cambios desde su último
+    checkpoint no escriben nada.
+    """
+    at = at or timezone.now() - SNAPSHOT_LAG
+    branches = Branch.objects.order_by('id')
+    if branch_ids is not None:
+        branches = branches.filter(id__in=branch_ids)
+    written = {}
+    for branch_id in branches.values_list('id', flat=True):
+        checkpoint = latest_snapshot(branch_id, at)
+        if checkpoint == at:
+            continue
+        moved = InventoryMovement.objects.filter(branch_id=branch_id, created_at__lte=at)
+        if checkpoint is not None:
+            moved = moved.filter(created_at__gt=checkpoint)
+        if not moved.exists():
+            continue
+        balances = stock_at(branch_id, at)
+        with transaction.atomic():
+            InventorySnapshot.objects.bulk_create([
+                InventorySnapshot(branch_id=branch_id, product_id=product_id, taken_at=at, stock=stock)
+                for product_id, stock in balances.items()
+            ], batch_size=BATCH_SIZE)
+        written[branch_id] = len(balances)
+    return written
+
+
+def prune_snapshots(keep):
+    """Elimina los checkpoints anteriores a `keep` salvo el último de cada sucursal; retorna cuántas filas borró."""
+    deleted = 0
+    for branch_id in InventorySnapshot.objects.values_list('branch_id', flat=True).distinct():
+        last = latest_snapshot(branch_id, keep)
+        if last is not None:
+            deleted += InventorySnapshot.objects.filter(branch_id=branch_id, taken_at__lt=last).delete()[0]
+    return deleted
+
+
+def ledger_differences(branch_ids=None):
+    """
+    Compara el saldo del libro (suma de todos los movimientos) con Inventory.stock.
+    Retorna [(branch_id, product_id, stock, saldo del libro)] de las filas que no cuadran.
+    """
+    ledger = InventoryMovement.objects.all()
+    rows = Inventory.objects.all()
+    if branch_ids is not None:
+        ledger = ledger.filter(branch_id__in=branch_ids)
+        rows = rows.filter(branch_id__in=branch_ids)
+    balances = {
+        (branch_id, product_id): total
+        for branch_id, product_id, total in
+        ledger.values('branch_id', 'product_id').annotate(total=Sum('quantity')).values_list('branch_id', 'product_id', 'total')
+    }
+    differences = []
+    for branch_id, product_id, stock in rows.values_list('branch_id', 'product_id', 'stock').iterator(chunk_size=BATCH_SIZE):
+        balance = balances.pop((branch_id, product_id), 0)
+        if balance != stock:
+            differences.append((branch_id, product_id, stock, balance))
+    # Movimientos de filas de inventario que ya no existen (stock 0)
+    differences.extend((branch_id, product_id, 0, balance) for (branch_id, product_id), balance in balances.items() if balance)
+    return differences
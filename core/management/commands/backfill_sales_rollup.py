@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula SalesDailyRollup desde la tabla Sale. Sin argumentos reconstruye "
+        "todo el historial; conviene limitar el rango a días ya cerrados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Fecha inicial YYYY-MM-DD (inclusive)')
+        parser.add_argument('--to', dest='date_to', help='Fecha final YYYY-MM-DD (inclusive)')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for key in ('date_from', 'date_to'):
+            value = options[key]
+            try:
+                dates[key] = parse_date(value) if value else None
+            except ValueError:
+                dates[key] = None
+            if value and dates[key] is None:
+                raise CommandError(f"Fecha inválida: {value}")
+
+        written = rebuild_rollups(**dates)
+        self.stdout.write(self.style.SUCCESS(f"{written} filas de rollup escritas"))
@@ -0,0 +1,92 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+
+from core.models import Branch, User
+
+ENDPOINTS = {
+    'stock': 'stock/',
+    'sales (mes)': 'sales/?granularity=month',
+    'suppliers': 'suppliers/',
+    'dashboard': 'dashboard/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el tiempo total de los reportes síncronos (/api/reports/, handler "
+        "WSGI) contra sus versiones async (/api/async/reports/, handler ASGI) que "
+        "lanzan sus secciones en paralelo. Usa los datos existentes (ver "
+        "generate_dataset). Con --latency-ms se agrega una espera a cada query para "
+        "simular la latencia de red hacia la base de datos (RDS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--latency-ms', type=float, default=0.0, help='Latencia simulada por query')
+
+    def handle(self, *args, **options):
+        if not Branch.objects.exists():
+            raise CommandError("No hay datos: ejecute primero generate_dataset.")
+        user, _ = User.objects.get_or_create(
+            username='bench-async-reports', defaults={'role': 'super_admin', 'is_superuser': True},
+        )
+        if options['latency_ms']:
+            self._simulate_latency(options['latency_ms'] / 1000)
+
+        sync_client = Client(SERVER_NAME='localhost')
+        sync_client.force_login(user)
+        async_client = AsyncClient(SERVER_NAME='localhost')
+        async_client.force_login(user)
+
+        self.stdout.write(
+            f"latencia simulada por query: {options['latency_ms']} ms\n"
+            f"{'reporte':<14} {'WSGI p50 ms':>12} {'ASGI p50 ms':>12} {'x':>6}"
+        )
+        for name, path in ENDPOINTS.items():
+            wsgi = self._measure_sync(sync_client, f'/api/reports/{path}', options['repeat'])
+            asgi = asyncio.run(self._measure_async(async_client, f'/api/async/reports/{path}', options['repeat']))
+            self.stdout.write(f"{name:<14} {wsgi:>12.2f} {asgi:>12.2f} {wsgi / asgi:>6.1f}")
+        self.stdout.write(self.style.SUCCESS("OK"))
+
+    @staticmethod
+    def _simulate_latency(seconds):
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(connection, **kwargs):
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        # Conexiones ya abiertas en este hilo y las que abran los hilos de las vistas async
+        for connection in connections.all():
+            install(connection)
+        connection_created.connect(install, weak=False)
+
+    @staticmethod
+    def _measure_sync(client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url}: respuesta {response.status_code}")
+        return statistics.median(timings)
+
+    @staticmethod
+    async def _measure_async(client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = await client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url}: respuesta {response.status_code}")
+        return statistics.median(timings)
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import Branch, Inventory, Product, Tenant, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara GET completos (200) contra GET condicionales con If-None-Match (304) "
+        "en productos, inventario por sucursal y sucursales. Los datos se generan en "
+        "una transacción que se revierte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--branches', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tenant = Tenant.objects.create(name='Bench ETag', code='bench-etag')
+            branches = Branch.objects.bulk_create([
+                Branch(name=f'Sucursal {i}', address='Bench', tenant=tenant, company=tenant.name)
+                for i in range(options['branches'])
+            ])
+            products = Product.objects.bulk_create([
+                Product(sku=f'ETAG-{i:06d}', name=f'Producto {i}', price=1000, cost=500, tenant=tenant)
+                for i in range(options['products'])
+            ], batch_size=5000)
+            Inventory.objects.bulk_create([
+                Inventory(branch=branch, product=product, stock=100, reorder_point=10)
+                for branch in branches
+                for product in products
+            ], batch_size=5000)
+            user = User.objects.create(username='bench-etag', role='super_admin', is_superuser=True)
+
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            page_size = options['page_size']
+            endpoints = {
+                'productos': f'/api/products/?page_size={page_size}',
+                'inventario sucursal': f'/api/inventory/?branch={branches[0].id}&page_size={page_size}',
+                'sucursales': '/api/branches/',
+            }
+
+            self.stdout.write(
+                f"{'endpoint':<20} {'200 p50 ms':>10} {'304 p50 ms':>10} {'x':>6} "
+                f"{'queries':>8} {'bytes':>9}"
+            )
+            for name, url in endpoints.items():
+                first = client.get(url)
+                etag = first.get('ETag')
+                if first.status_code != 200 or not etag:
+                    raise CommandError(f"{url}: respuesta {first.status_code} sin ETag")
+
+                full, full_queries = self._measure(client, url, {}, 200, options['repeat'])
+                cached, cached_queries = self._measure(
+                    client, url, {'HTTP_IF_NONE_MATCH': etag}, 304, options['repeat'],
+                )
+                self.stdout.write(
+                    f"{name:<20} {full:>10.2f} {cached:>10.2f} {full / cached:>6.1f} "
+                    f"{full_queries:>3} → {cached_queries:<2} {len(first.content):>9}"
+                )
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("OK"))
+
+    def _measure(self, client, url, headers, expected_status, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url, **headers)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != expected_status:
+                raise CommandError(f"{url}: se esperaba {expected_status} y llegó {response.status_code}")
+        return statistics.median(timings), len(queries)
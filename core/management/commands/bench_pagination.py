@@ -0,0 +1,93 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from core.models import Branch, Sale, User
+from core.pagination import CreatedAtKeysetPagination
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia de /api/sales/ paginado por cursor (keyset) contra "
+        "OFFSET. Los datos se generan dentro de una transacción que se revierte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=1_000_000, help='Ventas a generar')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por profundidad')
+
+    def handle(self, *args, **options):
+        total = options['sales']
+        page_size = options['page_size']
+        repeat = options['repeat']
+
+        with transaction.atomic():
+            self._seed(total)
+            depths = [d for d in (0, 1_000, 10_000, 100_000, total // 2, total - page_size) if 0 <= d < total]
+
+            self.stdout.write(f"{'profundidad':>12} {'keyset ms':>10} {'offset ms':>10}")
+            for depth in sorted(set(depths)):
+                keyset_ms = self._time_keyset(depth, page_size, repeat)
+                offset_ms = self._time_offset(depth, page_size, repeat)
+                self.stdout.write(f"{depth:>12} {keyset_ms:>10.2f} {offset_ms:>10.2f}")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, total):
+        branch = Branch.objects.create(name='Bench', address='-', phone='-')
+        user = User.objects.create(username='bench_pagination', role='vendedor')
+        start = timezone.now() - timedelta(days=365)
+        step = timedelta(days=365) / total
+        batch = []
+        for _ in range(total):
+            batch.append(Sale(branch=branch, user=user, total=1000))
+            if len(batch) == 5000:
+                Sale.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Sale.objects.bulk_create(batch)
+        # auto_now_add ignora valores explícitos: se reparten las fechas a posteriori,
+        # con bloques que comparten created_at para ejercitar el desempate por id
+        ids = Sale.objects.filter(branch=branch).order_by('id').values_list('id', flat=True)
+        first_id = ids.first()
+        block = 1_000
+        for offset in range(0, total, block):
+            id_range = (first_id + offset, first_id + min(offset + block, total) - 1)
+            Sale.objects.filter(branch=branch, id__range=id_range).update(created_at=start + step * offset)
+
+    def _cursor_request(self, depth, page_size, paginator):
+        factory = RequestFactory()
+        params = {'page_size': page_size}
+        if depth:
+            row = (
+                Sale.objects.order_by(*paginator.ordering)
+                .values_list('created_at', 'id')[depth - 1]
+            )
+            params['cursor'] = paginator.encode_cursor(list(row))
+        return Request(factory.get('/api/sales/', params, HTTP_HOST='localhost'))
+
+    def _time_keyset(self, depth, page_size, repeat):
+        paginator = CreatedAtKeysetPagination()
+        request = self._cursor_request(depth, page_size, paginator)
+        qs = Sale.objects.all()
+        return self._measure(lambda: paginator.paginate_queryset(qs, request), repeat)
+
+    def _time_offset(self, depth, page_size, repeat):
+        qs = Sale.objects.order_by('-created_at', '-id')
+        return self._measure(lambda: list(qs[depth:depth + page_size]), repeat)
+
+    @staticmethod
+    def _measure(fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
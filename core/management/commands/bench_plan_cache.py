@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Branch, Subscription, User
+from core.plans import clear_plan_cache, invalidate_tenant_plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las queries a core_subscription por request de API con el caché de "
+        "planes frío y caliente. Los datos se crean en una transacción que se revierte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests con caché caliente')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            company = f'bench-plan-{int(time.time())}'
+            today = timezone.localdate()
+            Subscription.objects.create(
+                company=company, plan_name='premium', start_date=today,
+                end_date=today.replace(year=today.year + 1), active=True,
+            )
+            Branch.objects.create(name='Bench', address='-', phone='-', company=company)
+            user = User.objects.create(username=company, role='admin_cliente', company=company)
+
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            clear_plan_cache()
+            invalidate_tenant_plan(user.tenant_id)
+
+            cold_queries, cold_ms = self._run(client, 1)
+            warm_queries, warm_ms = self._run(client, options['requests'])
+
+            self.stdout.write(f"frío:    {cold_queries:.2f} queries de suscripción/request, {cold_ms:.2f} ms/request")
+            self.stdout.write(f"caliente: {warm_queries:.2f} queries de suscripción/request, {warm_ms:.2f} ms/request")
+            transaction.set_rollback(True)
+        invalidate_tenant_plan(user.tenant_id)
+
+    @staticmethod
+    def _run(client, count):
+        subscription_table = Subscription._meta.db_table
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            for _ in range(count):
+                response = client.get('/api/branches/')
+                assert response.status_code == 200, response.status_code
+            elapsed = time.perf_counter() - started
+        hits = sum(1 for q in ctx.captured_queries if subscription_table in q['sql'])
+        return hits / count, elapsed * 1000 / count
@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Product, Tenant
+from core.search import index_products, search_products
+
+WORDS = (
+    'leche', 'arroz', 'aceite', 'azúcar', 'café', 'té', 'galletas', 'fideos', 'harina', 'yogur',
+    'queso', 'jamón', 'pan', 'mantequilla', 'detergente', 'shampoo', 'jabón', 'cloro', 'papel', 'bebida',
+)
+CATEGORIES = ('abarrotes', 'lácteos', 'limpieza', 'higiene', 'bebidas')
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia de core.search con un catálogo sintético (por defecto 50.000 "
+        "SKUs de un tenant). Los datos se generan en una transacción que se revierte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50_000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--max-prefix-ms', type=float, default=10.0, help='Falla si el p95 del prefijo de SKU lo supera')
+
+    def handle(self, *args, **options):
+        total = options['products']
+        with transaction.atomic():
+            tenant = Tenant.objects.create(name='Bench búsqueda', code='bench-busqueda')
+            Product.objects.bulk_create([
+                Product(
+                    sku=f'780{i:010d}',
+                    name=f'{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} {i}',
+                    description=f'Producto de prueba número {i}',
+                    category=CATEGORIES[i % len(CATEGORIES)],
+                    price=1000, cost=500, tenant=tenant,
+                )
+                for i in range(total)
+            ], batch_size=5000)
+            # bulk_create no dispara señales: se indexa explícitamente
+            index_products(Product.objects.filter(tenant=tenant))
+
+            cases = {
+                'prefijo SKU (escáner)': lambda i: f'780{(i * 997) % total:010d}'[:9],
+                'SKU exacto': lambda i: f'780{(i * 997) % total:010d}',
+                'texto': lambda i: f'{WORDS[i % len(WORDS)]} {WORDS[(i * 3) % len(WORDS)]}',
+                'categoría': lambda i: CATEGORIES[i % len(CATEGORIES)],
+            }
+            p95_by_case = {}
+            self.stdout.write(f"{'caso':<24} {'p50 ms':>8} {'p95 ms':>8} {'resultados':>10}")
+            for name, make_query in cases.items():
+                timings, found = [], 0
+                for i in range(options['repeat']):
+                    started = time.perf_counter()
+                    found = len(search_products(make_query(i), tenant_id=tenant.id))
+                    timings.append((time.perf_counter() - started) * 1000)
+                p50 = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1]
+                p95_by_case[name] = p95
+                self.stdout.write(f"{name:<24} {p50:>8.2f} {p95:>8.2f} {found:>10}")
+
+            transaction.set_rollback(True)
+
+        if p95_by_case['prefijo SKU (escáner)'] > options['max_prefix_ms']:
+            raise CommandError(f"El prefijo de SKU supera {options['max_prefix_ms']} ms (p95)")
+        self.stdout.write(self.style.SUCCESS("OK"))
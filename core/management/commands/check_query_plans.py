@@ -0,0 +1,160 @@
+import random
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from core.dates import date_range_q
+from core.models import (
+    Branch, Inventory, Order, OrderItem, Product, Sale, SaleItem, SalesDailyRollup, User,
+)
+
+
+# Líneas del plan que indican un recorrido completo de tabla, por motor
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta EXPLAIN sobre las queries calientes de las vistas (listados, "
+        "reportes y exportaciones filtradas) y falla si alguna recorre una tabla "
+        "completa en vez de usar un índice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Genera N ventas de prueba (dentro de una transacción que se revierte) antes de analizar',
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Muestra el plan completo de cada query')
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Motor no soportado: {connection.vendor}")
+
+        with transaction.atomic():
+            if options['seed']:
+                self._seed(options['seed'])
+            self._analyze()
+            if connection.vendor == 'postgresql':
+                # Con tablas pequeñas el planner prefiere Seq Scan aunque exista el
+                # índice; deshabilitarlo deja el Seq Scan sólo cuando no hay alternativa.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            failures = []
+            for name, queryset in self._hot_queries():
+                plan = queryset.explain()
+                scanned = sorted(set(pattern.findall(plan)))
+                if scanned:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"SEQ SCAN {name}: {', '.join(scanned)}"))
+                else:
+                    self.stdout.write(f"ok       {name}")
+                if options['verbose_plans'] or scanned:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} query(s) sin índice: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("OK: todas las queries calientes usan índices"))
+
+    def _hot_queries(self):
+        """Queries representativas de core/views.py, con los filtros que aplican las vistas."""
+        today = timezone.localdate()
+        week_ago = today - timedelta(days=7)
+        branch_id = Branch.objects.values_list('id', flat=True).first() or 0
+        product_id = Product.objects.values_list('id', flat=True).first() or 0
+        today_sales = Sale.objects.filter(date_range_q('created_at', today, today))
+
+        return [
+            ('api/sales (página por cursor)',
+             Sale.objects.filter(created_at__lte=timezone.now()).order_by('-created_at', '-id')[:51]),
+            ('api/sales/export (sucursal + rango)',
+             SaleItem.objects.filter(sale__branch_id=branch_id)
+             .filter(date_range_q('sale__created_at', week_ago, today)).order_by('sale_id', 'id')
+             .values_list('sale_id', 'product_id', 'quantity', 'price')),
+            ('sales_list (sucursal + rango)',
+             Sale.objects.filter(branch_id=branch_id)
+             .filter(date_range_q('created_at', week_ago, today)).order_by('-created_at')),
+            ('reports/sales (día en curso)',
+             today_sales.values('branch_id').annotate(total=Sum('total'), n=Count('id'))),
+            ('reports/sales (unidades del día)',
+             SaleItem.objects.filter(sale__in=today_sales).values('sale__branch_id').annotate(units=Sum('quantity'))),
+            ('reports/sales (rollup por rango)',
+             SalesDailyRollup.objects.filter(date__gte=week_ago, date__lte=today)
+             .values('branch_id').annotate(total=Sum('total_amount'))),
+            ('api/orders?status=pending',
+             Order.objects.filter(status='pending').order_by('-created_at', '-id')[:51]),
+            ('api/orders/export (rango)',
+             Order.objects.filter(date_range_q('created_at', week_ago, today)).order_by('-created_at')),
+            ('order_items de un pedido',
+             OrderItem.objects.filter(order_id=Order.objects.values_list('id', flat=True).first() or 0)),
+            ('api/inventory?branch=',
+             Inventory.objects.filter(branch_id=branch_id)),
+            ('api/inventory?low_stock=1&branch=',
+             Inventory.objects.filter(branch_id=branch_id, stock__lte=F('reorder_point'))),
+            ('product_detail (inventario del producto)',
+             Inventory.objects.filter(product_id=product_id)),
+            ('sales/batch (deduplicación por client_uuid)',
+             Sale.objects.filter(client_uuid__in=['00000000-0000-0000-0000-000000000000'])),
+        ]
+
+    def _analyze(self):
+        tables = [m._meta.db_table for m in (Sale, SaleItem, Order, OrderItem, Inventory, SalesDailyRollup)]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE ' + ', '.join(connection.ops.quote_name(t) for t in tables))
+            else:
+                cursor.execute('ANALYZE')
+
+    def _seed(self, total):
+        rng = random.Random(0)
+        branches = [Branch.objects.create(name=f'Plan {i}', address='-', phone='-') for i in range(10)]
+        products = Product.objects.bulk_create([
+            Product(sku=f'PLAN-{i}', name=f'Producto {i}', price=1000 + i, cost=500, category='bench')
+            for i in range(200)
+        ])
+        Inventory.objects.bulk_create([
+            Inventory(branch=b, product=p, stock=rng.randint(0, 50), reorder_point=10)
+            for b in branches for p in products
+        ])
+        user = User.objects.create(username='plan_check', role='vendedor')
+
+        Sale.objects.bulk_create(
+            [Sale(branch=rng.choice(branches), user=user, total=1000) for _ in range(total)],
+            batch_size=5000,
+        )
+        sale_ids = list(Sale.objects.filter(user=user).values_list('id', flat=True))
+        SaleItem.objects.bulk_create(
+            [SaleItem(sale_id=sale_id, product=rng.choice(products), quantity=1, price=1000) for sale_id in sale_ids],
+            batch_size=5000,
+        )
+        orders = Order.objects.bulk_create(
+            [Order(customer_name='-', customer_email='plan@example.com',
+                   status=rng.choice(('pending', 'shipped', 'delivered', 'delivered', 'delivered')))
+             for _ in range(total // 4)],
+            batch_size=5000,
+        )
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product=rng.choice(products), quantity=1, price=1000) for order in orders],
+            batch_size=5000,
+        )
+        # auto_now_add ignora valores explícitos: se reparten las fechas en el último año
+        now = timezone.now()
+        for model in (Sale, Order):
+            ids = list(model.objects.order_by('-id').values_list('id', flat=True))
+            step = max(len(ids) // 365, 1)
+            for day, start in enumerate(range(0, len(ids), step)):
+                chunk = ids[start:start + step]
+                model.objects.filter(id__lte=chunk[0], id__gte=chunk[-1]).update(
+                    created_at=now - timedelta(days=min(day, 364))
+                )
@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from core.allocation import place_order
+from core.models import Branch, Inventory, Order, OrderItem, Product, Sale, SaleItem, User
+from core.serializers import SaleSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Lanza muchos vendedores en paralelo contra un único SKU y verifica que "
+        "el stock nunca quede negativo ni se venda más de lo disponible. Con "
+        "--channel web las ventas son checkouts web repartidos entre dos sucursales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=100, help='Stock inicial del SKU')
+        parser.add_argument('--sellers', type=int, default=16, help='Hilos vendedores concurrentes')
+        parser.add_argument('--sales', type=int, default=300, help='Intentos de venta en total')
+        parser.add_argument('--quantity', type=int, default=1, help='Unidades por venta')
+        parser.add_argument('--channel', choices=('pos', 'web'), default='pos', help='POS (una sucursal) o checkout web')
+
+    def handle(self, *args, **options):
+        stock = options['stock']
+        quantity = options['quantity']
+
+        web = options['channel'] == 'web'
+
+        branch = Branch.objects.create(name='Contention', address='-', phone='-')
+        product = Product.objects.create(
+            sku=f'CONTENTION-{int(time.time() * 1000)}', name='SKU caliente',
+            price=1000, cost=500, category='bench',
+        )
+        branches = [branch]
+        if web:
+            # El checkout web reparte entre sucursales: el stock se divide en dos
+            branches.append(Branch.objects.create(name='Contention 2', address='-', phone='-'))
+            Inventory.objects.create(branch=branches[1], product=product, stock=stock - stock // 2)
+        Inventory.objects.create(branch=branch, product=product, stock=stock // 2 if web else stock)
+        user = User.objects.create(username=f'contention_{product.id}', role='vendedor')
+
+        def sell(_):
+            try:
+                if web:
+                    place_order(
+                        [(product.id, quantity)],
+                        customer_name='Contention', customer_email='contention@example.com', status='paid',
+                    )
+                    return 'ok'
+                serializer = SaleSerializer(
+                    data={'branch': branch.id, 'payment_method': 'cash',
+                          'items': [{'product': product.id, 'quantity': quantity}]},
+                    context={'request': SimpleNamespace(user=user)},
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                return 'ok'
+            except OperationalError:
+                # SQLite no bloquea por fila: los escritores concurrentes reciben "database is locked"
+                return 'locked'
+            except Exception:
+                return 'rejected'
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['sellers']) as pool:
+            outcomes = list(pool.map(sell, range(options['sales'])))
+        elapsed = time.perf_counter() - started
+
+        try:
+            final_stock = Inventory.objects.filter(product=product).aggregate(n=Sum('stock'))['n']
+            negative = Inventory.objects.filter(product=product, stock__lt=0).exists()
+            sold_items = OrderItem.objects if web else SaleItem.objects
+            sold = sold_items.filter(product=product).aggregate(n=Sum('quantity'))['n'] or 0
+            accepted = outcomes.count('ok')
+            self.stdout.write(
+                f"aceptadas={accepted} rechazadas={outcomes.count('rejected')} "
+                f"bloqueadas={outcomes.count('locked')} stock_final={final_stock} "
+                f"vendido={sold} tiempo={elapsed:.2f}s"
+            )
+            if negative or sold != accepted * quantity or final_stock != stock - sold:
+                raise CommandError("Inconsistencia de stock bajo concurrencia")
+            self.stdout.write(self.style.SUCCESS("OK: sin sobreventa"))
+        finally:
+            Sale.objects.filter(branch=branch).delete()
+            Order.objects.filter(items__product=product).delete()
+            product.delete()
+            for created in branches:
+                created.delete()
+            user.delete()
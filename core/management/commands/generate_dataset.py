@@ -0,0 +1,438 @@
+import bisect
+import io
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.conditional import BRANCHES, INVENTORY, PRODUCTS, SUPPLIERS, bump_table_version
+from core.dates import day_start
+from core.models import (
+    Branch, Inventory, InventoryMovement, Order, OrderItem, Product, Sale, SaleItem, Subscription, Supplier, Tenant, User,
+    normalize_company,
+)
+from core.rollups import rebuild_rollups
+from core.search import index_products
+
+# Tamaños por tenant (sales y orders son totales del período)
+PROFILES = {
+    'small': {
+        'tenants': 1, 'branches': 3, 'products': 500, 'suppliers': 20, 'cashiers': 2,
+        'customers': 200, 'sales': 20_000, 'orders': 2_000, 'days': 90,
+    },
+    'chain': {
+        'tenants': 1, 'branches': 30, 'products': 5_000, 'suppliers': 150, 'cashiers': 4,
+        'customers': 20_000, 'sales': 1_000_000, 'orders': 100_000, 'days': 365,
+    },
+    'national': {
+        'tenants': 3, 'branches': 40, 'products': 15_000, 'suppliers': 400, 'cashiers': 6,
+        'customers': 100_000, 'sales': 2_000_000, 'orders': 200_000, 'days': 730,
+    },
+}
+
+CATEGORIES = ('abarrotes', 'lácteos', 'carnes', 'panadería', 'bebidas', 'limpieza', 'higiene', 'congelados', 'mascotas')
+WORDS = (
+    'leche', 'arroz', 'aceite', 'azúcar', 'café', 'té', 'galletas', 'fideos', 'harina', 'yogur', 'queso',
+    'jamón', 'pan', 'mantequilla', 'detergente', 'shampoo', 'jabón', 'cloro', 'papel', 'bebida', 'jugo',
+)
+PAYMENT_METHODS = (('debit', 45), ('cash', 25), ('credit', 20), ('transfer', 10))
+# Lunes a domingo: viernes y sábado concentran más ventas
+WEEKDAY_FACTOR = (0.9, 0.85, 0.9, 0.95, 1.2, 1.35, 0.85)
+# Peso de cada hora del día (8:00 a 21:00), con peaks a mediodía y a la salida del trabajo
+HOUR_WEIGHTS = {8: 2, 9: 4, 10: 6, 11: 8, 12: 11, 13: 12, 14: 8, 15: 6, 16: 6, 17: 8, 18: 11, 19: 10, 20: 6, 21: 2}
+QUANTITIES = ((1, 70), (2, 20), (3, 7), (4, 3))
+ZIPF_EXPONENT = 1.07
+BRANCH_SKEW = 0.8
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un dataset sintético de benchmark (perfiles small, chain y national): "
+        "tenants, sucursales, productos, inventario, usuarios, ventas y pedidos web con "
+        "estacionalidad, popularidad de SKUs tipo Zipf y sucursales de distinto tamaño. "
+        "Escribe con COPY en PostgreSQL y bulk_create en lotes en otros motores. Con la "
+        "misma semilla y --end-date el resultado es reproducible sólo sobre una base "
+        "vacía: con datos previos los ids parten del máximo existente y los SKU incluyen "
+        "el id del tenant."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=PROFILES, default='small')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiplica ventas, pedidos y clientes')
+        parser.add_argument('--end-date', help='Último día con ventas (AAAA-MM-DD, por defecto hoy)')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--prefix', default='Dataset', help='Prefijo del nombre de los tenants')
+        parser.add_argument('--password', default='dataset', help='Contraseña de todos los usuarios generados')
+        parser.add_argument('--no-copy', action='store_true', help='Usar bulk_create también en PostgreSQL')
+
+    def handle(self, *args, **options):
+        profile = dict(PROFILES[options['profile']])
+        for key in ('sales', 'orders', 'customers'):
+            profile[key] = max(1, int(profile[key] * options['scale']))
+        end_date = parse_date(options['end_date']) if options['end_date'] else timezone.localdate()
+        if end_date is None:
+            raise CommandError("--end-date debe tener formato AAAA-MM-DD")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.password = make_password(options['password'])  # un solo hash para todos los usuarios
+        self.written = {}
+        started = time.monotonic()
+
+        names = [f"{options['prefix']} {options['profile']} {options['seed']}-{n + 1}" for n in range(profile['tenants'])]
+        if Tenant.objects.filter(code__in=[normalize_company(name) for name in names]).exists():
+            raise CommandError(f"Ya existe un dataset con el prefijo {options['prefix']!r}: use otro --prefix o --seed.")
+
+        date_from = end_date - timedelta(days=profile['days'] - 1)
+        with _explicit_created_at(Sale, Order), transaction.atomic():
+            suppliers = self._suppliers(profile['suppliers'])
+            for name in names:
+                self._tenant(name, profile, suppliers, date_from, end_date)
+            self._reset_sequences()
+
+        self.stdout.write("Recalculando rollups e índices...")
+        rebuild_rollups(date_from, end_date)
+        self._analyze()
+        for label, count in self.written.items():
+            self.stdout.write(f"{label:<18} {count:>12,}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Dataset {options['profile']} (semilla {options['seed']}) generado en "
+            f"{time.monotonic() - started:.1f}s con {'COPY' if self.use_copy else 'bulk_create'}"
+        ))
+
+    # --- Entidades ---
+
+    def _suppliers(self, count):
+        writer = self._writer(Supplier, ['id', 'name', 'rut', 'contact'])
+        ids = []
+        for index in range(count):
+            ids.append(writer.add((f'Proveedor {index + 1}', _rut(10_000_000 + index * 37), f'Contacto {index + 1}')))
+        writer.close()
+        bump_table_version(SUPPLIERS, [0])
+        return ids
+
+    def _tenant(self, name, profile, suppliers, date_from, date_to):
+        rng = self.rng
+        self.stdout.write(f"Generando {name}...")
+        tenant = Tenant.objects.resolve(name)
+        Subscription.objects.create(
+            company=name, plan_name='premium', active=True,
+            start_date=date_from, end_date=date_to + timedelta(days=365),
+        )
+        branches = [
+            Branch.objects.create(name=f'{name} sucursal {n + 1}', address=f'Av. Principal {100 + n}',
+                                  phone=f'+5645{2000000 + n}', company=name)
+            for n in range(profile['branches'])
+        ]
+        branch_ids = [branch.id for branch in branches]
+        # Sucursales de distinto tamaño: la de mayor venta pesa ~n^0.8 veces la menor
+        branch_cum = list(accumulate(1 / (rank ** BRANCH_SKEW) for rank in range(1, len(branch_ids) + 1)))
+
+        products = self._products(tenant, profile['products'], suppliers)
+        product_ids = [product_id for product_id, _ in products]
+        prices = dict(products)
+        # Popularidad Zipf sobre un orden aleatorio (el id no indica popularidad)
+        popularity = product_ids[:]
+        rng.shuffle(popularity)
+        product_cum = list(accumulate(1 / (rank ** ZIPF_EXPONENT) for rank in range(1, len(popularity) + 1)))
+        self._inventory(branch_ids, popularity, day_start(date_from))
+
+        staff = self._users(name, tenant, [
+            ('admin_cliente', 1),
+            ('gerente', len(branch_ids)),
+            ('vendedor', len(branch_ids) * profile['cashiers']),
+        ])
+        cashiers = {
+            branch_id: staff['vendedor'][n * profile['cashiers']:(n + 1) * profile['cashiers']]
+            for n, branch_id in enumerate(branch_ids)
+        }
+        customers = self._users(name, tenant, [('cliente_final', profile['customers'])])['cliente_final']
+
+        pick = _Picker(rng, branch_ids, branch_cum, popularity, product_cum, prices)
+        days = [date_from + timedelta(days=n) for n in range((date_to - date_from).days + 1)]
+        self._sales(days, profile['sales'], pick, cashiers)
+        self._orders(days, profile['orders'], pick, customers, date_to)
+
+        bump_table_version(PRODUCTS, [tenant.id])
+        bump_table_version(INVENTORY, branch_ids)
+        bump_table_version(BRANCHES, [tenant.id])
+
+    def _products(self, tenant, count, suppliers):
+        rng = self.rng
+        writer = self._writer(Product, [
+            'id', 'sku', 'name', 'description', 'supplier_id', 'price', 'cost', 'category', 'tenant_id', 'catalog_version',
+        ])
+        products = []
+        for index in range(count):
+            # Precios log-normales alrededor de $2.500, redondeados a $10
+            price = max(190, int(rng.lognormvariate(math.log(2500), 0.8)) // 10 * 10)
+            name = f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {index + 1}'
+            product_id = writer.add((
+                f'T{tenant.id}-{index + 1:07d}', name, f'{name} ({CATEGORIES[index % len(CATEGORIES)]})',
+                rng.choice(suppliers), price, int(price * rng.uniform(0.55, 0.8)),
+                CATEGORIES[index % len(CATEGORIES)], tenant.id, 0,
+            ))
+            products.append((product_id, price))
+        writer.close()
+        # Las cargas masivas no pasan por las señales del índice de búsqueda
+        index_products(Product.objects.filter(tenant=tenant))
+        return products
+
+    def _inventory(self, branch_ids, popularity, opened_at):
+        rng = self.rng
+        writer = self._writer(Inventory, ['id', 'branch_id', 'product_id', 'stock', 'reorder_point', 'catalog_version'])
+        # Saldo inicial en el libro de movimientos al comienzo del período generado
+        opening = self._writer(InventoryMovement, [
+            'id', 'branch_id', 'product_id', 'kind', 'quantity', 'reference', 'user_id', 'created_at',
+        ])
+        top = len(popularity)
+        for branch_id in branch_ids:
+            for rank, product_id in enumerate(popularity):
+                reorder_point = rng.randint(5, 20)
+                # Los más vendidos tienen más stock; ~8% queda bajo el punto de reorden
+                stock = rng.randint(0, reorder_point) if rng.random() < 0.08 else \
+                    reorder_point + int(rng.expovariate(1 / (20 + 400 * (1 - rank / top))))
+                writer.add((branch_id, product_id, stock, reorder_point, 0))
+                if stock:
+                    opening.add((branch_id, product_id, 'opening', stock, None, None, opened_at))
+        writer.close()
+        opening.close()
+
+    def _users(self, name, tenant, roles):
+        writer = self._writer(User, [
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff',
+            'is_active', 'date_joined', 'role', 'company', 'tenant_id', 'created_at',
+        ])
+        code = tenant.code.replace(' ', '_')
+        now = timezone.now()
+        users = {}
+        for role, count in roles:
+            users[role] = [
+                writer.add((
+                    self.password, False, f'{code}_{role}_{n + 1}', role.split('_')[0].capitalize(), str(n + 1),
+                    f'{role}{n + 1}@{code}.example.com', False, True, now, role, name, tenant.id, now,
+                ))
+                for n in range(count)
+            ]
+        writer.close()
+        return users
+
+    def _sales(self, days, total, pick, cashiers):
+        rng = self.rng
+        sales = self._writer(Sale, ['id', 'branch_id', 'user_id', 'total', 'payment_method', 'client_uuid', 'created_at'])
+        items = self._writer(SaleItem, ['id', 'sale_id', 'product_id', 'quantity', 'price'])
+        payment_cum = list(accumulate(weight for _, weight in PAYMENT_METHODS))
+        for day, count in zip(days, _daily_counts(days, total, rng)):
+            start = day_start(day)
+            for _ in range(count):
+                branch_id = pick.branch()
+                lines = pick.lines(max_lines=12, mean_lines=3)
+                sale_id = sales.add((
+                    branch_id, rng.choice(cashiers[branch_id]),
+                    sum(quantity * price for _, quantity, price in lines),
+                    PAYMENT_METHODS[bisect.bisect(payment_cum, rng.random() * payment_cum[-1])][0],
+                    None, start + pick.time_of_day(),
+                ))
+                for product_id, quantity, price in lines:
+                    items.add((sale_id, product_id, quantity, price))
+        sales.close()
+        items.close()
+
+    def _orders(self, days, total, pick, customers, last_day):
+        rng = self.rng
+        orders = self._writer(Order, ['id', 'user_id', 'customer_name', 'customer_email', 'status', 'total', 'created_at'])
+        items = self._writer(OrderItem, ['id', 'order_id', 'product_id', 'branch_id', 'quantity', 'price'])
+        for day, count in zip(days, _daily_counts(days, total, rng)):
+            start = day_start(day)
+            age = (last_day - day).days
+            for _ in range(count):
+                customer = rng.choice(customers)
+                lines = pick.lines(max_lines=6, mean_lines=2)
+                # Los pedidos antiguos ya se entregaron; los recientes siguen en curso
+                if age > 7:
+                    status = 'cancelled' if rng.random() < 0.04 else 'delivered'
+                else:
+                    status = rng.choice(('pending', 'pending', 'shipped', 'delivered'))
+                order_id = orders.add((
+                    customer, f'Cliente {customer}', f'cliente{customer}@example.com', status,
+                    sum(quantity * price for _, quantity, price in lines), start + pick.time_of_day(),
+                ))
+                branch_id = pick.branch()
+                for product_id, quantity, price in lines:
+                    items.add((order_id, product_id, branch_id, quantity, price))
+        orders.close()
+        items.close()
+
+    # --- Escritura ---
+
+    def _writer(self, model, fields):
+        return _RowWriter(model, fields, self.batch_size, self.use_copy, self.written)
+
+    def _reset_sequences(self):
+        """Los ids se asignan en Python: se ajustan las secuencias (PostgreSQL) al máximo insertado."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Supplier, Product, Inventory, InventoryMovement, User, Sale, SaleItem, Order, OrderItem],
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def _analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+class _Picker:
+    """Elecciones aleatorias ponderadas (sucursal, productos, hora) con búsqueda binaria sobre pesos acumulados."""
+
+    def __init__(self, rng, branch_ids, branch_cum, popularity, product_cum, prices):
+        self.rng = rng
+        self.branch_ids, self.branch_cum = branch_ids, branch_cum
+        self.popularity, self.product_cum = popularity, product_cum
+        self.prices = prices
+        self.hours = list(HOUR_WEIGHTS)
+        self.hour_cum = list(accumulate(HOUR_WEIGHTS.values()))
+        self.quantity_cum = list(accumulate(weight for _, weight in QUANTITIES))
+
+    def _weighted(self, values, cum):
+        return values[bisect.bisect(cum, self.rng.random() * cum[-1])]
+
+    def branch(self):
+        return self._weighted(self.branch_ids, self.branch_cum)
+
+    def lines(self, max_lines, mean_lines):
+        """[(product_id, quantity, price)]: cantidad de líneas geométrica con media `mean_lines`."""
+        count = 1
+        while count < max_lines and self.rng.random() > 1 / mean_lines:
+            count += 1
+        # dict.fromkeys descarta repetidos conservando el orden (un set dependería de los ids)
+        chosen = dict.fromkeys(self._weighted(self.popularity, self.product_cum) for _ in range(count))
+        return [
+            (product_id, self._weighted(QUANTITIES, self.quantity_cum)[0], self.prices[product_id])
+            for product_id in chosen
+        ]
+
+    def time_of_day(self):
+        hour = self._weighted(self.hours, self.hour_cum)
+        return timedelta(hours=hour, seconds=self.rng.randrange(3600))
+
+
+def _daily_counts(days, total, rng):
+    """Reparte `total` entre los días según día de la semana, temporada (peak en diciembre) y tendencia."""
+    weights = []
+    for index, day in enumerate(days):
+        season = 1 + 0.25 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 355) / 365.25)
+        trend = 1 + 0.15 * index / max(len(days) - 1, 1)
+        weights.append(WEEKDAY_FACTOR[day.weekday()] * season * trend * rng.uniform(0.9, 1.1))
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for index in range(total - sum(counts)):
+        counts[index % len(counts)] += 1
+    return counts
+
+
+def _rut(number):
+    """RUT chileno con dígito verificador (módulo 11)."""
+    total, factor = 0, 2
+    for digit in reversed(str(number)):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    check = 11 - total % 11
+    return f"{number}-{'0' if check == 11 else 'K' if check == 10 else check}"
+
+
+class _RowWriter:
+    """
+    Inserta filas (tuplas en el orden de `fields`, sin el id) en lotes. Los ids
+    se asignan aquí, a partir del máximo actual, para poder referenciarlos sin
+    leerlos de vuelta. En PostgreSQL usa COPY ... FROM STDIN (CSV); en el resto,
+    bulk_create.
+    """
+
+    def __init__(self, model, fields, batch_size, use_copy, written):
+        self.model = model
+        self.fields = fields
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.written = written
+        self.next_id = (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+        self.rows = []
+
+    def add(self, values):
+        row_id = self.next_id
+        self.next_id += 1
+        self.rows.append((row_id, *values))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+        return row_id
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.use_copy:
+            self._copy()
+        else:
+            self.model.objects.bulk_create(
+                [self.model(**dict(zip(self.fields, row))) for row in self.rows], batch_size=self.batch_size,
+            )
+        label = self.model.__name__
+        self.written[label] = self.written.get(label, 0) + len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def _copy(self):
+        buffer = io.StringIO()
+        buffer.writelines(','.join(map(_copy_field, row)) + '\n' for row in self.rows)
+        buffer.seek(0)
+        columns = ', '.join(
+            connection.ops.quote_name(self.model._meta.get_field(field).column) for field in self.fields
+        )
+        sql = f'COPY {connection.ops.quote_name(self.model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)'
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                raw.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+
+def _copy_field(value):
+    """
+    Campo CSV para COPY: None va como campo vacío sin comillas (NULL) y el resto
+    entre comillas ('' queda como string vacío). csv.QUOTE_NONNUMERIC no sirve:
+    hasta Python 3.11 escribe None como "" y COPY lo lee como string vacío.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+@contextmanager
+def _explicit_created_at(*models):
+    """bulk_create respeta created_at sólo si el campo no es auto_now_add mientras dura la carga."""
+    fields = [model._meta.get_field('created_at') for model in models]
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
@@ -0,0 +1,50 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Tenant, normalize_company
+from core.product_import import IMPORT_BATCH_SIZE, ImportFormatError, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa (crea o actualiza por SKU) el catálogo de productos de una empresa "
+        "desde un archivo CSV o XLSX con columnas sku, name, price y opcionalmente "
+        "cost, category, description y supplier_rut. Es la misma lógica que "
+        "POST /api/products/import/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo .csv o .xlsx')
+        parser.add_argument('--company', required=True, help='Nombre de la empresa (tenant)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Filas por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Sólo valida, no escribe')
+
+    def handle(self, *args, **options):
+        tenant = Tenant.objects.filter(code=normalize_company(options['company'])).first()
+        if tenant is None:
+            raise CommandError(f"No existe la empresa {options['company']!r}.")
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as upload:
+                report = import_products(
+                    read_rows(upload, options['path']), tenant.id,
+                    batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except ImportFormatError as exc:
+            raise CommandError(f"No se pudo leer el archivo: {exc}")
+        elapsed = time.monotonic() - started
+
+        for error in report['errors']:
+            self.stderr.write(json.dumps(error, ensure_ascii=False))
+        summary = (
+            f"{report['rows']} fila(s) en {elapsed:.1f}s: {report['created']} creada(s), "
+            f"{report['updated']} actualizada(s), {report['error_count']} con errores"
+        )
+        if options['dry_run']:
+            summary += " (dry-run, sin cambios)"
+        self.stdout.write(self.style.SUCCESS(summary) if not report['error_count'] else summary)
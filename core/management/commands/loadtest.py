@@ -0,0 +1,330 @@
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.utils import timezone
+
+from core.conditional import INVENTORY, PRODUCTS, bump_table_version
+from core.ledger import record_movements, record_opening_balances
+from core.models import Branch, Inventory, Product, Subscription, Tenant, User
+from core.search import index_products
+
+TENANT_NAME = 'LoadTest'
+PASSWORD = 'loadtest-password'
+STOCK = 1_000_000
+ROLES = {'cashier': 'vendedor', 'shopper': 'cliente_final', 'manager': 'gerente'}
+CATEGORIES = ('abarrotes', 'lácteos', 'limpieza', 'higiene', 'bebidas', 'congelados')
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga: crea (o reutiliza) el tenant LoadTest y ejecuta en paralelo "
+        "cajeros (POST /api/sales/), compradores web (cart/add + cart/checkout) y "
+        "gerentes (GET /api/reports/sales/). Entrega latencias p50/p95/p99 y "
+        "throughput por endpoint en JSON para comparar entre versiones.\n"
+        "Sin --base-url las requests se atienden en este proceso (test Client; el GIL "
+        "limita el paralelismo). Con --base-url se mide un servidor real que use la "
+        "misma base de datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cashiers', type=int, default=8)
+        parser.add_argument('--shoppers', type=int, default=4)
+        parser.add_argument('--managers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=30.0, help='Segundos de carga')
+        parser.add_argument('--branches', type=int, default=4)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--base-url', help='ej: http://localhost:8000 (por defecto, en proceso)')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla del generador aleatorio')
+        parser.add_argument('--output', help='Además de stdout, escribe el JSON en este archivo')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        counts = {role: options[f'{role}s'] for role in ROLES}
+        if not any(counts.values()):
+            raise CommandError("Indique al menos un cajero, comprador o gerente.")
+
+        tenant, branch_ids, product_ids = self._seed(options['branches'], options['products'])
+        users = self._users(counts)
+        transport = HttpTransport(options['base_url']) if options['base_url'] else InProcessTransport()
+        stats = Stats()
+        # Popularidad sesgada: pocos productos concentran la mayoría de las ventas
+        weights = [1 / rank for rank in range(1, len(product_ids) + 1)]
+        context = {'branch_ids': branch_ids, 'product_ids': product_ids, 'weights': weights}
+
+        workers = [(role, user) for role, role_users in users.items() for user in role_users]
+        deadline = time.monotonic() + options['duration']
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            futures = [
+                pool.submit(
+                    self._run_worker, transport, SCENARIOS[role], user,
+                    random.Random(f"{options['seed']}-{index}"), context, stats, deadline,
+                )
+                for index, (role, user) in enumerate(workers)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.monotonic() - started
+
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'target': options['base_url'] or 'in-process',
+            'database': connection.vendor,
+            'duration_s': round(elapsed, 2),
+            'workers': counts,
+            'dataset': {'tenant': tenant.id, 'branches': len(branch_ids), 'products': len(product_ids)},
+            'endpoints': stats.summary(elapsed),
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+        self.stdout.write(output)
+
+    @staticmethod
+    def _run_worker(transport, scenario, user, rng, context, stats, deadline):
+        session = Session(transport, user, stats)
+        try:
+            while time.monotonic() < deadline:
+                scenario(session, rng, context)
+        finally:
+            connection.close()
+
+    # --- Datos ---
+
+    def _seed(self, branch_count, product_count):
+        """Tenant con plan premium, sucursales, productos y stock abundante (idempotente)."""
+        with transaction.atomic():
+            tenant = Tenant.objects.resolve(TENANT_NAME)
+            today = timezone.localdate()
+            if not Subscription.objects.for_tenant(tenant.id).filter(active=True).exists():
+                Subscription.objects.create(
+                    company=TENANT_NAME, plan_name='premium', active=True,
+                    start_date=today, end_date=today + timedelta(days=365),
+                )
+            branches = list(Branch.objects.for_tenant(tenant.id).order_by('id').values_list('id', flat=True))
+            for index in range(len(branches), branch_count):
+                branches.append(Branch.objects.create(
+                    name=f'LoadTest {index + 1}', address=f'Calle {index + 1}', company=TENANT_NAME,
+                ).id)
+
+            existing = Product.objects.for_tenant(tenant.id).count()
+            if existing < product_count:
+                new_products = Product.objects.bulk_create([
+                    Product(
+                        sku=f'LT-{index:07d}', name=f'Producto carga {index}',
+                        category=CATEGORIES[index % len(CATEGORIES)],
+                        price=random.randint(5, 500) * 100, cost=100, tenant=tenant,
+                    )
+                    for index in range(existing, product_count)
+                ], batch_size=1000)
+                # bulk_create no dispara señales: se indexa explícitamente
+                index_products(new_products)
+            products = list(
+                Product.objects.for_tenant(tenant.id).order_by('id').values_list('id', flat=True)[:product_count]
+            )
+
+            present = set(
+                Inventory.objects.filter(branch_id__in=branches).values_list('branch_id', 'product_id')
+            )
+            Inventory.objects.bulk_create([
+                Inventory(branch_id=branch_id, product_id=product_id, stock=STOCK, reorder_point=10)
+                for branch_id in branches[:branch_count]
+                for product_id in products
+                if (branch_id, product_id) not in present
+            ], batch_size=1000)
+            # Repone el stock consumido por corridas anteriores
+            low = Inventory.objects.select_for_update().filter(branch_id__in=branches, stock__lt=STOCK // 2)
+            restock = [
+                (branch_id, product_id, STOCK - stock)
+                for branch_id, product_id, stock in low.values_list('branch_id', 'product_id', 'stock')
+            ]
+            low.update(stock=STOCK)
+            record_movements('adjustment', restock)
+            record_opening_balances(branches)
+            # Las escrituras masivas no pasan por las señales que invalidan los ETag
+            bump_table_version(PRODUCTS, [tenant.id])
+            bump_table_version(INVENTORY, branches)
+        return tenant, branches[:branch_count], products
+
+    def _users(self, counts):
+        password = make_password(PASSWORD)  # un solo hash para todos los usuarios de carga
+        users = {}
+        for role, count in counts.items():
+            users[role] = []
+            for index in range(count):
+                user, _ = User.objects.get_or_create(
+                    username=f'loadtest_{role}_{index}',
+                    defaults={'role': ROLES[role], 'company': TENANT_NAME, 'password': password},
+                )
+                users[role].append(user)
+        return users
+
+
+# --- Escenarios: cada llamada es una iteración de un usuario ---
+
+def cashier(session, rng, context):
+    items = [
+        {'product': product_id, 'quantity': rng.randint(1, 3)}
+        for product_id in set(rng.choices(context['product_ids'], context['weights'], k=rng.randint(1, 5)))
+    ]
+    session.request('POST', '/api/sales/', {
+        'branch': rng.choice(context['branch_ids']),
+        'payment_method': rng.choice(('cash', 'debit', 'credit', 'transfer')),
+        'client_uuid': str(uuid.uuid4()),
+        'items': items,
+    })
+
+
+def shopper(session, rng, context):
+    products = set(rng.choices(context['product_ids'], context['weights'], k=rng.randint(1, 3)))
+    for product_id in products:
+        session.request('POST', '/api/cart/add/', {'product_id': product_id, 'quantity': rng.randint(1, 2)})
+    session.request('POST', '/api/cart/checkout/', {})
+
+
+def manager(session, rng, context):
+    today = timezone.localdate()
+    granularity = rng.choice(('day', 'week', 'month'))
+    days = {'day': 7, 'week': 56, 'month': 180}[granularity]
+    session.request(
+        'GET',
+        f'/api/reports/sales/?granularity={granularity}'
+        f'&date_from={today - timedelta(days=days)}&date_to={today}',
+    )
+
+
+SCENARIOS = {'cashier': cashier, 'shopper': shopper, 'manager': manager}
+
+
+# --- Transporte y métricas ---
+
+class Session:
+    """Usuario autenticado por JWT; renueva el token si el servidor responde 401."""
+
+    def __init__(self, transport, user, stats):
+        self.transport = transport
+        self.user = user
+        self.stats = stats
+        self.token = None
+
+    def request(self, method, path, payload=None):
+        if self.token is None:
+            self._login()
+        started = time.perf_counter()
+        status, _ = self.transport.request(method, path, payload, self.token)
+        if status == 401:
+            self._login()
+            started = time.perf_counter()
+            status, _ = self.transport.request(method, path, payload, self.token)
+        self.stats.record(f"{method} {path.split('?')[0]}", status, (time.perf_counter() - started) * 1000)
+        return status
+
+    def _login(self):
+        status, body = self.transport.request(
+            'POST', '/api/token/', {'username': self.user.username, 'password': PASSWORD},
+        )
+        if status != 200:
+            raise CommandError(f"No se pudo obtener el token de {self.user.username}: {status}")
+        self.token = body['access']
+
+
+class InProcessTransport:
+    """Atiende las requests en este proceso con el test Client de Django (un cliente por hilo)."""
+
+    def __init__(self):
+        self._local = threading.local()
+        hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '')]
+        self.host = hosts[0].lstrip('.') if hosts else 'localhost'
+
+    def request(self, method, path, payload=None, token=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client(SERVER_NAME=self.host, raise_request_exception=False)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if method == 'GET':
+            response = client.get(path, **headers)
+        else:
+            response = client.generic(
+                method, path, json.dumps(payload or {}), content_type='application/json', **headers,
+            )
+        return response.status_code, _json(response.content)
+
+
+class HttpTransport:
+    """Envía las requests por HTTP a un servidor en ejecución."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, payload=None, token=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+        if token:
+            request.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, _json(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, _json(error.read())
+        except OSError:
+            return 0, None  # conexión rechazada o timeout
+
+
+def _json(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = defaultdict(list)
+        self._statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, status, elapsed_ms):
+        with self._lock:
+            self._timings[endpoint].append(elapsed_ms)
+            self._statuses[endpoint][status] += 1
+
+    def summary(self, elapsed):
+        report = {}
+        for endpoint, timings in sorted(self._timings.items()):
+            timings = sorted(timings)
+            statuses = self._statuses[endpoint]
+            ok = sum(count for status, count in statuses.items() if 200 <= status < 300)
+            report[endpoint] = {
+                'requests': len(timings),
+                'errors': len(timings) - ok,
+                'status': {str(status): count for status, count in sorted(statuses.items())},
+                'throughput_rps': round(ok / elapsed, 2) if elapsed else None,
+                'mean_ms': round(sum(timings) / len(timings), 2),
+                'p50_ms': _percentile(timings, 50),
+                'p95_ms': _percentile(timings, 95),
+                'p99_ms': _percentile(timings, 99),
+                'max_ms': round(timings[-1], 2),
+            }
+        return report
+
+
+def _percentile(ordered, percent):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return round(ordered[index], 2)
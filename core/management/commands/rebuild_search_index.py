@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el índice de búsqueda de productos (tabla FTS5 en SQLite). "
+        "En PostgreSQL los índices GIN se mantienen solos y no hay nada que hacer."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write("El motor mantiene los índices de búsqueda; no hay nada que reconstruir.")
+            return
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"{indexed} producto(s) indexado(s)"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.forecast import ALPHA, HISTORY_DAYS, HORIZON_DAYS, PRODUCT_BLOCK, refresh_forecasts
+from core.models import Tenant, normalize_company
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los pronósticos de demanda por producto y sucursal "
+        "(GET /api/inventory/forecast/) desde el historial de ventas: estacionalidad "
+        "por día de la semana y suavizamiento exponencial ajustados con NumPy por "
+        "bloques de productos. Pensado para cron, una vez al día."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', help='Nombre de la empresa (por defecto todas)')
+        parser.add_argument('--history-days', type=int, default=HISTORY_DAYS, help='Días de historia (se usan semanas completas)')
+        parser.add_argument('--horizon', type=int, default=HORIZON_DAYS, help='Días a pronosticar')
+        parser.add_argument('--alpha', type=float, default=ALPHA, help='Suavizamiento exponencial (0 a 1)')
+        parser.add_argument('--block-size', type=int, default=PRODUCT_BLOCK, help='Productos por bloque')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by('id')
+        if options['company']:
+            tenants = tenants.filter(code=normalize_company(options['company']))
+            if not tenants.exists():
+                raise CommandError(f"No existe la empresa {options['company']!r}.")
+        if options['history_days'] < 14 or options['horizon'] < 1 or options['block_size'] < 1:
+            raise CommandError("Se requieren al menos 14 días de historia, horizonte y bloque mayores que 0.")
+        if not 0 < options['alpha'] <= 1:
+            raise CommandError("--alpha debe estar entre 0 y 1.")
+
+        started = time.monotonic()
+        for tenant in tenants:
+            summary = refresh_forecasts(
+                tenant.id, history_days=options['history_days'], horizon=options['horizon'],
+                alpha=options['alpha'], block_size=options['block_size'],
+            )
+            seconds = summary['seconds']
+            self.stdout.write(
+                f"{tenant.name}: {summary['products']} producto(s), {summary['series']} serie(s) con ventas "
+                f"- lectura {seconds['load']}s, ajuste {seconds['fit']}s, escritura {seconds['write']}s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Pronósticos actualizados en {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from core.jobs import JOB_STALE_AFTER, Heartbeat, claim_next, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta los trabajos en segundo plano de la tabla Job (reportes pesados, "
+        "importaciones) con un pool de procesos. Cada proceso toma trabajos con "
+        "SELECT ... FOR UPDATE SKIP LOCKED (compare-and-set en SQLite), así que se "
+        "pueden levantar varios runworker contra la misma base. SIGTERM o Ctrl-C "
+        "terminan los trabajos en curso antes de salir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Procesos worker')
+        parser.add_argument('--poll', type=float, default=1.0, help='Segundos entre consultas con la cola vacía')
+        parser.add_argument('--once', action='store_true', help='Vacía la cola y termina')
+        parser.add_argument(
+            '--stale-after', type=int, default=JOB_STALE_AFTER,
+            help='Segundos sin latido para reencolar un trabajo de un worker caído',
+        )
+
+    def handle(self, *args, **options):
+        stop = multiprocessing.Event()
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        requeued = requeue_stale(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"{requeued} trabajo(s) abandonado(s) reencolado(s) o marcados fallidos")
+
+        if options['processes'] <= 1:
+            self._stop_on_signals(stop)
+            work(f'{prefix}/0', stop, options['poll'], options['once'])
+            return
+
+        # Los hijos heredan el proceso por fork: no deben compartir la conexión del padre
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=_child, args=(f'{prefix}/{index}', stop, options['poll'], options['once']), daemon=True,
+            )
+            for index in range(options['processes'])
+        ]
+        for process in workers:
+            process.start()
+        self._stop_on_signals(stop)
+        self.stdout.write(f"{len(workers)} worker(s) en ejecución ({prefix})")
+
+        last_sweep = time.monotonic()
+        while any(process.is_alive() for process in workers):
+            time.sleep(options['poll'])
+            if time.monotonic() - last_sweep >= options['stale_after'] / 2:
+                requeue_stale(options['stale_after'])
+                close_old_connections()
+                last_sweep = time.monotonic()
+        for process in workers:
+            process.join()
+
+    @staticmethod
+    def _stop_on_signals(stop):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+
+def _child(worker, stop, poll, once):
+    # Ctrl-C llega a todo el grupo de procesos: lo atiende el padre, que avisa con
+    # `stop` y espera a que cada hijo termine su trabajo en curso
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    work(worker, stop, poll, once)
+
+
+def work(worker, stop, poll, once):
+    """Ciclo de un worker: toma y ejecuta trabajos hasta `stop` (o hasta vaciar la cola con `once`)."""
+    while not stop.is_set():
+        close_old_connections()
+        job = claim_next(worker)
+        if job is None:
+            if once:
+                return
+            stop.wait(poll)
+            continue
+        # El latido no depende de que el trabajo informe avance
+        with Heartbeat(job):
+            run_job(job)
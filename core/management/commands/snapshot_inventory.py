@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.ledger import (
+    SNAPSHOT_LAG, ledger_differences, prune_snapshots, record_opening_balances, take_snapshots,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Toma un checkpoint de los saldos de inventario por sucursal desde el libro "
+        "de movimientos, para que el stock a una fecha sume sólo el rango desde el "
+        "último checkpoint. Pensado para cron; con --every se queda corriendo. "
+        "--opening registra saldos iniciales del stock que aún no está en el libro y "
+        "--verify compara el libro con Inventory.stock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0, help='Segundos entre checkpoints (0 = una sola vez)')
+        parser.add_argument(
+            '--lag', type=int, default=int(SNAPSHOT_LAG.total_seconds()),
+            help='Segundos de desfase del checkpoint (transacciones aún abiertas)',
+        )
+        parser.add_argument('--keep-days', type=int, default=0, help='Borra checkpoints más antiguos (0 = conservar todos)')
+        parser.add_argument('--opening', action='store_true', help='Registra saldos iniciales antes del checkpoint')
+        parser.add_argument('--verify', action='store_true', help='Sólo compara el libro con el stock actual')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self._verify()
+        if options['opening']:
+            self.stdout.write(f"{record_opening_balances()} saldo(s) inicial(es) registrado(s)")
+        while True:
+            written = take_snapshots(timezone.now() - timedelta(seconds=options['lag']))
+            self.stdout.write(
+                f"Checkpoint de {len(written)} sucursal(es), {sum(written.values())} saldo(s)"
+            )
+            if options['keep_days']:
+                deleted = prune_snapshots(timezone.now() - timedelta(days=options['keep_days']))
+                self.stdout.write(f"{deleted} saldo(s) de checkpoints antiguos eliminado(s)")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def _verify(self):
+        differences = ledger_differences()
+        for branch_id, product_id, stock, balance in differences[:50]:
+            self.stdout.write(f"sucursal {branch_id} producto {product_id}: stock {stock}, libro {balance}")
+        if differences:
+            raise CommandError(f"{len(differences)} fila(s) de inventario no cuadran con el libro de movimientos")
+        self.stdout.write(self.style.SUCCESS("El libro de movimientos cuadra con el inventario"))
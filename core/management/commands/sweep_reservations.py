@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.reservations import sweep_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Libera en lotes las reservas de stock de carritos ya vencidas. Pensado "
+        "para cron; con --every se queda corriendo y barre cada N segundos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservas eliminadas por DELETE')
+        parser.add_argument('--every', type=int, default=0, help='Segundos entre barridos (0 = una sola vez)')
+
+    def handle(self, *args, **options):
+        while True:
+            released = sweep_expired(batch_size=options['batch_size'])
+            self.stdout.write(f"{released} reserva(s) vencida(s) liberada(s)")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,81 @@
+import json
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import QueryBudgetExceeded, QueryRecorder, view_budget
+
+query_logger = logging.getLogger('core.queries')
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Mide las queries de cada request: cantidad, tiempo total en la base,
+    huellas repetidas (posibles N+1) y las más lentas, por vista.
+
+    - Con DEBUG se agregan a la respuesta los headers X-DB-View, X-DB-Queries,
+      X-DB-Time-ms y X-DB-Duplicates.
+    - En producción se registra una muestra (settings.QUERY_LOG_SAMPLE_RATE) en
+      el logger `core.queries`, más toda request que exceda su presupuesto.
+
+    Las queries que se ejecutan mientras se envía una StreamingHttpResponse
+    (exportaciones) no alcanzan a contarse.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSTRUMENTATION:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        view_name, budget = getattr(request, '_query_view', (None, None))
+        over_budget = budget is not None and recorder.count > budget
+        if settings.DEBUG:
+            response['X-DB-View'] = view_name or ''
+            response['X-DB-Queries'] = recorder.count
+            response['X-DB-Time-ms'] = f'{recorder.total_ms:.1f}'
+            response['X-DB-Duplicates'] = sum(recorder.duplicates().values())
+        if over_budget or random.random() < settings.QUERY_LOG_SAMPLE_RATE:
+            self._log(request, response, view_name, budget, recorder, over_budget)
+        if over_budget and settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(
+                f"{view_name} ejecutó {recorder.count} queries (presupuesto {budget}): "
+                f"{list(recorder.duplicates().items())[:3]}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_view = view_budget(view_func, request.method)
+
+    @staticmethod
+    def _log(request, response, view_name, budget, recorder, over_budget):
+        query_logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps({
+                'view': view_name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': recorder.count,
+                'budget': budget,
+                'db_ms': round(recorder.total_ms, 1),
+                'duplicates': [
+                    {'sql': sql[:300], 'count': count}
+                    for sql, count in list(recorder.duplicates().items())[:5]
+                ],
+                'slowest': [
+                    {'sql': sql[:300], 'ms': round(elapsed, 2)}
+                    for sql, elapsed in recorder.slowest()
+                ],
+            }, ensure_ascii=False),
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_sale_order_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, help_text='Identificador generado por el POS; evita duplicar ventas al sincronizar colas offline', null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sale_client_uuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Fecha de negocio (zona horaria del sistema)')),
+                ('payment_method', models.CharField(choices=[('cash', 'Efectivo'), ('debit', 'Débito'), ('credit', 'Crédito'), ('transfer', 'Transferencia')], max_length=20)),
+                ('total_amount', models.BigIntegerField(default=0, help_text='Total vendido en pesos chilenos')),
+                ('transactions', models.IntegerField(default=0)),
+                ('items', models.IntegerField(default=0, help_text='Unidades vendidas')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='rollup_date_idx')],
+                'unique_together': {('branch', 'date', 'payment_method')},
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Valor por defecto histórico de Subscription.company; no representa una empresa real
+PLACEHOLDER_COMPANY = 'sin empresa'
+
+
+def populate_tenants(apps, schema_editor):
+    Tenant = apps.get_model('core', 'Tenant')
+    User = apps.get_model('core', 'User')
+    Branch = apps.get_model('core', 'Branch')
+    Subscription = apps.get_model('core', 'Subscription')
+    Product = apps.get_model('core', 'Product')
+
+    # code normalizado -> variantes del string tal como aparecen en la BD
+    variants = {}
+    for model in (User, Branch, Subscription):
+        for company in model.objects.exclude(company__isnull=True).values_list('company', flat=True).distinct():
+            code = company.strip().lower()
+            if code and code != PLACEHOLDER_COMPANY:
+                variants.setdefault(code, set()).add(company)
+
+    for code, companies in variants.items():
+        name = sorted(companies)[0].strip()
+        tenant, _ = Tenant.objects.get_or_create(code=code, defaults={'name': name})
+        for model in (User, Branch, Subscription):
+            model.objects.filter(company__in=companies).update(tenant=tenant)
+        # Un producto pertenece al tenant de las sucursales donde tiene inventario
+        Product.objects.filter(tenant__isnull=True, inventory__branch__tenant=tenant).update(tenant=tenant)
+
+
+def clear_tenants(apps, schema_editor):
+    Tenant = apps.get_model('core', 'Tenant')
+    for model_name in ('User', 'Branch', 'Subscription', 'Product'):
+        apps.get_model('core', model_name).objects.update(tenant=None)
+    Tenant.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tenant'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_tenants, clear_tenants),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_populate_tenants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('reorder_point'))), fields=['branch', 'product'], name='inventory_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['branch', 'created_at'], name='sale_branch_created_idx'),
+        ),
+    ]
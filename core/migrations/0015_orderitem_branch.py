@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_transactional_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='branch',
+            field=models.ForeignKey(blank=True, help_text='Sucursal desde la que se despacha (asignada en el checkout)', null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.branch'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+# Expresión del documento; debe coincidir con core.search.PG_DOCUMENT
+PG_DOCUMENT = (
+    "to_tsvector('spanish'::regconfig, "
+    "coalesce(name, '') || ' ' || coalesce(sku, '') || ' ' || "
+    "coalesce(category, '') || ' ' || coalesce(description, ''))"
+)
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON core_product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS product_sku_trgm_idx ON core_product USING gin (sku gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS product_search_vector_idx ON core_product USING gin ({PG_DOCUMENT})",
+    # Prefijos de SKU (lectores de código de barras): LIKE 'x%' con colación distinta de C
+    "CREATE INDEX IF NOT EXISTS product_sku_prefix_idx ON core_product (tenant_id, sku varchar_pattern_ops)",
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS product_sku_prefix_idx",
+    "DROP INDEX IF EXISTS product_search_vector_idx",
+    "DROP INDEX IF EXISTS product_sku_trgm_idx",
+    "DROP INDEX IF EXISTS product_name_trgm_idx",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_product_fts USING fts5("
+    "name, sku, category, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')",
+    "INSERT INTO core_product_fts (rowid, name, sku, category, description) "
+    "SELECT id, name, sku, category, description FROM core_product",
+]
+
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS core_product_fts",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'sku'], name='product_tenant_sku_idx'),
+        ),
+        migrations.RunPython(
+            _run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('branch_id', models.BigIntegerField(blank=True, null=True)),
+                ('catalog_version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, help_text='Último cambio de productos/inventario (feed del POS)'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['branch', 'catalog_version'], name='inventory_catalog_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'catalog_version'], name='product_catalog_version_idx'),
+        ),
+        migrations.AddField(
+            model_name='catalogtombstone',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_tombstones', to='core.tenant'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogtombstone',
+            index=models.Index(fields=['tenant', 'catalog_version'], name='tombstone_catalog_version_idx'),
+        ),
+    ]
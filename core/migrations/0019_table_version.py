@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_catalog_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=20)),
+                ('scope', models.BigIntegerField(default=0)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('table', 'scope')},
+            },
+        ),
+    ]
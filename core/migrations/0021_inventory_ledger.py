@@ -0,0 +1,45 @@
+# Generated by Django 4.2.27 on 2026-10-18 03:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+            options={
+                'unique_together': {('branch', 'taken_at', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opening', 'Saldo inicial'), ('sale', 'Venta'), ('order', 'Pedido web'), ('purchase', 'Compra'), ('adjustment', 'Ajuste'), ('transfer', 'Transferencia')], max_length=20)),
+                ('quantity', models.IntegerField(help_text='Delta de stock: positivo entra, negativo sale')),
+                ('reference', models.BigIntegerField(blank=True, help_text='Id de la venta, pedido, compra o transferencia', null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['branch', 'created_at'], name='movement_branch_created_idx'), models.Index(fields=['branch', 'product', 'created_at'], name='movement_branch_product_idx')],
+            },
+        ),
+    ]
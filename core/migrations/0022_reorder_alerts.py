@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-18 03:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('out', 'Agotado'), ('below', 'Bajo punto de reorden'), ('cover', 'Cobertura insuficiente')], max_length=10)),
+                ('stock', models.IntegerField()),
+                ('reorder_point', models.IntegerField()),
+                ('daily_velocity', models.FloatField(help_text='Unidades vendidas por día en la ventana de cálculo')),
+                ('days_of_cover', models.FloatField(blank=True, help_text='Días de stock al ritmo de venta actual (vacío si no hay ventas)', null=True)),
+                ('suggested_quantity', models.IntegerField(default=0, help_text='Unidades a reponer para cubrir el objetivo de días')),
+                ('computed_at', models.DateTimeField()),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+            options={
+                'ordering': ['id'],
+                'unique_together': {('branch', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-18 03:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_reorder_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(help_text='Primer día pronosticado')),
+                ('daily_level', models.FloatField(help_text='Nivel de demanda diaria desestacionalizado')),
+                ('weekday_factors', models.JSONField(help_text='Factor de lunes a domingo (promedio 1)')),
+                ('forecast', models.JSONField(help_text='Unidades pronosticadas por día desde start_date')),
+                ('horizon_total', models.FloatField(help_text='Suma del pronóstico en el horizonte')),
+                ('history_units', models.IntegerField(help_text='Unidades vendidas en la historia usada')),
+                ('mae', models.FloatField(help_text='Error absoluto medio del pronóstico a un día en la historia')),
+                ('computed_at', models.DateTimeField()),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+            options={
+                'unique_together': {('branch', 'product')},
+            },
+        ),
+    ]
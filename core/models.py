@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
@@ -40,6 +40,99 @@ def validar_rut(rut):
     if dv_calculado != dv_ingresado:
         raise ValidationError("El RUT no es válido (Dígito verificador incorrecto).")
 
+def normalize_company(name):
+    """Clave canónica de una empresa: sin espacios extremos y en minúsculas"""
+    return (name or '').strip().lower()
+
+class TenantManager(models.Manager):
+    def resolve(self, company):
+        """Obtiene (o crea) el tenant de un nombre de empresa; None si viene vacío"""
+        code = normalize_company(company)
+        if not code:
+            return None
+        tenant, _ = self.get_or_create(code=code, defaults={'name': company.strip()})
+        return tenant
+
+    def next_catalog_version(self, tenant_id):
+        """
+        Versión del catálogo que lleva lo que modifica la transacción en curso.
+        Debe llamarse dentro de esa transacción.
+
+        En PostgreSQL es el id de la transacción (txid_current()): no escribe ni
+        bloquea ninguna fila compartida, así las ventas concurrentes de un tenant
+        no se serializan. En los demás motores (SQLite en desarrollo, que ya
+        serializa todas las escrituras) el contador del tenant pasa al máximo de
+        todos los tenants + 1: las versiones son crecientes en toda la base y el
+        feed sin tenant de los superusuarios también puede ser incremental. Las
+        filas sin tenant reciben ese valor sin guardarlo en ningún contador.
+        `tenant_id` puede ser una función: sólo se evalúa para el contador.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT txid_current()")
+                return cursor.fetchone()[0]
+        if callable(tenant_id):
+            tenant_id = tenant_id()
+        if tenant_id is None:
+            return self.current_catalog_version(None) + 1
+        latest = self.order_by('-catalog_version').values('catalog_version')[:1]
+        self.filter(id=tenant_id).update(catalog_version=models.Subquery(latest) + 1)
+        return self.filter(id=tenant_id).values_list('catalog_version', flat=True).get()
+
+    def current_catalog_version(self, tenant_id):
+        """
+        Versión hasta la que el catálogo del tenant (o de todos si tenant_id es
+        None) está completo: toda transacción con una versión menor o igual ya
+        terminó, así un cliente con esta versión sólo necesita las filas con
+        catalog_version mayor.
+
+        En PostgreSQL es el xmin del snapshot actual menos 1 (la transacción
+        abierta más antigua marca el límite; una transacción larga sólo hace que
+        se repitan filas en la próxima consulta). En los demás motores, el
+        contador del tenant o el máximo de todos.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) - 1")
+                return cursor.fetchone()[0]
+        if tenant_id is None:
+            return self.aggregate(top=models.Max('catalog_version'))['top'] or 0
+        return self.filter(id=tenant_id).values_list('catalog_version', flat=True).first() or 0
+
+class Tenant(models.Model):
+    """Empresa cliente (tenant). Reemplaza la comparación de strings `company`
+    por una FK entera indexada en User, Branch, Subscription y Product."""
+    name = models.CharField(max_length=100)
+    code = models.CharField(max_length=100, unique=True, help_text="Nombre normalizado (minúsculas)")
+    catalog_version = models.BigIntegerField(default=0, help_text="Último cambio de productos/inventario (feed del POS)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TenantManager()
+
+    def __str__(self):
+        return self.name
+
+def stamp_catalog_version(instance, tenant_id):
+    """
+    Asigna a la fila, antes de escribirla, la versión del catálogo de la
+    transacción en curso: el mismo INSERT/UPDATE la guarda, sin queries extra
+    sobre la fila. Debe llamarse dentro de la transacción que guarda la fila.
+    """
+    version = Tenant.objects.next_catalog_version(tenant_id)
+    if version:
+        instance.catalog_version = version
+
+class TenantQuerySet(models.QuerySet):
+    """Filtro por tenant sobre la FK entera (sin joins por string ni distinct)"""
+    tenant_lookup = 'tenant_id'
+
+    def for_tenant(self, tenant_id):
+        return self.filter(**{self.tenant_lookup: tenant_id})
+
+class BranchScopedQuerySet(TenantQuerySet):
+    """Modelos cuyo tenant se obtiene a través de la sucursal"""
+    tenant_lookup = 'branch__tenant_id'
+
 class User(AbstractUser):
     ROLES = (
         ('super_admin', 'Super Admin (TemucoSoft)'),
@@ -59,6 +152,7 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=20, choices=ROLES, default='cliente_final')
     company = models.CharField(max_length=100, blank=True, null=True)
+    tenant = models.ForeignKey(Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name='users')
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -72,10 +166,13 @@ class Subscription(models.Model):
         ('premium', 'Premium'),
     )
     company = models.CharField(max_length=100, help_text="Nombre de la empresa suscrita", default="Sin empresa")
+    tenant = models.ForeignKey(Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name='subscriptions')
     plan_name = models.CharField(max_length=20, choices=PLANS)
     start_date = models.DateField()
     end_date = models.DateField()
     active = models.BooleanField(default=True)
+
+    objects = TenantQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = "Subscriptions"
@@ -93,6 +190,9 @@ class Branch(models.Model):
     address = models.CharField(max_length=200)
     phone = models.CharField(max_length=20)
     company = models.CharField(max_length=100, blank=True, null=True, help_text="Empresa/tenant dueña de esta sucursal")
+    tenant = models.ForeignKey(Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name='branches')
+
+    objects = TenantQuerySet.as_manager()
     
     def __str__(self):
         return self.name
@@ -120,6 +220,23 @@ class Product(models.Model):
     price = models.IntegerField(validators=[MinValueValidator(0)], help_text="Precio en pesos chilenos")
     cost = models.IntegerField(validators=[MinValueValidator(0)], help_text="Costo en pesos chilenos")
     category = models.CharField(max_length=50)
+    tenant = models.ForeignKey(Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
+    catalog_version = models.BigIntegerField(default=0, editable=False)
+
+    objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Búsqueda por SKU (exacto o prefijo, ej: lector de códigos) dentro de un tenant
+            models.Index(fields=['tenant', 'sku'], name='product_tenant_sku_idx'),
+            # Feed incremental del catálogo para el POS (core/catalog.py)
+            models.Index(fields=['tenant', 'catalog_version'], name='product_catalog_version_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            stamp_catalog_version(self, self.tenant_id)
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.sku} - {self.name}"
@@ -130,9 +247,28 @@ class Inventory(models.Model):
     # [cite_start]Validación: stock >= 0 [cite: 202]
     stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     reorder_point = models.IntegerField(default=10, help_text="Nivel mínimo para alerta de reposición")
+    catalog_version = models.BigIntegerField(default=0, editable=False)
+
+    objects = BranchScopedQuerySet.as_manager()
 
     class Meta:
         unique_together = ('branch', 'product') # Evita duplicados del mismo producto en la misma sucursal
+        indexes = [
+            # Parcial: sólo las filas bajo el punto de reorden (alertas de reposición)
+            models.Index(
+                fields=['branch', 'product'],
+                condition=models.Q(stock__lte=models.F('reorder_point')),
+                name='inventory_low_stock_idx',
+            ),
+            # Feed incremental del catálogo para el POS (core/catalog.py)
+            models.Index(fields=['branch', 'catalog_version'], name='inventory_catalog_version_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # La sucursal sólo se lee si el motor usa el contador del tenant
+            stamp_catalog_version(self, lambda: self.branch.tenant_id)
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.product.name} en {self.branch.name}: {self.stock}"
@@ -152,8 +288,24 @@ class Sale(models.Model):
     user = models.ForeignKey(User, on_delete=models.PROTECT, help_text="Vendedor que realiza la venta")
     total = models.IntegerField(default=0, help_text="Total en pesos chilenos")
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, default='cash')
+    client_uuid = models.UUIDField(
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Identificador generado por el POS; evita duplicar ventas al sincronizar colas offline"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = BranchScopedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Soporta la paginación por cursor (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='sale_created_id_idx'),
+            # Listados y reportes por sucursal en un rango de fechas
+            models.Index(fields=['branch', 'created_at'], name='sale_branch_created_idx'),
+        ]
+
     def clean(self):
         # Validación: created_at no puede estar en el futuro
         if self.created_at and self.created_at > timezone.now():
@@ -174,6 +326,25 @@ class SaleItem(models.Model):
             self.price = self.product.price
         super().save(*args, **kwargs)
 
+class SalesDailyRollup(models.Model):
+    """Agregado diario de ventas POS por sucursal y medio de pago.
+    Se actualiza al confirmar cada venta (ver core/rollups.py) y alimenta los reportes."""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    date = models.DateField(help_text="Fecha de negocio (zona horaria del sistema)")
+    payment_method = models.CharField(max_length=20, choices=Sale.PAYMENT_METHODS)
+    total_amount = models.BigIntegerField(default=0, help_text="Total vendido en pesos chilenos")
+    transactions = models.IntegerField(default=0)
+    items = models.IntegerField(default=0, help_text="Unidades vendidas")
+
+    class Meta:
+        unique_together = ('branch', 'date', 'payment_method')
+        indexes = [
+            models.Index(fields=['date'], name='rollup_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.branch.name} {self.date} ({self.payment_method}): {self.total_amount}"
+
 class Order(models.Model):
     """Modelo para pedidos web (E-commerce)"""
     STATUS_CHOICES = (
@@ -192,12 +363,26 @@ class Order(models.Model):
     total = models.IntegerField(default=0, help_text="Total en pesos chilenos")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            # Listado de pedidos filtrado por estado, más recientes primero
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
+
     def __str__(self):
         return f"Pedido #{self.id} - {self.customer_name}"
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="Sucursal desde la que se despacha (asignada en el checkout)"
+    )
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     price = models.IntegerField(help_text="Precio unitario en pesos")
 
@@ -239,4 +424,196 @@ class CartItem(models.Model):
         unique_together = ('user', 'product')
 
     def __str__(self):
-        return f"{self.user.username} - {self.product.name} x{self.quantity}"
\ No newline at end of file
+        return f"{self.user.username} - {self.product.name} x{self.quantity}"
+
+class StockReservation(models.Model):
+    """Reserva temporal de stock de un producto en el carrito de un usuario.
+    Mientras no expire se descuenta del disponible para la venta web (ver core/reservations.py)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            # Reservas vigentes por producto (disponible para la venta)
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_exp_idx'),
+            # Barrido de reservas vencidas
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.product.name} x{self.quantity} hasta {self.expires_at}"
+
+class CatalogTombstone(models.Model):
+    """Registro de productos (branch vacío) o filas de inventario eliminadas, para
+    que el feed incremental del POS pueda informar las bajas (ver core/catalog.py)."""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='catalog_tombstones')
+    product_id = models.BigIntegerField()
+    branch_id = models.BigIntegerField(null=True, blank=True)
+    catalog_version = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'catalog_version'], name='tombstone_catalog_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"Baja producto {self.product_id} (v{self.catalog_version})"
+
+class TableVersion(models.Model):
+    """Contador de cambios por tabla y ámbito, usado como validador de los ETag
+    de la API (ver core/conditional.py). El ámbito es el tenant, o la sucursal
+    para el inventario; 0 agrupa las filas sin tenant."""
+    table = models.CharField(max_length=20)
+    scope = models.BigIntegerField(default=0)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('table', 'scope')
+
+    def __str__(self):
+        return f"{self.table}[{self.scope}] v{self.version}"
+
+class Job(models.Model):
+    """Trabajo en segundo plano (reportes pesados, importaciones) que ejecuta
+    `manage.py runworker` fuera de la request (ver core/jobs.py)."""
+    STATUS_CHOICES = (
+        ('queued', 'En cola'),
+        ('running', 'En ejecución'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    )
+
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Porcentaje de avance (0-100)")
+    message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True, help_text="Resumen del resultado")
+    result_file = models.CharField(max_length=255, blank=True, help_text="Archivo relativo a JOB_RESULTS_DIR")
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, help_text="Proceso que lo ejecuta o ejecutó")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    tenant = models.ForeignKey(Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Último avance informado por el worker")
+
+    objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Cola: los más antiguos en estado queued (y running para detectar workers caídos)
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} {self.kind} ({self.status})"
+
+class InventoryMovement(models.Model):
+    """Libro de movimientos de stock (sólo se agregan filas): cada cambio de
+    Inventory.stock deja aquí su delta. Junto con InventorySnapshot permite
+    conocer el stock en cualquier fecha (ver core/ledger.py)."""
+    KINDS = (
+        ('opening', 'Saldo inicial'),
+        ('sale', 'Venta'),
+        ('order', 'Pedido web'),
+        ('purchase', 'Compra'),
+        ('adjustment', 'Ajuste'),
+        ('transfer', 'Transferencia'),
+    )
+
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    quantity = models.IntegerField(help_text="Delta de stock: positivo entra, negativo sale")
+    reference = models.BigIntegerField(null=True, blank=True, help_text="Id de la venta, pedido, compra o transferencia")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = BranchScopedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Suma por rango de fechas desde el último snapshot (stock a una fecha)
+            models.Index(fields=['branch', 'created_at'], name='movement_branch_created_idx'),
+            # Historial de un producto en una sucursal
+            models.Index(fields=['branch', 'product', 'created_at'], name='movement_branch_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+} {self.product_id}@{self.branch_id}"
+
+class InventorySnapshot(models.Model):
+    """Saldo de stock de un producto en una sucursal al momento `taken_at`
+    (checkpoint del libro de movimientos). Cada checkpoint guarda sólo los
+    saldos distintos de cero."""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    stock = models.IntegerField()
+
+    objects = BranchScopedQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('branch', 'taken_at', 'product')
+
+    def __str__(self):
+        return f"{self.product_id}@{self.branch_id} = {self.stock} ({self.taken_at})"
+
+class ReorderAlert(models.Model):
+    """Alerta de reposición de un producto en una sucursal, calculada en bloque
+    por core/reorder.py (se reemplazan todas las del tenant en cada cálculo)."""
+    STATUS_CHOICES = (
+        ('out', 'Agotado'),
+        ('below', 'Bajo punto de reorden'),
+        ('cover', 'Cobertura insuficiente'),
+    )
+
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    stock = models.IntegerField()
+    reorder_point = models.IntegerField()
+    daily_velocity = models.FloatField(help_text="Unidades vendidas por día en la ventana de cálculo")
+    days_of_cover = models.FloatField(null=True, blank=True, help_text="Días de stock al ritmo de venta actual (vacío si no hay ventas)")
+    suggested_quantity = models.IntegerField(default=0, help_text="Unidades a reponer para cubrir el objetivo de días")
+    computed_at = models.DateTimeField()
+
+    objects = BranchScopedQuerySet.as_manager()
+
+    class Meta:
+        # Los ids se asignan en orden de urgencia al reemplazar las alertas del tenant
+        ordering = ['id']
+        unique_together = ('branch', 'product')
+
+    def __str__(self):
+        return f"{self.get_status_display()}: {self.product_id}@{self.branch_id} ({self.stock})"
+
+class DemandForecast(models.Model):
+    """Pronóstico de demanda diaria de un producto en una sucursal, ajustado
+    sobre el historial de SaleItem por core/forecast.py (suavizamiento
+    exponencial con estacionalidad por día de la semana)."""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    start_date = models.DateField(help_text="Primer día pronosticado")
+    daily_level = models.FloatField(help_text="Nivel de demanda diaria desestacionalizado")
+    weekday_factors = models.JSONField(help_text="Factor de lunes a domingo (promedio 1)")
+    forecast = models.JSONField(help_text="Unidades pronosticadas por día desde start_date")
+    horizon_total = models.FloatField(help_text="Suma del pronóstico en el horizonte")
+    history_units = models.IntegerField(help_text="Unidades vendidas en la historia usada")
+    mae = models.FloatField(help_text="Error absoluto medio del pronóstico a un día en la historia")
+    computed_at = models.DateTimeField()
+
+    objects = BranchScopedQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('branch', 'product')
+
+    def __str__(self):
+        return f"{self.product_id}@{self.branch_id}: {self.horizon_total:.1f} desde {self.start_date}"
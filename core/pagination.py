@@ -0,0 +1,131 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(json.JSONEncoder):
+    """Serializa fechas con precisión completa (DjangoJSONEncoder trunca a milisegundos)."""
+    def default(self, o):
+        if hasattr(o, 'isoformat'):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) para los endpoints de listado.
+
+    En vez de OFFSET, cada página filtra por los valores de orden de la última
+    fila entregada (ej: created_at, id), por lo que la latencia de la página N
+    no depende de cuán profundo navegue el cliente. El cursor es opaco
+    (base64 de los valores de orden) y se entrega en `next`.
+    """
+    ordering = ('id',)
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        # Se pide una fila extra para saber si existe página siguiente
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'page_size': self.page_size,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError, TypeError):
+            return self.page_size
+        if size < 1:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, self._field_name(f)) for f in self.ordering]
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(values))
+
+    def get_position_filter(self, position):
+        """
+        Construye el filtro lexicográfico (a, b) > (x, y) como
+        a > x OR (a = x AND b > y), respetando la dirección de cada campo.
+
+        Se antepone la cota redundante a >= x para que el motor pueda iniciar un
+        recorrido de rango sobre el índice en vez de evaluar el OR fila a fila.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = self._field_name(field)
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{self._field_name(first)}__{bound}': position[0]}) & condition
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, cls=CursorEncoder).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(self._field_name(f)).to_python(v)
+                for f, v in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _field_name(field):
+        return field.lstrip('-')
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """Ventas y pedidos: más recientes primero, desempate por id."""
+    ordering = ('-created_at', '-id')
@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from .models import Subscription
+from .plans import get_tenant_plan
 
 class IsAdminCliente(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -53,13 +53,12 @@ class HasAPIAccess(permissions.BasePermission):
             return True
         
         # Verificar suscripción activa con plan que incluya API
-        if not request.user.company:
+        if not request.user.tenant_id:
             return False
         
-        subscription = Subscription.objects.filter(company=request.user.company, active=True).first()
-        if not subscription:
+        plan = get_tenant_plan(request.user.tenant_id)
+        if not plan:
             return False
         
-        plan = subscription.plan_name.lower()
         # Solo 'premium' tiene acceso a API (excepto super_admin que ya pasó)
         return plan == 'premium'
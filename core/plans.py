@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Subscription
+
+# Caché de dos niveles para el plan activo de cada tenant:
+#   1. LRU en memoria del proceso, con TTL corto (evita incluso el round trip al caché).
+#   2. Framework de caché de Django, compartido entre procesos si el backend lo es.
+# Guardar o eliminar una Subscription invalida ambos niveles (ver core/signals.py),
+# pero sólo en el proceso que hizo el cambio. Cuánto tardan los demás procesos en
+# ver un cambio de plan depende del backend de caché:
+#   - Compartido (Redis, Memcached, DatabaseCache): a lo más PLAN_CACHE_LOCAL_TTL (30 s).
+#   - Sin CACHES configurado (LocMemCache, uno por proceso, como en settings.py):
+#     a lo más PLAN_CACHE_TIMEOUT + PLAN_CACHE_LOCAL_TTL (330 s).
+PLAN_CACHE_TIMEOUT = getattr(settings, 'PLAN_CACHE_TIMEOUT', 300)
+PLAN_CACHE_LOCAL_TTL = getattr(settings, 'PLAN_CACHE_LOCAL_TTL', 30)
+PLAN_CACHE_MAX_ENTRIES = getattr(settings, 'PLAN_CACHE_MAX_ENTRIES', 1024)
+
+_NO_PLAN = ''  # Se cachea también la ausencia de suscripción activa
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_key(tenant_id):
+    return f'tenant-plan:{tenant_id}'
+
+
+def get_tenant_plan(tenant_id):
+    """Plan activo (en minúsculas) de un tenant, o None si no tiene suscripción activa"""
+    if not tenant_id:
+        return None
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(tenant_id)
+        if entry and entry[1] > now:
+            _local.move_to_end(tenant_id)
+            return entry[0] or None
+
+    plan = cache.get(_cache_key(tenant_id))
+    if plan is None:
+        plan_name = (
+            Subscription.objects.for_tenant(tenant_id).filter(active=True)
+            .values_list('plan_name', flat=True)
+            .first()
+        )
+        plan = plan_name.lower() if plan_name else _NO_PLAN
+        cache.set(_cache_key(tenant_id), plan, PLAN_CACHE_TIMEOUT)
+
+    with _lock:
+        _local[tenant_id] = (plan, now + PLAN_CACHE_LOCAL_TTL)
+        _local.move_to_end(tenant_id)
+        while len(_local) > PLAN_CACHE_MAX_ENTRIES:
+            _local.popitem(last=False)
+    return plan or None
+
+
+def invalidate_tenant_plan(tenant_id):
+    with _lock:
+        _local.pop(tenant_id, None)
+    cache.delete(_cache_key(tenant_id))
+
+
+def clear_plan_cache():
+    """Vacía el LRU local (las entradas del caché compartido vencen por TTL)"""
+    with _lock:
+        _local.clear()
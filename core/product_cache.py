@@ -0,0 +1,97 @@
+"""
+Caché del catálogo que muestra product_list_view (página de inicio de clientes
+y gerentes), por tenant y rol.
+
+La clave incluye los contadores de TableVersion (core/conditional.py) de las
+tablas que aparecen en la página: productos del tenant, proveedores y, para los
+roles que ven el stock, el inventario de sus sucursales. Las señales de
+Product, Inventory y Supplier (y apply_stock_decrement) incrementan esos
+contadores, así que un cambio produce una clave nueva en todos los procesos sin
+borrar nada; las entradas viejas vencen por TTL. Una venta no invalida el
+catálogo del cliente_final, que no muestra stock.
+
+Protección contra estampidas: cuando la clave no está, sólo quien obtiene el
+candado (cache.add) ejecuta la agregación. El resto recibe la última versión
+calculada para su tenant y rol, o espera a que el candado se libere si todavía
+no existe ninguna.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .conditional import INVENTORY, PRODUCTS, SUPPLIERS, current_versions
+from .models import Branch, Product
+
+PRODUCT_LIST_CACHE_TIMEOUT = getattr(settings, 'PRODUCT_LIST_CACHE_TIMEOUT', 600)
+PRODUCT_LIST_REBUILD_TIMEOUT = getattr(settings, 'PRODUCT_LIST_REBUILD_TIMEOUT', 10)
+_POLL_INTERVAL = 0.05
+
+
+def role_sees_stock(role):
+    return role != 'cliente_final'
+
+
+def cached_product_list(tenant_id, role, all_tenants=False):
+    """Productos (con `total_stock` si el rol lo ve) del tenant, o de todos con all_tenants=True."""
+    scope = 'all' if all_tenants else tenant_id or 0
+    with_stock = role_sees_stock(role)
+    versions = current_versions(_selectors(tenant_id, all_tenants, with_stock))
+    key = f"product-list:{scope}:{role}:{'.'.join(map(str, versions))}"
+    latest_key = f'product-list-latest:{scope}:{role}'
+
+    products = cache.get(key)
+    if products is not None:
+        return products
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, PRODUCT_LIST_REBUILD_TIMEOUT):
+        try:
+            products = _load_products(tenant_id, all_tenants, with_stock)
+            cache.set_many({key: products, latest_key: products}, PRODUCT_LIST_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return products
+
+    # Otra request ya está calculando esta versión
+    products = cache.get(latest_key)
+    if products is None:
+        products = _wait_for(key, lock_key)
+    if products is None:
+        # Quien tenía el candado falló o demoró más que el timeout
+        products = _load_products(tenant_id, all_tenants, with_stock)
+    return products
+
+
+def _selectors(tenant_id, all_tenants, with_stock):
+    if all_tenants:
+        selectors = [(PRODUCTS, None), (SUPPLIERS, None)]
+        if with_stock:
+            selectors.append((INVENTORY, None))
+        return selectors
+    selectors = [(PRODUCTS, tenant_id or 0), (SUPPLIERS, None)]
+    if with_stock:
+        selectors.append((INVENTORY, Branch.objects.for_tenant(tenant_id).values('id')))
+    return selectors
+
+
+def _wait_for(key, lock_key):
+    """Espera a que quien tiene el candado publique `key`; None si lo suelta sin hacerlo o vence."""
+    deadline = time.monotonic() + PRODUCT_LIST_REBUILD_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(_POLL_INTERVAL)
+        products = cache.get(key)
+        if products is not None:
+            return products
+        if cache.get(lock_key) is None:
+            return None
+    return None
+
+
+def _load_products(tenant_id, all_tenants, with_stock):
+    products = Product.objects.all() if all_tenants else Product.objects.for_tenant(tenant_id)
+    products = products.select_related('supplier').order_by('id')
+    if with_stock:
+        products = products.annotate(total_stock=Sum('inventory__stock'))
+    return list(products)
@@ -0,0 +1,294 @@
+"""
+Importación masiva del catálogo de productos (CSV o XLSX) con upsert por SKU.
+
+El archivo se lee fila a fila y se procesa en lotes de `batch_size`; cada lote
+valida sus filas en Python, verifica en una query que los SKU existentes sean
+del mismo tenant, inserta los SKU nuevos con INSERT ... ON CONFLICT DO NOTHING
+(bulk_create con ignore_conflicts) y actualiza con un UPDATE acotado al tenant
+(bulk_update). Si otra empresa insertó uno de los SKU nuevos entre la
+verificación y el INSERT, la fila se rechaza sin tocar la de la otra empresa.
+Los proveedores se resuelven por RUT normalizado con un diccionario cargado una
+sola vez.
+
+Las escrituras masivas no pasan por Product.save ni por las señales, así que
+cada lote hace explícitamente lo que harían:
+  - crea las filas de inventario (stock 0) en las sucursales del tenant, como
+    product_create_view,
+  - marca productos e inventario con una nueva versión del catálogo (feed del
+    POS), tomando el contador del tenant al final (mismo orden de bloqueo que
+    core/stock.py),
+  - reindexa la búsqueda (core/search.py) e invalida los ETag (core/conditional.py).
+
+Las filas con errores se omiten y se informan con su número de línea; el resto
+del archivo se importa igual.
+"""
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .conditional import INVENTORY, PRODUCTS, bump_table_version
+from .models import Branch, Inventory, Product, Supplier, Tenant, validar_rut
+from .search import index_products
+
+IMPORT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+REQUIRED_COLUMNS = ('sku', 'name', 'price')
+OPTIONAL_COLUMNS = ('cost', 'category', 'description', 'supplier_rut')
+UPDATE_FIELDS = ['name', 'description', 'supplier', 'price', 'cost', 'category']
+
+_THOUSANDS = re.compile(r'^\d{1,3}(\.\d{3})+$')
+
+
+class ImportFormatError(Exception):
+    """El archivo no se puede leer (formato o encabezados inválidos)."""
+
+
+def normalize_rut(rut):
+    """RUT sin puntos ni guion y en mayúsculas (12.345.678-k -> 12345678K)."""
+    return (rut or '').replace('.', '').replace('-', '').replace(' ', '').upper()
+
+
+def read_rows(upload, filename=''):
+    """
+    Itera las filas de un archivo subido (binario) como dicts con claves en
+    minúsculas. XLSX requiere openpyxl; todo lo demás se lee como CSV UTF-8 (con
+    o sin BOM) separado por coma o punto y coma.
+    """
+    if filename.lower().endswith('.xlsx'):
+        return _xlsx_rows(upload)
+    return _csv_rows(io.TextIOWrapper(upload, encoding='utf-8-sig', newline=''))
+
+
+def _csv_rows(text):
+    sample = text.read(4096)
+    text.seek(0)
+    delimiter = ';' if sample.count(';') > sample.count(',') else ','
+    reader = csv.reader(text, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        raise ImportFormatError("El archivo está vacío.")
+    header = [column.strip().lower() for column in header]
+    _check_header(header)
+    for values in reader:
+        if any(value.strip() for value in values):
+            yield dict(zip(header, values))
+        else:
+            yield None  # línea en blanco: conserva la numeración
+
+
+def _xlsx_rows(upload):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("Para importar XLSX se requiere openpyxl; use CSV.")
+    sheet = load_workbook(upload, read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(value or '').strip().lower() for value in next(rows, ())]
+    _check_header(header)
+    for values in rows:
+        values = ['' if value is None else str(value) for value in values]
+        yield dict(zip(header, values)) if any(values) else None
+
+
+def _check_header(header):
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ImportFormatError(
+            f"Faltan columnas: {', '.join(missing)}. "
+            f"Columnas admitidas: {', '.join(REQUIRED_COLUMNS + OPTIONAL_COLUMNS)}."
+        )
+
+
+def import_products(rows, tenant_id, batch_size=IMPORT_BATCH_SIZE, dry_run=False, progress=None):
+    """
+    Importa (crea o actualiza por SKU) los productos de `rows` para el tenant.
+    `rows` es un iterable de dicts (ver read_rows); la fila 1 es el encabezado.
+    `progress`, si se indica, recibe la cantidad de filas procesadas tras cada lote.
+    Retorna {'rows', 'created', 'updated', 'error_count', 'errors'}.
+    """
+    importer = _Importer(tenant_id, batch_size, dry_run)
+    batch = []
+    for line, row in enumerate(rows, start=2):
+        if row is None:
+            continue
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            importer.process(batch)
+            batch = []
+            if progress:
+                progress(importer.rows)
+    if batch:
+        importer.process(batch)
+    return importer.report()
+
+
+class _Importer:
+    def __init__(self, tenant_id, batch_size, dry_run):
+        self.tenant_id = tenant_id
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.rows = self.created = self.updated = self.error_count = 0
+        self.errors = []
+        # Un solo SELECT de proveedores para todo el archivo
+        self.suppliers = {
+            normalize_rut(rut): supplier_id
+            for supplier_id, rut in Supplier.objects.values_list('id', 'rut')
+        }
+        branches = Branch.objects.all()
+        if tenant_id:
+            branches = branches.for_tenant(tenant_id)
+        self.branch_ids = list(branches.values_list('id', flat=True))
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+    def _error(self, line, sku, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'sku': sku, 'errors': errors})
+
+    def process(self, batch):
+        self.rows += len(batch)
+        products = {}  # sku -> (línea, Product); si un SKU se repite gana la última fila
+        for line, row in batch:
+            product, errors = self._parse(row)
+            if errors:
+                self._error(line, row.get('sku', '').strip(), errors)
+                continue
+            if product.sku in products:
+                previous_line, _ = products[product.sku]
+                self._error(previous_line, product.sku, {'sku': f"SKU repetido; se usa la fila {line}."})
+            products[product.sku] = (line, product)
+        if not products:
+            return
+
+        with transaction.atomic():
+            existing = dict(
+                Product.objects.select_for_update()
+                .filter(sku__in=list(products)).values_list('sku', 'tenant_id')
+            )
+            self._reject_foreign(products, existing)
+            if not products or self.dry_run:
+                self._count(products, existing)
+                return
+
+            # Los SKU nuevos se insertan sin pisar nada: si otra empresa insertó el
+            # mismo SKU mientras tanto, el conflicto se ignora y se detecta abajo
+            Product.objects.bulk_create(
+                [product for sku, (_, product) in products.items() if sku not in existing],
+                ignore_conflicts=True,
+            )
+            rows = (
+                Product.objects.select_for_update()
+                .filter(sku__in=list(products)).values_list('sku', 'tenant_id', 'id')
+            )
+            owners, ids = {}, {}
+            for sku, owner, product_id in rows:
+                owners[sku] = owner
+                ids[sku] = product_id
+            self._reject_foreign(products, owners)
+            if not products:
+                return
+            self._count(products, existing)
+
+            # Sólo se actualizan filas del propio tenant (la condición va en el UPDATE)
+            for sku, (_, product) in products.items():
+                product.pk = ids[sku]
+            Product.objects.filter(tenant_id=self.tenant_id).bulk_update(
+                [product for _, product in products.values()], UPDATE_FIELDS, batch_size=500,
+            )
+            ids = [ids[sku] for sku in products]
+            Inventory.objects.bulk_create(
+                [Inventory(branch_id=branch_id, product_id=product_id, stock=0)
+                 for product_id in ids for branch_id in self.branch_ids],
+                ignore_conflicts=True,
+            )
+
+            # Las filas de inventario se bloquean ordenadas por id, como en las ventas
+            # (lock_inventory), antes de pedir la versión: si el motor usa el contador
+            # del tenant el orden de bloqueo es el mismo (filas y luego tenant)
+            inventory = Inventory.objects.filter(product_id__in=ids, branch_id__in=self.branch_ids)
+            list(inventory.select_for_update().order_by('id').values_list('id', flat=True))
+            version = Tenant.objects.next_catalog_version(self.tenant_id)
+            if version:
+                Product.objects.filter(id__in=ids).update(catalog_version=version)
+                inventory.update(catalog_version=version)
+            index_products(Product.objects.filter(id__in=ids))
+            bump_table_version(PRODUCTS, [self.tenant_id])
+            bump_table_version(INVENTORY, self.branch_ids)
+
+    def _reject_foreign(self, products, owners):
+        """Quita de `products` (y reporta) los SKU que pertenecen a otra empresa."""
+        for sku, owner in owners.items():
+            if sku in products and owner != self.tenant_id:
+                line, _ = products.pop(sku)
+                self._error(line, sku, {'sku': "El SKU pertenece a otra empresa."})
+
+    def _count(self, products, existing):
+        updated = sum(1 for sku in products if sku in existing)
+        self.updated += updated
+        self.created += len(products) - updated
+
+    def _parse(self, row):
+        errors = {}
+        values = {key: (row.get(key) or '').strip() for key in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+
+        for field, limit in (('sku', 50), ('name', 100), ('category', 50)):
+            if field in REQUIRED_COLUMNS and not values[field]:
+                errors[field] = "Este campo es requerido."
+            elif len(values[field]) > limit:
+                errors[field] = f"Máximo {limit} caracteres."
+
+        amounts = {}
+        for field in ('price', 'cost'):
+            try:
+                amounts[field] = _parse_amount(values[field]) if values[field] else 0
+            except ValueError as exc:
+                errors[field] = str(exc)
+        if not values['price'] and 'price' not in errors:
+            errors['price'] = "Este campo es requerido."
+
+        supplier_id = None
+        if values['supplier_rut']:
+            try:
+                validar_rut(values['supplier_rut'])
+            except ValidationError as exc:
+                errors['supplier_rut'] = exc.messages[0]
+            else:
+                supplier_id = self.suppliers.get(normalize_rut(values['supplier_rut']))
+                if supplier_id is None:
+                    errors['supplier_rut'] = "No existe un proveedor con ese RUT."
+
+        if errors:
+            return None, errors
+        return Product(
+            sku=values['sku'], name=values['name'], description=values['description'],
+            category=values['category'], price=amounts['price'], cost=amounts['cost'],
+            supplier_id=supplier_id, tenant_id=self.tenant_id,
+        ), None
+
+
+def _parse_amount(value):
+    """Monto en pesos: acepta $, separador de miles con punto (1.990) y decimales con coma o punto."""
+    value = value.replace('$', '').replace(' ', '')
+    if _THOUSANDS.match(value):
+        value = value.replace('.', '')
+    try:
+        amount = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError("Debe ser un número.")
+    if not amount.is_finite():
+        raise ValueError("Debe ser un número.")
+    if amount < 0:
+        raise ValueError("No puede ser negativo.")
+    return int(amount.to_integral_value())
@@ -0,0 +1,310 @@
+"""
+Secciones de los reportes de gerencia (/api/reports/). Cada función ejecuta sus
+propias queries y no depende de las demás, de modo que ReportViewSet las llama
+en secuencia y las vistas async (core/async_views.py) las lanzan en paralelo.
+"""
+import json
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from .dates import date_range_q, parse_date_range
+from .models import Branch, Inventory, Order, Product, Sale, SaleItem, SalesDailyRollup, Supplier
+from .stock import branch_stock_summary
+
+# granularity -> (truncado en BD sobre SalesDailyRollup.date, truncado en Python, formato)
+SALES_GRANULARITIES = {
+    'day': (None, lambda d: d, '%Y-%m-%d'),
+    'week': (TruncWeek, lambda d: d - timedelta(days=d.weekday()), '%G-W%V'),
+    'month': (TruncMonth, lambda d: d.replace(day=1), '%Y-%m'),
+    'year': (TruncYear, lambda d: d.replace(month=1, day=1), '%Y'),
+}
+DASHBOARD_DAYS = 30
+
+
+def sales_filters(params):
+    """
+    Lee los filtros del reporte de ventas (date_from, date_to, branch,
+    payment_method, granularity). Retorna (filtros, error).
+    """
+    granularity = params.get('granularity', 'day')  # day | week | month | year
+    if granularity not in SALES_GRANULARITIES:
+        return None, "granularity debe ser day, week, month o year."
+    date_from, date_to, error = parse_date_range(params)
+    if error:
+        return None, error
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'branch': params.get('branch'),
+        'payment_method': params.get('payment_method'),
+        'granularity': granularity,
+        'today': timezone.localdate(),
+    }, None
+
+
+def sales_filters_echo(params, filters):
+    """Filtros tal como se recibieron, para la respuesta del reporte."""
+    return {
+        "date_from": params.get('date_from'),
+        "date_to": params.get('date_to'),
+        "branch": filters['branch'],
+        "payment_method": filters['payment_method'],
+        "granularity": filters['granularity'],
+    }
+
+
+def stock_summaries(branch_id=None):
+    """Valorización de stock por sucursal (una query agregada)."""
+    branches = Branch.objects.all()
+    if branch_id:
+        branches = branches.filter(id=branch_id)
+    return [
+        {
+            "branch_id": branch.id,
+            "branch": branch.name,
+            "total_items": branch.total_items,
+            "total_units": branch.total_units,
+            "total_value": branch.total_value,
+        }
+        for branch in branch_stock_summary(branches)
+    ]
+
+
+def stock_detail_rows(branch_id=None):
+    """Detalle de inventario por producto (branch_id, nombre, sku, stock, precio) en el orden de stock_summaries."""
+    branches = Branch.objects.filter(id=branch_id) if branch_id else Branch.objects.all()
+    return (
+        Inventory.objects.filter(branch__in=branches)
+        .order_by('branch_id', 'id')
+        .values_list('branch_id', 'product__name', 'product__sku', 'stock', 'product__price')
+    )
+
+
+def stream_stock_detail(summaries, rows, buffer_size=500):
+    """Genera el JSON del reporte por trozos sin cargar todo el inventario en memoria."""
+    groups = groupby(rows, key=itemgetter(0))
+    current = next(groups, None)
+    yield '['
+    for index, summary in enumerate(summaries):
+        head = json.dumps(summary)[:-1] + ', "inventory": ['
+        yield (',' if index else '') + head
+        if current and current[0] == summary['branch_id']:
+            buffer = []
+            for position, (_, name, sku, stock, price) in enumerate(current[1]):
+                item = json.dumps({"product": name, "sku": sku, "stock": stock, "value": stock * price})
+                buffer.append((',' if position else '') + item)
+                if len(buffer) >= buffer_size:
+                    yield ''.join(buffer)
+                    buffer = []
+            yield ''.join(buffer)
+            current = next(groups, None)
+        yield ']}'
+    yield ']'
+
+
+def closed_sales(filters):
+    """Días cerrados, desde el rollup diario, agrupados por sucursal y período."""
+    rollup_qs = SalesDailyRollup.objects.filter(date__lt=filters['today'])
+    if filters['branch']:
+        rollup_qs = rollup_qs.filter(branch_id=filters['branch'])
+    if filters['payment_method']:
+        rollup_qs = rollup_qs.filter(payment_method=filters['payment_method'])
+    if filters['date_from']:
+        rollup_qs = rollup_qs.filter(date__gte=filters['date_from'])
+    if filters['date_to']:
+        rollup_qs = rollup_qs.filter(date__lte=filters['date_to'])
+
+    db_trunc = SALES_GRANULARITIES[filters['granularity']][0]
+    return list(
+        rollup_qs
+        .annotate(period=db_trunc('date') if db_trunc else F('date'))
+        .values('branch_id', 'branch__name', 'period')
+        .annotate(total_amount=Sum('total_amount'), total_transactions=Sum('transactions'), total_items=Sum('items'))
+    )
+
+
+def _today_sales(filters):
+    """Ventas del día en curso (None si el rango pedido no lo incluye)."""
+    today = filters['today']
+    if (filters['date_from'] and filters['date_from'] > today) or (filters['date_to'] and filters['date_to'] < today):
+        return None
+    sales = Sale.objects.filter(date_range_q('created_at', today, today))
+    if filters['branch']:
+        sales = sales.filter(branch_id=filters['branch'])
+    if filters['payment_method']:
+        sales = sales.filter(payment_method=filters['payment_method'])
+    return sales
+
+
+def today_sales_totals(filters):
+    """Día en curso, desde los datos crudos: monto y transacciones por sucursal."""
+    sales = _today_sales(filters)
+    if sales is None:
+        return []
+    return list(
+        sales.values('branch_id', 'branch__name')
+        .annotate(total_amount=Sum('total'), total_transactions=Count('id'))
+    )
+
+
+def today_sales_units(filters):
+    """Día en curso: unidades vendidas por sucursal."""
+    sales = _today_sales(filters)
+    if sales is None:
+        return {}
+    return dict(
+        SaleItem.objects.filter(sale__in=sales)
+        .values('sale__branch_id')
+        .annotate(units=Sum('quantity'))
+        .values_list('sale__branch_id', 'units')
+    )
+
+
+def build_sales_report(filters, closed, today_totals, today_units):
+    """Combina las tres secciones de ventas en la estructura por sucursal."""
+    _, py_trunc, date_format = SALES_GRANULARITIES[filters['granularity']]
+    rows = {}
+    for row in closed:
+        rows[(row['branch_id'], row['period'])] = row
+
+    period = py_trunc(filters['today'])
+    for row in today_totals:
+        current = rows.setdefault((row['branch_id'], period), {
+            'branch_id': row['branch_id'],
+            'branch__name': row['branch__name'],
+            'period': period,
+            'total_amount': 0,
+            'total_transactions': 0,
+            'total_items': 0,
+        })
+        current['total_amount'] = (current['total_amount'] or 0) + (row['total_amount'] or 0)
+        current['total_transactions'] += row['total_transactions']
+        current['total_items'] = (current['total_items'] or 0) + (today_units.get(row['branch_id']) or 0)
+
+    # Estructura por sucursal
+    result = {}
+    for (bid, _), row in sorted(rows.items()):
+        if bid not in result:
+            result[bid] = {
+                "branch_id": bid,
+                "branch": row['branch__name'],
+                "periods": [],
+                "total_amount": 0,
+                "total_transactions": 0,
+                "total_items": 0,
+            }
+        result[bid]["periods"].append({
+            "period": row['period'].strftime(date_format),
+            "total_amount": row['total_amount'] or 0,
+            "total_transactions": row['total_transactions'] or 0,
+            "total_items": row['total_items'] or 0,
+        })
+        result[bid]["total_amount"] += row['total_amount'] or 0
+        result[bid]["total_transactions"] += row['total_transactions'] or 0
+        result[bid]["total_items"] += row['total_items'] or 0
+    return list(result.values())
+
+
+def sales_sections(filters):
+    """Secciones independientes del reporte de ventas: {nombre: (función, argumentos)}."""
+    return {
+        'closed': (closed_sales, filters),
+        'today_totals': (today_sales_totals, filters),
+        'today_units': (today_sales_units, filters),
+    }
+
+
+def supplier_report():
+    """Reporte simple de proveedores (sin pedidos asociados en el modelo actual)."""
+    return [
+        {
+            "id": supplier.id,
+            "name": supplier.name,
+            "rut": supplier.rut,
+            "contact": supplier.contact,
+            # No hay relación producto-proveedor ni pedidos en el modelo actual
+            "products": [],
+            "last_orders": [],
+        }
+        for supplier in Supplier.objects.all()
+    ]
+
+
+def dashboard_filters():
+    """Ventas diarias de los últimos DASHBOARD_DAYS días para el panel."""
+    today = timezone.localdate()
+    return {
+        'date_from': today - timedelta(days=DASHBOARD_DAYS - 1),
+        'date_to': today,
+        'branch': None,
+        'payment_method': None,
+        'granularity': 'day',
+        'today': today,
+    }
+
+
+def low_stock_by_branch():
+    """Productos en o bajo su punto de reorden, por sucursal (índice parcial)."""
+    return list(
+        Inventory.objects.filter(stock__lte=F('reorder_point'))
+        .values('branch_id')
+        .annotate(products=Count('id'))
+        .order_by('branch_id')
+    )
+
+
+def top_suppliers(limit=5):
+    """Proveedores con más productos en el catálogo."""
+    return list(
+        Supplier.objects.annotate(product_count=Count('products'))
+        .order_by('-product_count', 'id')
+        .values('id', 'name', 'product_count')[:limit]
+    )
+
+
+def order_status_counts():
+    """Pedidos web por estado."""
+    return dict(Order.objects.values('status').annotate(total=Count('id')).values_list('status', 'total'))
+
+
+def catalog_counts():
+    return Product.objects.aggregate(
+        products=Count('id'),
+        without_supplier=Count('id', filter=Q(supplier__isnull=True)),
+    )
+
+
+def dashboard_sections(filters):
+    """Secciones independientes del panel de gerencia: {nombre: (función, argumentos)}."""
+    return {
+        'stock': (stock_summaries,),
+        'low_stock': (low_stock_by_branch,),
+        'suppliers': (top_suppliers,),
+        'orders': (order_status_counts,),
+        'catalog': (catalog_counts,),
+        **{f'sales_{name}': section for name, section in sales_sections(filters).items()},
+    }
+
+
+def build_dashboard(filters, results):
+    return {
+        "period": {"date_from": filters['date_from'], "date_to": filters['date_to']},
+        "stock": results['stock'],
+        "low_stock": results['low_stock'],
+        "sales": build_sales_report(
+            filters, results['sales_closed'], results['sales_today_totals'], results['sales_today_units'],
+        ),
+        "top_suppliers": results['suppliers'],
+        "orders": results['orders'],
+        "catalog": results['catalog'],
+    }
+
+
+def run_sections(sections):
+    """Ejecuta las secciones una tras otra (camino síncrono)."""
+    return {name: function(*args) for name, (function, *args) in sections.items()}
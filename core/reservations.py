@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Inventory, Product, StockReservation
+from .stock import InsufficientStock
+
+
+def live_reservations(now=None):
+    """Reservas vigentes (no expiradas) a la fecha `now`."""
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids, exclude_user=None, now=None):
+    """Unidades reservadas vigentes por producto ({product_id: unidades}), excluyendo las de `exclude_user`."""
+    holds = live_reservations(now).filter(product_id__in=list(product_ids))
+    if exclude_user is not None:
+        holds = holds.exclude(user=exclude_user)
+    return dict(holds.values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held'))
+
+
+def available_to_sell(product_ids, exclude_user=None):
+    """
+    Disponible para la venta web por producto: stock total en todas las sucursales
+    menos las reservas vigentes de otros usuarios. Una sola query; las reservas se
+    suman con el índice (product, expires_at).
+    """
+    holds = live_reservations().filter(product=OuterRef('pk'))
+    if exclude_user is not None:
+        holds = holds.exclude(user=exclude_user)
+    stock = Inventory.objects.filter(product=OuterRef('pk'))
+    rows = Product.objects.filter(id__in=list(product_ids)).annotate(
+        on_hand=Coalesce(_sum_subquery(stock, 'stock'), 0),
+        held=Coalesce(_sum_subquery(holds, 'quantity'), 0),
+    ).values_list('id', 'on_hand', 'held')
+    return {product_id: max(on_hand - held, 0) for product_id, on_hand, held in rows}
+
+
+def _sum_subquery(queryset, field):
+    return Subquery(
+        queryset.order_by().values('product').annotate(total=Sum(field)).values('total'),
+        output_field=IntegerField(),
+    )
+
+
+def reserve(user, product, quantity):
+    """
+    Fija en `quantity` la reserva del usuario sobre `product` y renueva su
+    vencimiento (settings.CART_RESERVATION_TTL). Lanza InsufficientStock si el
+    stock no alcanza descontando las reservas vigentes de otros usuarios.
+
+    Bloquea las filas de inventario del producto (mismo orden que core/stock.py)
+    para que reservas y checkouts concurrentes del mismo producto se serialicen.
+    """
+    with transaction.atomic():
+        on_hand = sum(
+            Inventory.objects.select_for_update()
+            .filter(product=product).order_by('id')
+            .values_list('stock', flat=True)
+        )
+        available = on_hand - held_quantities([product.id], exclude_user=user).get(product.id, 0)
+        if quantity > available:
+            raise InsufficientStock([{
+                "product": product.id,
+                "requested": quantity,
+                "available": max(available, 0),
+                "error": (
+                    f"Stock insuficiente de {product.name}. "
+                    f"Disponible: {max(available, 0)}, Solicitado: {quantity}"
+                ),
+            }])
+        reservation, _ = StockReservation.objects.update_or_create(
+            user=user,
+            product=product,
+            defaults={
+                'quantity': quantity,
+                'expires_at': timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL),
+            },
+        )
+    return reservation
+
+
+def release(user, product_ids=None):
+    """Libera las reservas del usuario (todas, o sólo las de `product_ids`)."""
+    reservations = StockReservation.objects.filter(user=user)
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=list(product_ids))
+    return reservations.delete()[0]
+
+
+def sweep_expired(batch_size=1000, now=None):
+    """
+    Elimina las reservas vencidas en lotes de `batch_size` (un DELETE por lote,
+    usando el índice sobre expires_at) para no mantener bloqueos largos.
+    Retorna la cantidad de reservas liberadas.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        released += StockReservation.objects.filter(id__in=ids, expires_at__lte=now).delete()[0]
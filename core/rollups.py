@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .dates import date_range_q
+from .models import Sale, SaleItem, SalesDailyRollup
+
+
+def _rollup_key(branch_id, created_at, payment_method):
+    return (branch_id, timezone.localdate(created_at), payment_method)
+
+
+def record_sales(entries):
+    """
+    Suma ventas recién confirmadas al rollup diario. `entries` es un iterable de
+    (sale, unidades_vendidas).
+
+    Debe llamarse dentro de la misma transacción que crea las ventas. Primero se
+    asegura que exista la fila de cada clave (bulk_create ignorando conflictos) y
+    luego se incrementa con F(), de modo que dos cajas concurrentes nunca pisan
+    sus totales.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for sale, items in entries:
+        delta = deltas[_rollup_key(sale.branch_id, sale.created_at, sale.payment_method)]
+        delta[0] += sale.total
+        delta[1] += 1
+        delta[2] += items
+    if not deltas:
+        return
+
+    SalesDailyRollup.objects.bulk_create(
+        [
+            SalesDailyRollup(branch_id=branch_id, date=date, payment_method=method)
+            for branch_id, date, method in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    for (branch_id, date, method), (amount, transactions, items) in deltas.items():
+        SalesDailyRollup.objects.filter(
+            branch_id=branch_id, date=date, payment_method=method
+        ).update(
+            total_amount=F('total_amount') + amount,
+            transactions=F('transactions') + transactions,
+            items=F('items') + items,
+        )
+
+
+def rebuild_rollups(date_from=None, date_to=None):
+    """
+    Recalcula el rollup desde la tabla Sale para el rango indicado (ambos
+    extremos inclusive; None = sin límite). Retorna la cantidad de filas escritas.
+    """
+    sales = Sale.objects.all()
+    sale_items = SaleItem.objects.all()
+    rollups = SalesDailyRollup.objects.all()
+    sales = sales.filter(date_range_q('created_at', date_from, date_to))
+    sale_items = sale_items.filter(date_range_q('sale__created_at', date_from, date_to))
+    if date_from:
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(date__lte=date_to)
+
+    # Totales y unidades se agregan por separado: unirlos duplicaría Sale.total por item
+    totals = (
+        sales.annotate(day=TruncDate('created_at'))
+        .values('branch_id', 'day', 'payment_method')
+        .annotate(amount=Sum('total'), transactions=Count('id'))
+    )
+    units = {
+        (row['sale__branch_id'], row['day'], row['sale__payment_method']): row['items']
+        for row in (
+            sale_items.annotate(day=TruncDate('sale__created_at'))
+            .values('sale__branch_id', 'day', 'sale__payment_method')
+            .annotate(items=Sum('quantity'))
+        )
+    }
+    rows = [
+        SalesDailyRollup(
+            branch_id=row['branch_id'],
+            date=row['day'],
+            payment_method=row['payment_method'],
+            total_amount=row['amount'] or 0,
+            transactions=row['transactions'],
+            items=units.get((row['branch_id'], row['day'], row['payment_method']), 0) or 0,
+        )
+        for row in totals
+    ]
+    with transaction.atomic():
+        rollups.delete()
+        SalesDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,173 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .ledger import record_movements
+from .models import Branch, Product, Sale, SaleItem
+from .rollups import record_sales
+from .stock import decrement_stock, lock_inventory
+
+# Máximo de ventas aceptadas por lote de sincronización
+MAX_BATCH_SIZE = 1000
+
+
+def commit_sale_batch(entries, user):
+    """
+    Confirma un lote de ventas offline del POS (entradas ya validadas por
+    SaleBatchEntrySerializer) y retorna un resultado por entrada, en el mismo orden.
+
+    - Deduplica por client_uuid contra la BD y dentro del mismo lote, de modo que
+      reenviar una cola completa es seguro. Contra la BD se vuelve a verificar
+      con el inventario bloqueado (reintentos concurrentes del mismo lote).
+    - Resuelve productos y sucursales (de la empresa del usuario) con una query cada uno.
+    - Bloquea el inventario de todo el lote una vez, asigna stock venta a venta en
+      orden de llegada y rechaza sólo las ventas que no alcanzan a cubrirse.
+    - Inserta ventas e items con bulk_create, descuenta el stock de las ventas
+      aceptadas en una sola pasada de decrement_stock, registra los movimientos en
+      el libro de inventario y actualiza el rollup diario.
+    """
+    results = [None] * len(entries)
+    existing = _existing_sales(entry['client_uuid'] for entry in entries)
+
+    pending = []
+    first_index = {}
+    for index, entry in enumerate(entries):
+        uuid = entry['client_uuid']
+        if uuid in existing:
+            results[index] = _result(uuid, 'duplicate', sale=existing[uuid])
+        elif uuid in first_index:
+            results[index] = _result(uuid, 'duplicate')
+        else:
+            first_index[uuid] = index
+            pending.append((index, entry))
+
+    # Fuera de super_admin sólo cuentan productos y sucursales de la empresa del
+    # usuario: los de otra empresa se informan como inexistentes
+    product_rows, branch_rows = Product.objects.all(), Branch.objects.all()
+    if not (user.is_superuser or user.role == 'super_admin'):
+        product_rows = product_rows.for_tenant(user.tenant_id)
+        branch_rows = branch_rows.for_tenant(user.tenant_id)
+    products = {
+        pid: (price, name) for pid, price, name in product_rows.filter(
+            id__in={item['product'] for _, entry in pending for item in entry['items']}
+        ).values_list('id', 'price', 'name')
+    }
+    branches = set(
+        branch_rows.filter(id__in={entry['branch'] for _, entry in pending})
+        .values_list('id', flat=True)
+    )
+
+    with transaction.atomic():
+        locked = lock_inventory(
+            (entry['branch'], item['product'])
+            for _, entry in pending for item in entry['items']
+            if entry['branch'] in branches and item['product'] in products
+        )
+        available = {key: inv.stock for key, inv in locked.items()}
+        # Un reintento concurrente del mismo lote pudo confirmar estas ventas mientras
+        # se esperaba el bloqueo: se vuelven a buscar ya con el inventario bloqueado
+        existing = _existing_sales(entry['client_uuid'] for _, entry in pending)
+        for index, entry in pending:
+            if entry['client_uuid'] in existing:
+                results[index] = _result(entry['client_uuid'], 'duplicate', sale=existing[entry['client_uuid']])
+        pending = [(index, entry) for index, entry in pending if entry['client_uuid'] not in existing]
+
+        accepted = []
+        for index, entry in pending:
+            failures = _allocate(entry, products, branches, available)
+            if failures:
+                results[index] = _result(entry['client_uuid'], 'rejected', errors=failures)
+            else:
+                accepted.append((index, entry))
+
+        sales = [
+            Sale(
+                branch_id=entry['branch'],
+                user=user,
+                payment_method=entry['payment_method'],
+                client_uuid=entry['client_uuid'],
+                total=sum(products[i['product']][0] * i['quantity'] for i in entry['items']),
+            )
+            for _, entry in accepted
+        ]
+        decrement_stock(
+            (entry['branch'], item['product'], item['quantity'])
+            for _, entry in accepted for item in entry['items']
+        )
+        Sale.objects.bulk_create(sales)
+        SaleItem.objects.bulk_create([
+            SaleItem(
+                sale=sale,
+                product_id=item['product'],
+                quantity=item['quantity'],
+                price=products[item['product']][0],
+            )
+            for sale, (_, entry) in zip(sales, accepted)
+            for item in entry['items']
+        ])
+        record_movements('sale', [
+            (entry['branch'], item['product'], -item['quantity'], sale.id)
+            for sale, (_, entry) in zip(sales, accepted)
+            for item in entry['items']
+        ], user=user)
+        record_sales(
+            (sale, sum(item['quantity'] for item in entry['items']))
+            for sale, (_, entry) in zip(sales, accepted)
+        )
+
+    for sale, (index, entry) in zip(sales, accepted):
+        results[index] = _result(entry['client_uuid'], 'created', sale=sale.id, total=sale.total)
+    # Duplicados dentro del lote apuntan a la venta creada por su primera aparición
+    for index, result in enumerate(results):
+        if result['status'] == 'duplicate' and result['sale'] is None:
+            first = results[first_index[entries[index]['client_uuid']]]
+            result['sale'] = first['sale']
+    return results
+
+
+def _existing_sales(uuids):
+    """{client_uuid: id} de las ventas ya registradas con esos client_uuid."""
+    uuids = list(uuids)
+    if not uuids:
+        return {}
+    return dict(Sale.objects.filter(client_uuid__in=uuids).values_list('client_uuid', 'id'))
+
+
+def _allocate(entry, products, branches, available):
+    """Reserva contra `available` el stock de una venta; retorna los errores por línea."""
+    if entry['branch'] not in branches:
+        return [{"error": f"La sucursal {entry['branch']} no existe"}]
+
+    needed = defaultdict(int)
+    for item in entry['items']:
+        needed[item['product']] += item['quantity']
+
+    failures = []
+    for line, item in enumerate(entry['items']):
+        product_id = item['product']
+        if product_id not in products:
+            failures.append({"line": line, "product": product_id, "error": "Producto no encontrado"})
+            continue
+        stock = available.get((entry['branch'], product_id))
+        if stock is None:
+            failures.append({
+                "line": line, "product": product_id,
+                "error": "No existe registro de inventario para el producto en esta sucursal",
+            })
+        elif stock < needed[product_id]:
+            failures.append({
+                "line": line, "product": product_id,
+                "requested": item['quantity'], "available": stock,
+                "error": (
+                    f"Stock insuficiente de {products[product_id][1]}. "
+                    f"Disponible: {stock}, Solicitado: {needed[product_id]}"
+                ),
+            })
+    if not failures:
+        for product_id, quantity in needed.items():
+            available[(entry['branch'], product_id)] -= quantity
+    return failures
+
+
+def _result(uuid, status, sale=None, **extra):
+    return {"client_uuid": str(uuid), "status": status, "sale": sale, **extra}
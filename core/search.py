@@ -0,0 +1,193 @@
+"""
+Búsqueda de productos por nombre, SKU, categoría y descripción.
+
+- PostgreSQL: índices GIN sobre core_product (trigramas en name/sku y tsvector
+  del documento completo) más un índice (tenant_id, sku varchar_pattern_ops)
+  para prefijos de SKU.
+  Los índices son de expresión, así que el motor los mantiene solo.
+- SQLite: tabla virtual FTS5 `core_product_fts` (shadow table con rowid = id
+  del producto), sincronizada por las señales de Product (core/signals.py).
+  Las cargas masivas que no disparan señales deben llamar a index_products().
+
+Ambas se crean en la migración 0017_product_search.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+FTS_TABLE = 'core_product_fts'
+
+# Debe coincidir exactamente con la expresión del índice product_search_vector_idx
+PG_DOCUMENT = (
+    "to_tsvector('spanish'::regconfig, "
+    "coalesce(p.name, '') || ' ' || coalesce(p.sku, '') || ' ' || "
+    "coalesce(p.category, '') || ' ' || coalesce(p.description, ''))"
+)
+
+# Pesos BM25 por columna de la tabla FTS5: name, sku, category, description
+FTS_WEIGHTS = (10.0, 8.0, 3.0, 1.0)
+
+MAX_RESULTS = 100
+
+# Un código escaneado es un solo token sin espacios (ej: 7801234567890, ABC-001)
+SKU_PATTERN = re.compile(r'^[\w\-./]+$')
+
+# Marca de búsqueda sin filtro de tenant (tenant_id=None significa "sin tenant")
+_ALL = object()
+
+
+def search_products(query, tenant_id=None, all_tenants=False, limit=20):
+    """
+    Productos del tenant `tenant_id` (o de todos con all_tenants=True) que
+    coinciden con `query`, ordenados por relevancia (cada uno con el atributo
+    `rank`, mayor es mejor). Si la búsqueda parece un código
+    se anteponen las coincidencias por prefijo de SKU, que usan el índice b-tree
+    y responden sin pasar por el índice de texto completo.
+    """
+    query = ' '.join(query.split())
+    limit = max(1, min(limit, MAX_RESULTS))
+    if not query:
+        return []
+
+    scope = _ALL if all_tenants else tenant_id
+    results = []
+    if SKU_PATTERN.match(query):
+        results = list(_sku_prefix(query, scope, limit))
+        for product in results:
+            product.rank = None
+        if len(results) >= limit:
+            return results
+
+    seen = {product.id for product in results}
+    if connection.vendor == 'postgresql':
+        ranked = _search_postgresql(query, scope, limit)
+    elif connection.vendor == 'sqlite':
+        ranked = _search_sqlite(query, scope, limit)
+    else:
+        ranked = _search_fallback(query, scope, limit)
+    results.extend(product for product in ranked if product.id not in seen)
+    return results[:limit]
+
+
+def _scoped_products(scope):
+    products = Product.objects.all()
+    return products if scope is _ALL else products.for_tenant(scope)
+
+
+def _tenant_sql(scope, placeholder):
+    if scope is _ALL:
+        return ''
+    return 'AND p.tenant_id IS NULL' if scope is None else f'AND p.tenant_id = {placeholder}'
+
+
+def _sku_prefix(query, scope, limit):
+    products = _scoped_products(scope)
+    if connection.vendor == 'sqlite':
+        # LIKE en SQLite ignora mayúsculas y no usa el índice: rango sobre la colación
+        # BINARY, resuelto con product_tenant_sku_idx
+        products = products.filter(sku__gte=query, sku__lt=query + '\U0010ffff')
+    else:
+        # LIKE 'x%' usa product_sku_prefix_idx (varchar_pattern_ops) en PostgreSQL
+        products = products.filter(sku__startswith=query)
+    return products.order_by('sku')[:limit]
+
+
+def _search_postgresql(query, scope, limit):
+    tenant_sql = _tenant_sql(scope, '%(tenant)s')
+    sql = f"""
+        SELECT p.*,
+               ts_rank({PG_DOCUMENT}, plainto_tsquery('spanish'::regconfig, %(q)s))
+               + greatest(similarity(p.name, %(q)s), similarity(p.sku, %(q)s)) AS rank
+        FROM {Product._meta.db_table} p
+        WHERE ({PG_DOCUMENT} @@ plainto_tsquery('spanish'::regconfig, %(q)s)
+               OR p.name %% %(q)s
+               OR p.sku %% %(q)s)
+          {tenant_sql}
+        ORDER BY rank DESC, p.id
+        LIMIT %(limit)s
+    """
+    tenant = None if scope is _ALL else scope
+    return Product.objects.raw(sql, {'q': query, 'tenant': tenant, 'limit': limit})
+
+
+def _search_sqlite(query, scope, limit):
+    expression = _fts_match_expression(query)
+    if not expression:
+        # Sólo comillas: un MATCH vacío es un error de sintaxis de FTS5
+        return []
+    tenant_sql = _tenant_sql(scope, '%s')
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    # bm25() es menor cuanto más relevante: se invierte el signo para que rank crezca con la relevancia
+    sql = f"""
+        SELECT p.*, -bm25({FTS_TABLE}, {weights}) AS rank
+        FROM {FTS_TABLE} f
+        JOIN {Product._meta.db_table} p ON p.id = f.rowid
+        WHERE {FTS_TABLE} MATCH %s {tenant_sql}
+        ORDER BY rank DESC, p.id
+        LIMIT %s
+    """
+    params = [expression]
+    if scope is not _ALL and scope is not None:
+        params.append(scope)
+    params.append(limit)
+    return Product.objects.raw(sql, params)
+
+
+def _search_fallback(query, scope, limit):
+    """Otros motores: búsqueda sin índice (icontains), sólo para no romper el endpoint."""
+    products = _scoped_products(scope)
+    for term in query.split():
+        products = products.filter(Q(name__icontains=term) | Q(sku__icontains=term))
+    products = list(products.order_by('name')[:limit])
+    for product in products:
+        product.rank = None
+    return products
+
+
+def _fts_match_expression(query):
+    """Cada término como prefijo entre comillas ("term"*), todos requeridos."""
+    terms = [term.replace('"', '') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
+
+# --- Sincronización del índice FTS5 (sólo SQLite) ---
+
+def index_products(products):
+    """Reindexa los productos indicados en la tabla FTS5 (no-op fuera de SQLite)."""
+    if connection.vendor != 'sqlite':
+        return
+    products = list(products)
+    if not products:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(product.id,) for product in products],
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, sku, category, description) VALUES (%s, %s, %s, %s, %s)',
+            [(p.id, p.name, p.sku, p.category, p.description) for p in products],
+        )
+
+
+def unindex_products(product_ids):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+
+def rebuild_index():
+    """Reconstruye la tabla FTS5 completa desde core_product. Retorna los productos indexados."""
+    if connection.vendor != 'sqlite':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, sku, category, description) '
+            f'SELECT id, name, sku, category, description FROM {Product._meta.db_table}'
+        )
+        return cursor.rowcount
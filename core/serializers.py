@@ -1,5 +1,12 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from .models import User, Product, Branch, Supplier, Inventory, Sale, SaleItem, Order, OrderItem, Purchase, PurchaseItem, CartItem, Subscription
+from rest_framework.reverse import reverse
+from .models import Job, User, Product, Branch, Supplier, Inventory, InventoryMovement, ReorderAlert, DemandForecast, Sale, SaleItem, Order, OrderItem, Purchase, PurchaseItem, CartItem, Subscription
+from .allocation import place_order
+from .ledger import record_movements
+from .rollups import record_sales
+from .stock import InsufficientStock, decrement_stock
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,6 +37,35 @@ class InventorySerializer(serializers.ModelSerializer):
         model = Inventory
         fields = ['id', 'branch', 'branch_name', 'product', 'product_name', 'stock', 'reorder_point']
 
+class InventoryMovementSerializer(serializers.ModelSerializer):
+    product_sku = serializers.CharField(source='product.sku', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta:
+        model = InventoryMovement
+        fields = ['id', 'branch', 'product', 'product_sku', 'product_name', 'kind', 'quantity',
+                  'reference', 'user', 'username', 'created_at']
+
+class ReorderAlertSerializer(serializers.ModelSerializer):
+    product_sku = serializers.CharField(source='product.sku', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    branch_name = serializers.CharField(source='branch.name', read_only=True)
+
+    class Meta:
+        model = ReorderAlert
+        fields = ['id', 'branch', 'branch_name', 'product', 'product_sku', 'product_name', 'status', 'stock',
+                  'reorder_point', 'daily_velocity', 'days_of_cover', 'suggested_quantity', 'computed_at']
+
+class DemandForecastSerializer(serializers.ModelSerializer):
+    product_sku = serializers.CharField(source='product.sku', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = DemandForecast
+        fields = ['id', 'branch', 'product', 'product_sku', 'product_name', 'start_date', 'forecast',
+                  'horizon_total', 'daily_level', 'weekday_factors', 'history_units', 'mae', 'computed_at']
+
 # --- Serializadores para Ventas (Anidados) ---
 
 class SaleItemSerializer(serializers.ModelSerializer):
@@ -45,43 +81,52 @@ class SaleSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Sale
-        fields = ['id', 'branch', 'user', 'total', 'payment_method', 'created_at', 'items']
+        fields = ['id', 'branch', 'user', 'total', 'payment_method', 'client_uuid', 'created_at', 'items']
         read_only_fields = ['total', 'user', 'created_at'] # El total se calcula solo
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         # Asigna el usuario actual automáticamente
         validated_data['user'] = self.context['request'].user
-        
-        sale = Sale.objects.create(**validated_data)
-        
-        total_venta = 0
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            price = product.price # Precio actual del producto
-            
-            SaleItem.objects.create(sale=sale, price=price, **item_data)
-            
-            # Descontar stock
-            try:
-                inventory = Inventory.objects.get(branch=sale.branch, product=product)
-                if inventory.stock < quantity:
-                    raise serializers.ValidationError(
-                        f"Stock insuficiente de {product.name}. Disponible: {inventory.stock}, Solicitado: {quantity}"
-                    )
-                inventory.stock -= quantity
-                inventory.save()
-            except Inventory.DoesNotExist:
-                raise serializers.ValidationError(
-                    f"No existe registro de inventario para {product.name} en esta sucursal"
+
+        try:
+            with transaction.atomic():
+                sale = Sale.objects.create(**validated_data)
+                # Precio actual del producto; bulk_create no pasa por SaleItem.save()
+                items = [
+                    SaleItem(sale=sale, price=item_data['product'].price, **item_data)
+                    for item_data in items_data
+                ]
+                # Descontar stock de todas las líneas en una sola pasada (todo o nada)
+                decrement_stock((sale.branch_id, item.product_id, item.quantity) for item in items)
+                SaleItem.objects.bulk_create(items)
+
+                sale.total = sum(item.price * item.quantity for item in items)
+                sale.save(update_fields=['total'])
+                record_movements(
+                    'sale', [(sale.branch_id, item.product_id, -item.quantity) for item in items],
+                    reference=sale.id, user=sale.user,
                 )
-            
-            total_venta += price * quantity
-            
-        sale.total = total_venta
-        sale.save()
+                record_sales([(sale, sum(item.quantity for item in items))])
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'items': exc.failures})
+        # La respuesta muestra product.name de cada item: 2 queries en vez de 1 + N
+        prefetch_related_objects([sale], 'items__product')
         return sale
+
+
+class SaleBatchItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class SaleBatchEntrySerializer(serializers.Serializer):
+    """Venta encolada offline por el POS. Se valida sin consultar la BD;
+    productos y sucursales se resuelven en bloque al confirmar el lote."""
+    client_uuid = serializers.UUIDField()
+    branch = serializers.IntegerField()
+    payment_method = serializers.ChoiceField(choices=Sale.PAYMENT_METHODS, default='cash')
+    items = SaleBatchItemSerializer(many=True, allow_empty=False)
     
 
 # --- Serializadores para Pedidos (E-commerce) ---
@@ -91,8 +136,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = OrderItem
-        fields = ['product', 'product_name', 'quantity', 'price']
-        read_only_fields = ['price']
+        fields = ['product', 'product_name', 'branch', 'quantity', 'price']
+        read_only_fields = ['price', 'branch'] # La sucursal la asigna el checkout
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
@@ -110,27 +155,17 @@ class OrderSerializer(serializers.ModelSerializer):
         if request and hasattr(request, 'user') and request.user.is_authenticated:
             validated_data['user'] = request.user
             
-        order = Order.objects.create(**validated_data)
-        
-        total_order = 0
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            price = product.price # Precio actual
-            
-            OrderItem.objects.create(order=order, price=price, **item_data)
-            
-            # Nota: En e-commerce el stock suele descontarse al confirmar pago o envío,
-            # pero para este ejercicio lo descontaremos al crear el pedido:
-            inventory = Inventory.objects.filter(product=product).first()
-            if inventory:
-                inventory.stock -= quantity
-                inventory.save()
-            
-            total_order += price * quantity
-            
-        order.total = total_order
-        order.save()
+        # Nota: En e-commerce el stock suele descontarse al confirmar pago o envío,
+        # pero para este ejercicio lo descontaremos al crear el pedido, repartiendo
+        # entre sucursales según la estrategia configurada (core/allocation.py)
+        try:
+            order = place_order(
+                [(item_data['product'].id, item_data['quantity']) for item_data in items_data],
+                **validated_data
+            )
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'items': exc.failures})
+        prefetch_related_objects([order], 'items__product')
         return order
 
 # --- Serializadores para Compras a Proveedores ---
@@ -151,6 +186,7 @@ class PurchaseSerializer(serializers.ModelSerializer):
         fields = ['id', 'supplier', 'supplier_name', 'branch', 'date', 'total', 'notes', 'created_at', 'items']
         read_only_fields = ['total', 'created_at']
 
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         purchase = Purchase.objects.create(**validated_data)
@@ -163,8 +199,8 @@ class PurchaseSerializer(serializers.ModelSerializer):
             
             PurchaseItem.objects.create(purchase=purchase, **item_data)
             
-            # Incrementar stock en la sucursal correspondiente
-            inventory, created = Inventory.objects.get_or_create(
+            # Incrementar stock en la sucursal correspondiente (fila bloqueada hasta el commit)
+            inventory, created = Inventory.objects.select_for_update().get_or_create(
                 branch=purchase.branch,
                 product=product,
                 defaults={'stock': 0}
@@ -176,6 +212,11 @@ class PurchaseSerializer(serializers.ModelSerializer):
             
         purchase.total = total_purchase
         purchase.save()
+        request = self.context.get('request')
+        record_movements(
+            'purchase', [(purchase.branch_id, item['product'].id, item['quantity']) for item in items_data],
+            reference=purchase.id, user=getattr(request, 'user', None),
+        )
         return purchase
 
 # --- Serializador para Carrito ---
@@ -202,4 +243,19 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = ['id', 'user', 'user_username', 'plan_name', 'plan_display', 'start_date', 'end_date', 'active']
-        read_only_fields = []
\ No newline at end of file
+        read_only_fields = []
+class JobSerializer(serializers.ModelSerializer):
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'message', 'result', 'result_url', 'error',
+            'attempts', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_result_url(self, job):
+        if job.status != 'done' or not job.result_file:
+            return None
+        return reverse('job-result', args=[job.id], request=self.context.get('request'))
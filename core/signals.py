@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalog import record_deletion
+from .conditional import BRANCHES, INVENTORY, PRODUCTS, SUPPLIERS, bump_table_version
+from .models import Branch, Inventory, Product, Subscription, Supplier, Tenant, User
+from .plans import invalidate_tenant_plan
+from .search import index_products, unindex_products
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Branch)
+@receiver(pre_save, sender=Subscription)
+def sync_tenant_from_company(sender, instance, update_fields=None, **kwargs):
+    """Mantiene la FK `tenant` alineada con el string `company` de la instancia"""
+    if update_fields is not None and 'company' not in update_fields:
+        return  # ej: update_last_login no toca la empresa
+    tenant = Tenant.objects.resolve(instance.company)
+    instance.tenant = tenant
+
+
+@receiver(pre_save, sender=Subscription)
+def remember_subscription_tenant(sender, instance, **kwargs):
+    """Tenant guardado antes del cambio: si cambia la empresa, se invalidan ambos planes"""
+    instance._previous_tenant_id = (
+        Subscription.objects.filter(pk=instance.pk).values_list('tenant_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription_plan(sender, instance, **kwargs):
+    # Al confirmar: invalidar antes dejaría que otra request vuelva a cachear el plan anterior
+    tenant_ids = {instance.tenant_id, getattr(instance, '_previous_tenant_id', None)} - {None}
+
+    def invalidate():
+        for tenant_id in tenant_ids:
+            invalidate_tenant_plan(tenant_id)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_for_search(sender, instance, **kwargs):
+    unindex_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deletion(sender, instance, **kwargs):
+    record_deletion(instance.tenant_id, instance.pk)
+
+
+@receiver(post_delete, sender=Inventory)
+def record_inventory_deletion(sender, instance, **kwargs):
+    # En un borrado en cascada la sucursal puede haberse eliminado ya en la misma transacción
+    tenant_id = Branch.objects.filter(id=instance.branch_id).values_list('tenant_id', flat=True).first()
+    record_deletion(tenant_id, instance.product_id, instance.branch_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product_version(sender, instance, **kwargs):
+    bump_table_version(PRODUCTS, [instance.tenant_id])
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def bump_inventory_version(sender, instance, **kwargs):
+    bump_table_version(INVENTORY, [instance.branch_id])
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def bump_branch_version(sender, instance, **kwargs):
+    bump_table_version(BRANCHES, [instance.tenant_id])
+
+
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+def bump_supplier_version(sender, instance, **kwargs):
+    # Los proveedores no tienen tenant: un único contador
+    bump_table_version(SUPPLIERS, [0])
@@ -0,0 +1,233 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .conditional import INVENTORY, bump_table_version
+from .ledger import record_movements
+from .models import Branch, Inventory, Tenant
+
+
+class InsufficientStock(Exception):
+    """La operación se rechaza completa; `failures` indica qué líneas fallaron."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"{len(failures)} línea(s) sin stock suficiente")
+
+
+def lock_inventory(keys):
+    """
+    Bloquea (SELECT ... FOR UPDATE) las filas de inventario de los pares
+    (branch_id, product_id) indicados y las retorna indexadas por ese par.
+
+    Las filas se bloquean ordenadas por id para que transacciones concurrentes
+    las tomen en el mismo orden (evita deadlocks).
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    # Filtrar por IN mantiene la query compacta; con una sola sucursal (el caso
+    # del POS) el resultado es exacto y el resto se descarta en Python.
+    rows = (
+        Inventory.objects.select_for_update(of=('self',))
+        .select_related('product')
+        .filter(
+            branch_id__in={branch_id for branch_id, _ in keys},
+            product_id__in={product_id for _, product_id in keys},
+        )
+        .order_by('id')
+    )
+    return {
+        (inv.branch_id, inv.product_id): inv
+        for inv in rows
+        if (inv.branch_id, inv.product_id) in keys
+    }
+
+
+def decrement_stock(lines):
+    """
+    Descuenta stock para un conjunto de líneas (branch_id, product_id, quantity)
+    de forma conjunta: todo o nada.
+
+    Debe llamarse dentro de transaction.atomic(). Usa un número fijo de queries
+    sin importar la cantidad de líneas:
+      1. SELECT ... FOR UPDATE de las filas de inventario afectadas (lock_inventory).
+      2. Un único UPDATE con stock = stock - qty condicionado a stock >= qty.
+
+    Si alguna fila no existe o quedaría negativa se lanza InsufficientStock con
+    el detalle por línea (índice dentro de `lines`) y no se modifica nada.
+    """
+    lines = list(lines)
+    requested = defaultdict(int)
+    for branch_id, product_id, quantity in lines:
+        requested[(branch_id, product_id)] += quantity
+    if not requested:
+        return
+
+    locked = lock_inventory(requested)
+
+    short = {}
+    for key, quantity in requested.items():
+        inventory = locked.get(key)
+        if inventory is None or inventory.stock < quantity:
+            short[key] = inventory
+    if short:
+        raise InsufficientStock(_describe_failures(lines, requested, short))
+
+    if apply_stock_decrement(requested) != len(requested):
+        # Sólo ocurre si el motor no soporta FOR UPDATE y otra transacción ganó
+        # la carrera: el guard impide dejar stock negativo y la excepción hace
+        # rollback del UPDATE parcial.
+        raise InsufficientStock([
+            {
+                "line": index,
+                "branch": branch_id,
+                "product": product_id,
+                "requested": quantity,
+                "available": None,
+                "error": "El stock cambió durante la operación, reintente.",
+            }
+            for index, (branch_id, product_id, quantity) in enumerate(lines)
+        ])
+
+
+def apply_stock_decrement(requested):
+    """
+    Descuenta en un único UPDATE las cantidades de `requested`
+    ({(branch_id, product_id): quantity}), cada fila condicionada a stock >= qty.
+    Retorna la cantidad de filas actualizadas; si es menor que len(requested)
+    el llamador debe abortar la transacción.
+
+    Una cantidad negativa suma stock (destino de una transferencia).
+
+    Las filas quedan con la versión del catálogo de la transacción (feed del POS)
+    y se invalidan los ETag del inventario de las sucursales afectadas.
+    """
+    guard = Q()
+    for (branch_id, product_id), quantity in requested.items():
+        guard |= Q(branch_id=branch_id, product_id=product_id, stock__gte=quantity)
+    branch_tenants = dict(
+        Branch.objects.filter(id__in={branch_id for branch_id, _ in requested})
+        .values_list('id', 'tenant_id')
+    )
+    versions = {
+        tenant_id: Tenant.objects.next_catalog_version(tenant_id)
+        for tenant_id in set(branch_tenants.values())
+    }
+    bump_table_version(INVENTORY, branch_tenants)
+    return Inventory.objects.filter(guard).update(
+        stock=Case(
+            *[
+                When(branch_id=branch_id, product_id=product_id, then=F('stock') - quantity)
+                for (branch_id, product_id), quantity in requested.items()
+            ],
+            default=F('stock'),
+        ),
+        catalog_version=Case(
+            *[
+                When(branch_id=branch_id, then=Value(versions[tenant_id]))
+                for branch_id, tenant_id in branch_tenants.items()
+                if versions[tenant_id]
+            ],
+            default=F('catalog_version'),
+            output_field=BigIntegerField(),
+        ),
+    )
+
+
+def transfer_stock(from_branch_id, to_branch_id, lines, user=None):
+    """
+    Traslada stock entre dos sucursales: `lines` son (product_id, quantity).
+    Todo o nada, con un número fijo de queries:
+      1. SELECT ... FOR UPDATE de las filas de origen y destino (lock_inventory).
+      2. INSERT de las filas de destino que aún no existen.
+      3. Un único UPDATE que descuenta en el origen y suma en el destino.
+      4. Los movimientos 'transfer' de ambas sucursales en el libro de inventario.
+    Lanza InsufficientStock si el origen no cubre alguna línea.
+    """
+    source_lines = [(from_branch_id, product_id, quantity) for product_id, quantity in lines]
+    moved = defaultdict(int)
+    for product_id, quantity in lines:
+        moved[product_id] += quantity
+    if not moved:
+        return
+
+    with transaction.atomic():
+        locked = lock_inventory(
+            [(from_branch_id, product_id) for product_id in moved]
+            + [(to_branch_id, product_id) for product_id in moved]
+        )
+        requested = {(from_branch_id, product_id): quantity for product_id, quantity in moved.items()}
+        short = {
+            key: locked.get(key) for key, quantity in requested.items()
+            if key not in locked or locked[key].stock < quantity
+        }
+        if short:
+            raise InsufficientStock(_describe_failures(source_lines, requested, short))
+
+        Inventory.objects.bulk_create([
+            Inventory(branch_id=to_branch_id, product_id=product_id, stock=0)
+            for product_id in moved if (to_branch_id, product_id) not in locked
+        ], ignore_conflicts=True)
+        requested.update({(to_branch_id, product_id): -quantity for product_id, quantity in moved.items()})
+        if apply_stock_decrement(requested) != len(requested):
+            raise InsufficientStock([
+                {
+                    "line": index,
+                    "branch": from_branch_id,
+                    "product": product_id,
+                    "requested": quantity,
+                    "available": None,
+                    "error": "El stock cambió durante la operación, reintente.",
+                }
+                for index, (_, product_id, quantity) in enumerate(source_lines)
+            ])
+        record_movements('transfer', [
+            (branch_id, product_id, -quantity) for (branch_id, product_id), quantity in requested.items()
+        ], user=user)
+
+
+def _describe_failures(lines, requested, short):
+    failures = []
+    for index, (branch_id, product_id, quantity) in enumerate(lines):
+        key = (branch_id, product_id)
+        if key not in short:
+            continue
+        inventory = short[key]
+        if inventory is None:
+            error = "No existe registro de inventario para el producto en esta sucursal"
+            available = 0
+        else:
+            available = inventory.stock
+            error = (
+                f"Stock insuficiente de {inventory.product.name}. "
+                f"Disponible: {available}, Solicitado: {requested[key]}"
+            )
+        failures.append({
+            "line": index,
+            "branch": branch_id,
+            "product": product_id,
+            "requested": quantity,
+            "available": available,
+            "error": error,
+        })
+    return failures
+
+
+def branch_stock_summary(branches):
+    """
+    Anota cada sucursal con sus totales de inventario en una sola query agregada:
+    total_items (SKUs), total_units y total_value (stock * precio).
+    Las sucursales sin inventario quedan con totales en 0.
+    """
+    return branches.annotate(
+        total_items=Count('inventory'),
+        total_units=Coalesce(Sum('inventory__stock'), 0),
+        total_value=Coalesce(
+            Sum(F('inventory__stock') * F('inventory__product__price'), output_field=BigIntegerField()),
+            0,
+            output_field=BigIntegerField(),
+        ),
+    ).order_by('id')
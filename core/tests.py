@@ -1,3 +1,891 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import cycle_count, product_import
+from .allocation import get_strategy, place_order
+from .catalog import catalog_changes
+from .cycle_count import CountError, apply_count, parse_count_entries, parse_scanner_file
+from .forecast import fit, predict
+from .instrumentation import fingerprint
+from .jobs import Heartbeat, requeue_stale
+from .ledger import latest_snapshot, prune_snapshots, record_movements, record_opening_balances, stock_at, take_snapshots
+from .management.commands.generate_dataset import _copy_field
+from .models import Branch, Inventory, InventoryMovement, Job, Order, Product, ReorderAlert, Sale, SaleItem, StockReservation, Subscription, Supplier, Tenant, User
+from .plans import clear_plan_cache
+from .product_import import import_products, read_rows
+from .reorder import STATUSES, compute_alerts, evaluate
+from .reports import stream_stock_detail
+from .reservations import available_to_sell, held_quantities, release, reserve, sweep_expired
+from .sales import MAX_BATCH_SIZE
+from .stock import InsufficientStock, decrement_stock
+
+
+def create_store(stock, products=1, company='Tienda', sku_prefix='SKU'):
+    """Tenant con una sucursal, `products` productos con `stock` unidades cada uno y un vendedor."""
+    tenant = Tenant.objects.resolve(company)
+    branch = Branch.objects.create(name='Centro', address='Calle 1', phone='1', company=company)
+    items = [
+        Product.objects.create(sku=f'{sku_prefix}-{index}', name=f'Producto {index}', price=1000, cost=500,
+                               category='general', tenant=tenant)
+        for index in range(products)
+    ]
+    for product in items:
+        Inventory.objects.create(branch=branch, product=product, stock=stock)
+    seller = User.objects.create_user(f'vendedor-{tenant.code}', password='x', role='vendedor', company=company)
+    return tenant, branch, items, seller
+
+
+class StockEngineTests(TestCase):
+    """Descuento de stock de las ventas POS (core/stock.py): todo o nada, en cualquier motor."""
+
+    def setUp(self):
+        clear_plan_cache()
+        _, self.branch, self.products, seller = create_store(5, products=2)
+        self.client = APIClient()
+        self.client.force_authenticate(seller)
+
+    def post_sale(self, *quantities):
+        return self.client.post('/api/sales/', {
+            'branch': self.branch.id, 'payment_method': 'cash',
+            'items': [{'product': product.id, 'quantity': quantity} for product, quantity in zip(self.products, quantities)],
+        }, format='json')
+
+    def stock(self):
+        return list(Inventory.objects.filter(branch=self.branch).order_by('product_id').values_list('stock', flat=True))
+
+    def test_sale_decrements_every_line(self):
+        response = self.post_sale(2, 5)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total'], 7000)
+        self.assertEqual(self.stock(), [3, 0])
+        self.assertEqual(
+            sorted(InventoryMovement.objects.filter(kind='sale').values_list('quantity', flat=True)), [-5, -2],
+        )
+
+    def test_short_line_rejects_whole_sale(self):
+        response = self.post_sale(2, 6)
+        self.assertEqual(response.status_code, 400)
+        failure, = response.data['items']
+        self.assertEqual((int(failure['line']), int(failure['available'])), (1, 5))
+        self.assertEqual(self.stock(), [5, 5])
+        self.assertFalse(Sale.objects.exists())
+
+    def test_lines_of_same_product_are_added(self):
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            decrement_stock([(self.branch.id, self.products[0].id, 3), (self.branch.id, self.products[0].id, 3)])
+        self.assertEqual(len(raised.exception.failures), 2)
+        self.assertEqual(self.stock(), [5, 5])
+
+    def test_missing_inventory_row_is_reported(self):
+        other = Product.objects.create(sku='SIN-STOCK', name='Sin fila', price=1, cost=1, category='general')
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            decrement_stock([(self.branch.id, self.products[0].id, 1), (self.branch.id, other.id, 1)])
+        self.assertEqual([failure['line'] for failure in raised.exception.failures], [1])
+        self.assertEqual(self.stock(), [5, 5])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrencyTestCase(TransactionTestCase):
+    """Base de las pruebas con varios hilos contra las mismas filas (requiere SELECT ... FOR UPDATE)."""
+
+    threads = 8
+
+    def setUp(self):
+        clear_plan_cache()
+
+    def run_threads(self, target):
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                outcome = target()
+                with lock:
+                    results.append(outcome)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+
+class ConcurrentSalesTests(ConcurrencyTestCase):
+    """Ventas simultáneas sobre las mismas filas de inventario (bloqueo por fila, ver core/stock.py)."""
+
+    sales_per_thread = 5
+
+    def test_concurrent_sales_never_oversell(self):
+        stock = 17
+        _, branch, products, seller = create_store(stock, products=2)
+
+        def post_sales():
+            client = APIClient()
+            client.force_authenticate(seller)
+            statuses = []
+            for _ in range(self.sales_per_thread):
+                response = client.post('/api/sales/', {
+                    'branch': branch.id, 'payment_method': 'cash',
+                    'items': [{'product': product.id, 'quantity': 1} for product in products],
+                }, format='json')
+                statuses.append(response.status_code)
+            return statuses
+
+        attempts = self.threads * self.sales_per_thread
+        statuses = [code for codes in self.run_threads(post_sales) for code in codes]
+        accepted, rejected = statuses.count(201), statuses.count(400)
+        self.assertEqual(accepted + rejected, attempts)
+        self.assertEqual(accepted, min(stock, attempts))
+        self.assertEqual(Sale.objects.count(), accepted)
+        for inventory in Inventory.objects.filter(branch=branch):
+            self.assertEqual(inventory.stock, stock - accepted)
+            moved = InventoryMovement.objects.filter(
+                branch=branch, product_id=inventory.product_id, kind='sale',
+            ).aggregate(total=Sum('quantity'))['total']
+            self.assertEqual(moved, -accepted)
+
+
+class SaleBatchTests(TestCase):
+    """Sincronización de ventas offline del POS (POST /api/sales/batch/)."""
+
+    def setUp(self):
+        clear_plan_cache()
+        _, self.branch, self.products, seller = create_store(5)
+        self.client = APIClient()
+        self.client.force_authenticate(seller)
+
+    def entry(self, quantity, client_uuid=None):
+        return {
+            'client_uuid': client_uuid or str(uuid.uuid4()), 'branch': self.branch.id,
+            'items': [{'product': self.products[0].id, 'quantity': quantity}],
+        }
+
+    def post(self, entries):
+        response = self.client.post('/api/sales/batch/', {'sales': entries}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_allocates_in_order_and_deduplicates(self):
+        first = self.entry(3)
+        data = self.post([first, self.entry(3), dict(first), self.entry(2), {'client_uuid': 'x', 'items': []}])
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'rejected', 'duplicate', 'created', 'invalid'])
+        self.assertEqual(data['results'][2]['sale'], data['results'][0]['sale'])
+        self.assertEqual(data['summary'], {'created': 2, 'rejected': 1, 'duplicate': 1, 'invalid': 1})
+        self.assertEqual(Inventory.objects.get(branch=self.branch).stock, 0)
+
+    def test_resent_queue_is_not_applied_twice(self):
+        entries = [self.entry(1), self.entry(1)]
+        created = self.post(entries)['results']
+        resent = self.post(entries)['results']
+        self.assertEqual([result['status'] for result in resent], ['duplicate', 'duplicate'])
+        self.assertEqual([result['sale'] for result in resent], [result['sale'] for result in created])
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(Inventory.objects.get(branch=self.branch).stock, 3)
+
+    def test_other_tenant_branches_and_products_are_rejected(self):
+        _, branch, products, _ = create_store(5, company='Otra', sku_prefix='OTRA')
+        foreign_branch = dict(self.entry(1), branch=branch.id)
+        foreign_product = self.entry(1)
+        foreign_product['items'] = [{'product': products[0].id, 'quantity': 1}]
+        data = self.post([foreign_branch, foreign_product])
+        self.assertEqual([result['status'] for result in data['results']], ['rejected', 'rejected'])
+        self.assertEqual(data['results'][1]['errors'][0]['error'], 'Producto no encontrado')
+        self.assertEqual(Inventory.objects.get(branch=branch).stock, 5)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_pos_sends_queue_in_chunks_the_server_accepts(self):
+        self.client.force_login(User.objects.get(role='vendedor', company='Tienda'))
+        response = self.client.get('/pos/')
+        self.assertContains(response, f'const MAX_BATCH_SIZE = {MAX_BATCH_SIZE};')
+
+
+class ConcurrentSaleBatchTests(ConcurrencyTestCase):
+    """Reintentos simultáneos del mismo lote: cada client_uuid se crea una sola vez."""
+
+    def test_concurrent_batch_retries_create_each_sale_once(self):
+        _, branch, products, seller = create_store(100)
+        batch = [
+            {'client_uuid': str(uuid.uuid4()), 'branch': branch.id, 'items': [{'product': products[0].id, 'quantity': 1}]}
+            for _ in range(10)
+        ]
+
+        def post_batch():
+            client = APIClient()
+            client.force_authenticate(seller)
+            response = client.post('/api/sales/batch/', {'sales': batch}, format='json')
+            return response.status_code, [result['status'] for result in response.data['results']]
+
+        outcomes = self.run_threads(post_batch)
+        self.assertEqual({code for code, _ in outcomes}, {200})
+        for position in range(len(batch)):
+            statuses = sorted(result[position] for _, result in outcomes)
+            self.assertEqual(statuses, ['created'] + ['duplicate'] * (self.threads - 1))
+        self.assertEqual(Sale.objects.count(), len(batch))
+        self.assertEqual(Inventory.objects.get(branch=branch).stock, 100 - len(batch))
+
+
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Las vistas con `query_budget` lanzan QueryBudgetExceeded si lo exceden (p. ej. un N+1 nuevo)."""
+
+    def setUp(self):
+        clear_plan_cache()
+        tenant, branch, products, _ = create_store(50, products=10)
+        Subscription.objects.create(company=tenant.name, plan_name='premium', start_date=date(2026, 1, 1),
+                                    end_date=date(2027, 1, 1))
+        supplier = Supplier.objects.create(name='Proveedor', rut='11.111.111-1', contact='x')
+        Product.objects.filter(tenant=tenant).update(supplier=supplier)
+        for name in ('Norte', 'Sur'):
+            other = Branch.objects.create(name=name, address='Calle 2', phone='2', company=tenant.name)
+            Inventory.objects.bulk_create([Inventory(branch=other, product=product, stock=50) for product in products])
+        self.user = User.objects.create_user('admin', password='x', role='admin_cliente', company=tenant.name)
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        items = [{'product': product.id, 'quantity': 1} for product in products[:5]]
+        for _ in range(3):
+            self.client.post('/api/sales/', {'branch': branch.id, 'payment_method': 'cash', 'items': items}, format='json')
+            self.client.post('/api/orders/', {'customer_name': 'Cliente', 'customer_email': 'c@c.cl', 'items': items},
+                             format='json')
+        Job.objects.create(kind='stock_report', user=self.user, tenant=tenant)
+        self.ids = {
+            'product': products[0].id, 'branch': branch.id, 'supplier': supplier.id,
+            'inventory': Inventory.objects.filter(branch=branch).first().id,
+            'sale': Sale.objects.first().id, 'order': Order.objects.first().id, 'job': Job.objects.first().id,
+        }
+
+    def test_budgeted_endpoints_stay_within_budget(self):
+        ids = self.ids
+        urls = [
+            '/api/products/', f"/api/products/{ids['product']}/", '/api/products/search/?q=Producto',
+            '/api/branches/', f"/api/branches/{ids['branch']}/",
+            '/api/suppliers/', f"/api/suppliers/{ids['supplier']}/",
+            '/api/inventory/', f"/api/inventory/?branch={ids['branch']}", f"/api/inventory/{ids['inventory']}/",
+            '/api/sales/', f"/api/sales/{ids['sale']}/",
+            '/api/orders/', f"/api/orders/{ids['order']}/",
+            '/api/jobs/', f"/api/jobs/{ids['job']}/",
+            '/api/pos/catalog/', '/products/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class CatalogFeedTests(TestCase):
+    def test_full_catalog_includes_rows_loaded_without_save(self):
+        tenant, branch, products, _ = create_store(5)
+        loaded = Product.objects.bulk_create([
+            Product(sku='BULK-1', name='Carga', price=1, cost=1, category='general', tenant=tenant),
+        ])
+        Inventory.objects.bulk_create([Inventory(branch=branch, product=loaded[0], stock=3)])
+
+        feed = catalog_changes(tenant.id, 0)
+        self.assertTrue(feed['full'])
+        self.assertEqual({row['sku'] for row in feed['products']}, {'SKU-0', 'BULK-1'})
+        self.assertEqual(len(feed['inventory']), 2)
+
+    def test_incremental_catalog_returns_only_changes(self):
+        tenant, _, products, _ = create_store(5, products=3)
+        version = catalog_changes(tenant.id, 0)['version']
+        products[1].price = 1500
+        products[1].save()
+
+        feed = catalog_changes(tenant.id, version)
+        self.assertFalse(feed['full'])
+        self.assertEqual([row['id'] for row in feed['products']], [products[1].id])
+        self.assertEqual(feed['inventory'], [])
+
+    def test_superuser_feed_spans_tenants_and_honours_since(self):
+        tenant, _, products, _ = create_store(5)
+        other, _, other_products, _ = create_store(5, company='Otra', sku_prefix='OTRA')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('root', password='x', role='super_admin'))
+        feed = client.get('/api/pos/catalog/').data
+        self.assertEqual(len(feed['products']), 2)
+
+        other_products[0].price = 1500
+        other_products[0].save()
+        deleted = products[0].id
+        products[0].delete()
+        delta = client.get(f"/api/pos/catalog/?since={feed['version']}").data
+        self.assertFalse(delta['full'])
+        self.assertEqual([row['id'] for row in delta['products']], [other_products[0].id])
+        self.assertEqual(delta['deleted']['products'], [deleted])
+
+    def test_user_without_tenant_is_rejected(self):
+        create_store(5)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('suelto', password='x', role='vendedor'))
+        response = client.get('/api/pos/catalog/')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('empresa', response.data['error'])
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_values_and_lists_are_normalized(self):
+        first = fingerprint("SELECT * FROM core_product WHERE id IN (%s, %s, %s) AND sku = 'A-1'")
+        second = fingerprint("SELECT *  FROM core_product\nWHERE id IN (%s, %s) AND sku = 'B''2'")
+        self.assertEqual(first, "SELECT * FROM core_product WHERE id IN (...) AND sku = ?")
+        self.assertEqual(first, second)
+
+    def test_numeric_literals_are_replaced(self):
+        self.assertEqual(fingerprint("SELECT 1 FROM t LIMIT 21"), "SELECT ? FROM t LIMIT ?")
+
+
+class StockReportStreamTests(SimpleTestCase):
+    def test_stream_matches_summaries_and_rows(self):
+        summaries = [
+            {'branch_id': 1, 'branch': 'Centro', 'total_items': 2},
+            {'branch_id': 2, 'branch': 'Vacía', 'total_items': 0},
+            {'branch_id': 3, 'branch': 'Norte', 'total_items': 1},
+        ]
+        rows = [
+            (1, 'Arroz', 'A-1', 3, 1000),
+            (1, 'Azúcar', 'A-2', 0, 900),
+            (3, 'Café', 'C-1', 2, 5000),
+        ]
+        report = json.loads(''.join(stream_stock_detail(summaries, iter(rows), buffer_size=1)))
+        self.assertEqual([branch['branch_id'] for branch in report], [1, 2, 3])
+        self.assertEqual(report[0]['inventory'], [
+            {'product': 'Arroz', 'sku': 'A-1', 'stock': 3, 'value': 3000},
+            {'product': 'Azúcar', 'sku': 'A-2', 'stock': 0, 'value': 0},
+        ])
+        self.assertEqual(report[1]['inventory'], [])
+        self.assertEqual(report[2]['inventory'], [{'product': 'Café', 'sku': 'C-1', 'stock': 2, 'value': 10000}])
+
+    def test_empty_report(self):
+        self.assertEqual(json.loads(''.join(stream_stock_detail([], iter([])))), [])
+
+
+class CopyFieldTests(SimpleTestCase):
+    def test_null_is_unquoted_and_empty_string_quoted(self):
+        row = (1, None, '', 'dice "hola"', 2.5, uuid.UUID(int=1), date(2026, 1, 2))
+        self.assertEqual(
+            ','.join(map(_copy_field, row)),
+            '1,,"","dice ""hola""",2.5,"00000000-0000-0000-0000-000000000001","2026-01-02"',
+        )
+
+
+class CountParsingTests(SimpleTestCase):
+    def test_scanner_file_with_header_and_quantities(self):
+        upload = io.BytesIO('\ufeffsku;cantidad\nA-1;3\nB-2\n\nA-1;2\n'.encode('utf-8'))
+        self.assertEqual(parse_scanner_file(upload), [
+            (2, 'A-1', None, 3), (3, 'B-2', None, 1), (5, 'A-1', None, 2),
+        ])
+
+    def test_scanner_file_detects_delimiter(self):
+        upload = io.BytesIO(b'A-1,4\nB-2,0\n')
+        self.assertEqual(parse_scanner_file(upload), [(1, 'A-1', None, 4), (2, 'B-2', None, 0)])
+
+    def test_scanner_file_rejects_bad_quantities(self):
+        upload = io.BytesIO(b'A-1;3\nB-2;x\nC-3;-1\n')
+        with self.assertRaises(CountError) as raised:
+            parse_scanner_file(upload)
+        self.assertEqual([error['line'] for error in raised.exception.errors], [2, 3])
+        self.assertFalse(raised.exception.retryable)
+
+    def test_count_entries(self):
+        self.assertEqual(
+            parse_count_entries([{'sku': ' A-1 ', 'counted': 2}, {'product': 7, 'counted': 0}]),
+            [(1, 'A-1', None, 2), (2, None, 7, 0)],
+        )
+        with self.assertRaises(CountError) as raised:
+            parse_count_entries([{'counted': 1}, {'sku': 'A', 'counted': True}, 'x'])
+        self.assertEqual(len(raised.exception.errors), 3)
+
+
+class CycleCountTests(TestCase):
+    """Conteo cíclico (core/cycle_count.apply_count): stock final, reporte y ajustes en el libro."""
+
+    def setUp(self):
+        _, self.branch, self.products, self.user = create_store(10, products=3)
+
+    def stock(self):
+        return dict(Inventory.objects.filter(branch=self.branch).values_list('product__sku', 'stock'))
+
+    def test_count_sets_stock_and_records_adjustments(self):
+        report = apply_count(self.branch, [(1, 'SKU-0', None, 4), (2, 'SKU-0', None, 3), (3, 'SKU-1', None, 12)],
+                             user=self.user)
+        self.assertEqual(report['summary']['adjusted'], 2)
+        self.assertEqual((report['summary']['units_short'], report['summary']['units_over']), (3, 2))
+        self.assertEqual(self.stock(), {'SKU-0': 7, 'SKU-1': 12, 'SKU-2': 10})
+        self.assertEqual(
+            sorted(InventoryMovement.objects.filter(kind='adjustment').values_list('quantity', flat=True)), [-3, 2],
+        )
+
+    def test_dry_run_and_zero_missing(self):
+        apply_count(self.branch, [(1, 'SKU-0', None, 1)], zero_missing=True, dry_run=True)
+        self.assertEqual(self.stock(), {'SKU-0': 10, 'SKU-1': 10, 'SKU-2': 10})
+        apply_count(self.branch, [(1, 'SKU-0', None, 1)], zero_missing=True)
+        self.assertEqual(self.stock(), {'SKU-0': 1, 'SKU-1': 0, 'SKU-2': 0})
+
+    def test_product_of_other_tenant_is_rejected(self):
+        _, _, others, _ = create_store(1, company='Otra', sku_prefix='OTRA')
+        with self.assertRaises(CountError):
+            apply_count(self.branch, [(1, None, others[0].id, 5)])
+
+    def test_row_created_during_count_is_retryable(self):
+        product = Product.objects.create(sku='NUEVO', name='Nuevo', price=1, cost=1, category='general',
+                                         tenant=self.branch.tenant)
+        # Otra operación crea la fila entre la lectura del inventario y el INSERT del conteo
+        report = cycle_count._variance_report
+
+        def racing(branch, counted, current):
+            Inventory.objects.create(branch=branch, product=product, stock=4)
+            return report(branch, counted, current)
+
+        with mock.patch.object(cycle_count, '_variance_report', racing), self.assertRaises(CountError) as raised:
+            apply_count(self.branch, [(1, 'NUEVO', None, 9)])
+        self.assertTrue(raised.exception.retryable)
+        self.assertFalse(Inventory.objects.filter(product=product).exists())
+
+
+class ReorderEvaluateTests(TestCase):
+    def test_levels_cover_and_suggested(self):
+        # branch_id, product_id, stock, reorder_point
+        inventory = np.array([
+            [1, 1, 0, 5],     # sin stock
+            [1, 2, 4, 5],     # bajo el punto de reorden
+            [1, 3, 20, 5],    # cobertura de 5 días con 4 unidades diarias
+            [1, 4, 20, 5],    # sin ventas: sin alerta
+        ], dtype=np.int64)
+        sold = np.array([28, 0, 112, 0], dtype=np.int64)
+        alerts = evaluate(inventory, sold, window_days=28, cover_days=7, target_days=14)
+
+        self.assertEqual([STATUSES[level] if level >= 0 else None for level in alerts['level']],
+                         ['out', 'below', 'cover', None])
+        self.assertEqual(alerts['cover'][2], 5)
+        self.assertTrue(np.isinf(alerts['cover'][3]))
+        self.assertEqual(alerts['suggested'].tolist(), [19, 1, 41, 0])
+
+    def test_compute_alerts_replaces_tenant_alerts(self):
+        tenant, branch, products, _ = create_store(20, products=3)
+        Inventory.objects.filter(product=products[0]).update(stock=0)
+        Inventory.objects.filter(product=products[1]).update(stock=8)
+        create_store(0, company='Otra', sku_prefix='OTRA')
+
+        summary = compute_alerts(tenant.id)
+        self.assertEqual((summary['rows'], summary['alerts'], summary['out'], summary['below']), (3, 2, 1, 1))
+        self.assertEqual(
+            list(ReorderAlert.objects.filter(branch=branch).order_by('product_id').values_list('product_id', 'status')),
+            [(products[0].id, 'out'), (products[1].id, 'below')],
+        )
+        Inventory.objects.filter(product=products[0]).update(stock=50)
+        compute_alerts(tenant.id)
+        self.assertEqual(ReorderAlert.objects.filter(branch=branch).count(), 1)
+        self.assertFalse(ReorderAlert.objects.exclude(branch=branch).exists())
+
+
+class ForecastTests(SimpleTestCase):
+    def test_flat_demand_keeps_level_and_neutral_factors(self):
+        demand = np.full((2, 3, 28), 4.0)
+        model = fit(demand, first_weekday=0)
+        np.testing.assert_allclose(model['level'], 4.0)
+        np.testing.assert_allclose(model['factors'], 1.0)
+        np.testing.assert_allclose(model['mae'], 0.0)
+        np.testing.assert_allclose(predict(model, first_weekday=3, horizon=10), 4.0)
+
+    def test_weekly_pattern_is_aligned_to_weekdays(self):
+        # 8 semanas desde un miércoles: sólo se vende los sábados
+        weeks, first_weekday = 8, 2
+        weekdays = (first_weekday + np.arange(weeks * 7)) % 7
+        demand = np.where(weekdays == 5, 14.0, 0.0)[None, :]
+        model = fit(demand, first_weekday)
+        self.assertEqual(int(np.argmax(model['factors'][0])), 5)
+        forecast = predict(model, first_weekday=0, horizon=7)
+        self.assertEqual(forecast.shape, (1, 7))
+        self.assertEqual(int(np.argmax(forecast[0])), 5)
+
+    def test_no_sales_forecast_zero(self):
+        model = fit(np.zeros((1, 1, 14)), first_weekday=0)
+        np.testing.assert_allclose(predict(model, 0, 7), 0.0)
+
+
+class AllocationTests(TestCase):
+    """Asignación de pedidos web a sucursales (core/allocation.py)."""
+
+    def setUp(self):
+        _, self.centro, self.products, _ = create_store(2, products=2)
+        self.norte = Branch.objects.create(name='Norte', address='Calle 2', phone='2', company='Tienda')
+        for product in self.products:
+            Inventory.objects.create(branch=self.norte, product=product, stock=5)
+        self.customer = User.objects.create_user('cliente', password='x', role='cliente')
+
+    def place(self, quantities, strategy):
+        return place_order(
+            [(product.id, quantity) for product, quantity in zip(self.products, quantities)],
+            strategy=strategy, user=self.customer, customer_name='Cliente', customer_email='c@example.com',
+        )
+
+    def picks(self, order):
+        return sorted(order.items.values_list('product_id', 'branch_id', 'quantity'))
+
+    def stock(self, branch, product):
+        return Inventory.objects.get(branch=branch, product=product).stock
+
+    def test_first_available_walks_branches_by_id(self):
+        order = self.place([3], get_strategy('first_available'))
+        product = self.products[0].id
+        self.assertEqual(self.picks(order), [(product, self.centro.id, 2), (product, self.norte.id, 1)])
+        self.assertEqual((self.stock(self.centro, product), self.stock(self.norte, product)), (0, 4))
+
+    def test_preferred_branch_goes_first(self):
+        order = self.place([3], get_strategy('preferred_branch', branch_ids=[self.norte.id]))
+        self.assertEqual(self.picks(order), [(self.products[0].id, self.norte.id, 3)])
+
+    def test_fewest_splits_ships_from_a_single_branch(self):
+        order = self.place([3, 3], get_strategy('fewest_splits'))
+        self.assertEqual({branch for _, branch, _ in self.picks(order)}, {self.norte.id})
+        self.assertEqual(order.total, 6000)
+        self.assertEqual(InventoryMovement.objects.filter(kind='order', reference=order.id).count(), 2)
+
+    def test_shortage_rejects_whole_order(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            self.place([1, 8], get_strategy('first_available'))
+        self.assertEqual([(failure['line'], failure['available']) for failure in raised.exception.failures], [(1, 7)])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Inventory.objects.aggregate(total=Sum('stock'))['total'], 14)
+
+    def test_reservations_of_other_carts_are_not_available(self):
+        other = User.objects.create_user('otro', password='x', role='cliente')
+        reserve(other, self.products[0], 6)
+        with self.assertRaises(InsufficientStock) as raised:
+            self.place([2], get_strategy('fewest_splits'))
+        self.assertEqual(raised.exception.failures[0]['available'], 1)
+
+        reserve(self.customer, self.products[0], 1)
+        self.place([1], get_strategy('fewest_splits'))
+        self.assertFalse(StockReservation.objects.filter(user=self.customer).exists())
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            get_strategy('nearest')
+
+
+class ReservationTests(TestCase):
+    """Reservas de stock de los carritos (core/reservations.py y /api/cart/)."""
+
+    def setUp(self):
+        _, self.branch, self.products, _ = create_store(5)
+        self.product = self.products[0]
+        self.first = User.objects.create_user('cliente-1', password='x', role='cliente')
+        self.second = User.objects.create_user('cliente-2', password='x', role='cliente')
+
+    def add(self, user, quantity):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post('/api/cart/add/', {'product_id': self.product.id, 'quantity': quantity}, format='json')
+
+    def test_cart_holds_stock_until_removed(self):
+        self.assertEqual(self.add(self.first, 3).status_code, 201)
+        self.assertEqual(self.add(self.first, 1).status_code, 200)
+        self.assertEqual(StockReservation.objects.get(user=self.first).quantity, 4)
+
+        response = self.add(self.second, 2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['available'], 1)
+        self.assertEqual(available_to_sell([self.product.id]), {self.product.id: 1})
+
+        client = APIClient()
+        client.force_authenticate(self.first)
+        client.post('/api/cart/remove/', {'product_id': self.product.id}, format='json')
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.add(self.second, 2).status_code, 201)
+
+    def test_expired_reservations_stop_counting_and_are_swept(self):
+        reserve(self.first, self.product, 5)
+        with self.assertRaises(InsufficientStock):
+            reserve(self.second, self.product, 1)
+
+        later = timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL + 1)
+        self.assertEqual(held_quantities([self.product.id], now=later), {})
+        self.assertEqual(sweep_expired(now=timezone.now()), 0)
+        self.assertEqual(sweep_expired(batch_size=1, now=later), 1)
+        reserve(self.second, self.product, 5)
+
+    def test_release_only_listed_products(self):
+        other = Product.objects.create(sku='SKU-X', name='Otro', price=1, cost=1, category='general',
+                                       tenant=self.product.tenant)
+        Inventory.objects.create(branch=self.branch, product=other, stock=1)
+        reserve(self.first, self.product, 1)
+        reserve(self.first, other, 1)
+        self.assertEqual(release(self.first, [other.id]), 1)
+        self.assertEqual(list(StockReservation.objects.values_list('product_id', flat=True)), [self.product.id])
+
+
+class LedgerTests(TestCase):
+    """Stock a una fecha desde el libro de movimientos y sus checkpoints (core/ledger.py)."""
+
+    def setUp(self):
+        _, self.branch, self.products, _ = create_store(5, products=2)
+        self.t0 = timezone.now() - timedelta(days=3)
+        self.t1, self.t2 = self.t0 + timedelta(days=1), self.t0 + timedelta(days=2)
+        self.assertEqual(record_opening_balances(), 2)
+        self.assertEqual(record_opening_balances(), 0)
+        InventoryMovement.objects.update(created_at=self.t0)
+
+    def move(self, product, quantity, when):
+        movement, = record_movements('sale', [(self.branch.id, product.id, quantity)])
+        InventoryMovement.objects.filter(id=movement.id).update(created_at=when)
+
+    def test_stock_at_replays_movements(self):
+        first, second = (product.id for product in self.products)
+        self.move(self.products[0], -2, self.t1)
+        self.move(self.products[1], -5, self.t2)
+        self.assertEqual(stock_at(self.branch.id, self.t0 - timedelta(seconds=1)), {})
+        self.assertEqual(stock_at(self.branch.id, self.t0), {first: 5, second: 5})
+        self.assertEqual(stock_at(self.branch.id, self.t1), {first: 3, second: 5})
+        self.assertEqual(stock_at(self.branch.id, self.t2, product_ids=[first]), {first: 3})
+        self.assertEqual(stock_at(self.branch.id, self.t2), {first: 3})
+
+    def test_snapshots_are_checkpoints(self):
+        first, second = (product.id for product in self.products)
+        self.move(self.products[0], -2, self.t1)
+        self.assertEqual(take_snapshots(at=self.t1), {self.branch.id: 2})
+        self.assertEqual(take_snapshots(at=self.t1), {})
+        self.assertEqual(take_snapshots(at=self.t2), {})
+
+        # Desde el checkpoint sólo se suman los movimientos posteriores
+        InventoryMovement.objects.filter(created_at__lte=self.t1).delete()
+        self.move(self.products[1], -1, self.t2)
+        self.assertEqual(stock_at(self.branch.id, self.t2), {first: 3, second: 4})
+        self.assertEqual(take_snapshots(at=self.t2), {self.branch.id: 2})
+        self.assertEqual(prune_snapshots(self.t2), 2)
+        self.assertEqual(latest_snapshot(self.branch.id, self.t2), self.t2)
+
+
+class ConditionalGetTests(TestCase):
+    """ETag / If-None-Match de los listados (core/conditional.py)."""
+
+    def setUp(self):
+        clear_plan_cache()
+        _, self.branch, self.products, seller = create_store(5)
+        self.other = Branch.objects.create(name='Norte', address='Calle 2', phone='2', company='Tienda')
+        with self.captureOnCommitCallbacks(execute=True):
+            Inventory.objects.create(branch=self.other, product=self.products[0], stock=5)
+        self.client = APIClient()
+        self.client.force_authenticate(seller)
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, **headers)
+
+    def test_not_modified_until_a_write(self):
+        first = self.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        with self.assertNumQueries(1):
+            unchanged = self.get('/api/products/', etag.removeprefix('W/'))
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged['ETag'], etag)
+        self.assertNotEqual(self.get('/api/products/?page=2', etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        changed = self.get('/api/products/', etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_branch_filter_ignores_other_branches(self):
+        url = f'/api/inventory/?branch={self.branch.id}'
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_stock([(self.other.id, self.products[0].id, 1)])
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_stock([(self.branch.id, self.products[0].id, 1)])
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+
+class KeysetPaginationTests(TestCase):
+    """Paginación por cursor de los listados (core/pagination.py)."""
+
+    def setUp(self):
+        clear_plan_cache()
+        _, self.branch, self.products, seller = create_store(50, products=5)
+        self.client = APIClient()
+        self.client.force_authenticate(seller)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_walks_every_row_once(self):
+        ids = [product.id for product in self.products]
+        self.assertEqual(self.walk('/api/products/?page_size=2'), [ids[0:2], ids[2:4], ids[4:]])
+        self.assertEqual(self.walk('/api/products/?page_size=0'), [ids])
+
+    def test_newest_first_with_id_tiebreak(self):
+        for _ in range(5):
+            self.client.post('/api/sales/', {
+                'branch': self.branch.id, 'payment_method': 'cash',
+                'items': [{'product': self.products[0].id, 'quantity': 1}],
+            }, format='json')
+        sales = list(Sale.objects.order_by('id').values_list('id', flat=True))
+        Sale.objects.filter(id__in=sales[1:4]).update(created_at=Sale.objects.get(id=sales[1]).created_at)
+        newest_first = [sales[4], sales[3], sales[2], sales[1], sales[0]]
+        pages = self.walk('/api/sales/?page_size=2')
+        self.assertEqual([sale for page in pages for sale in page], newest_first)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/products/?cursor=bm9wZQ').status_code, 404)
+
+
+class ProductImportTests(TestCase):
+    """Importación masiva del catálogo con upsert por SKU (core/product_import.py)."""
+
+    def setUp(self):
+        self.tenant, self.branch, self.products, _ = create_store(5, products=2)
+        self.other, _, self.foreign, _ = create_store(5, company='Otra', sku_prefix='OTRA')
+
+    def run_import(self, csv_text, **options):
+        return import_products(read_rows(io.BytesIO(csv_text.encode()), 'catalogo.csv'), self.tenant.id, **options)
+
+    def test_upsert_counts_and_values(self):
+        report = self.run_import(
+            'sku;name;price;category\n'
+            'SKU-0;Renombrado;$1.990;bebidas\n'
+            'NUEVO-1;Nuevo;500;general\n'
+            '\n'
+            'NUEVO-2;Sin precio;;general\n'
+            'NUEVO-1;Nuevo bis;600;general\n'
+        )
+        self.assertEqual((report['rows'], report['created'], report['updated'], report['error_count']), (4, 1, 1, 2))
+        self.assertEqual([(error['row'], error['sku']) for error in report['errors']], [(5, 'NUEVO-2'), (3, 'NUEVO-1')])
+        self.assertEqual(Product.objects.values_list('name', 'price').get(sku='SKU-0'), ('Renombrado', 1990))
+        created = Product.objects.get(sku='NUEVO-1')
+        self.assertEqual((created.tenant_id, created.price), (self.tenant.id, 600))
+        self.assertEqual(list(Inventory.objects.filter(product=created).values_list('branch_id', 'stock')),
+                         [(self.branch.id, 0)])
+        self.assertEqual(Inventory.objects.get(product=self.products[0]).stock, 5)
+
+    def test_dry_run_writes_nothing(self):
+        report = self.run_import('sku,name,price\nSKU-0,Renombrado,10\nNUEVO-1,Nuevo,10\n', dry_run=True)
+        self.assertEqual((report['created'], report['updated']), (1, 1))
+        self.assertFalse(Product.objects.filter(sku='NUEVO-1').exists())
+        self.assertEqual(Product.objects.get(sku='SKU-0').name, 'Producto 0')
+
+    def test_sku_of_another_tenant_is_rejected(self):
+        report = self.run_import('sku,name,price\nOTRA-0,Robado,1\nNUEVO-1,Nuevo,10\n')
+        self.assertEqual((report['created'], report['updated'], report['error_count']), (1, 0, 1))
+        self.assertEqual(report['errors'][0]['sku'], 'OTRA-0')
+        self.assertEqual(Product.objects.get(sku='OTRA-0').name, 'Producto 0')
+
+    def test_sku_inserted_concurrently_by_another_tenant_is_not_overwritten(self):
+        check = product_import._Importer._reject_foreign
+
+        def racing_check(importer, products, owners):
+            # Otra empresa inserta el SKU nuevo justo después de la verificación inicial
+            if not Product.objects.filter(sku='NUEVO-1').exists():
+                Product.objects.create(sku='NUEVO-1', name='De la otra', price=1, cost=1, category='general',
+                                       tenant=self.other)
+            return check(importer, products, owners)
+
+        with mock.patch.object(product_import._Importer, '_reject_foreign', racing_check):
+            report = self.run_import('sku,name,price\nNUEVO-1,Nuevo,10\nNUEVO-2,Otro,10\n')
+        self.assertEqual((report['created'], report['updated'], report['error_count']), (1, 0, 1))
+        self.assertEqual(report['errors'][0]['sku'], 'NUEVO-1')
+        raced = Product.objects.get(sku='NUEVO-1')
+        self.assertEqual((raced.tenant_id, raced.name), (self.other.id, 'De la otra'))
+        self.assertFalse(Inventory.objects.filter(product=raced).exists())
+        self.assertEqual(Product.objects.get(sku='NUEVO-2').tenant_id, self.tenant.id)
+
+
+class ProductSearchTests(TestCase):
+    """Búsqueda de productos (core/search.py) vía /api/products/search/."""
+
+    def setUp(self):
+        clear_plan_cache()
+        _, _, self.products, seller = create_store(5, products=3, sku_prefix='780')
+        create_store(5, company='Otra', sku_prefix='OTRA')
+        self.client = APIClient()
+        self.client.force_authenticate(seller)
+
+    def search(self, query):
+        response = self.client.get('/api/products/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['sku'] for row in response.data['results']]
+
+    def test_matches_words_and_sku_prefix_within_tenant(self):
+        self.assertEqual(self.search('producto 1'), ['780-1'])
+        self.assertEqual(self.search('Prod'), ['780-0', '780-1', '780-2'])
+        self.assertEqual(self.search('780-2'), ['780-2'])
+
+    def test_quotes_only_query_returns_nothing(self):
+        self.assertEqual(self.search('"'), [])
+        self.assertEqual(self.search('" ""'), [])
+
+
+class ExportScopeTests(TestCase):
+    """Las exportaciones en streaming sólo incluyen filas de la empresa del usuario."""
+
+    def setUp(self):
+        clear_plan_cache()
+        _, self.branch, products, seller = create_store(5)
+        _, self.foreign_branch, foreign_products, foreign_seller = create_store(5, company='Otra', sku_prefix='OTRA')
+        for branch, product, user in ((self.branch, products[0], seller),
+                                      (self.foreign_branch, foreign_products[0], foreign_seller)):
+            sale = Sale.objects.create(branch=branch, user=user, total=1000, payment_method='cash')
+            SaleItem.objects.create(sale=sale, product=product, quantity=1, price=1000)
+        place_order([(products[0].id, 1), (foreign_products[0].id, 1)],
+                    customer_name='Cliente', customer_email='c@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user('gerente', password='x', role='gerente', company='Tienda'))
+
+    def export(self, url, **params):
+        response = self.client.get(url, {'output': 'ndjson', **params})
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_rows_of_other_tenants_are_excluded(self):
+        self.assertEqual([row['sku'] for row in self.export('/api/inventory/export/')], ['SKU-0'])
+        self.assertEqual([row['sku'] for row in self.export('/api/sales/export/')], ['SKU-0'])
+        self.assertEqual([row['sku'] for row in self.export('/api/orders/export/')], ['SKU-0'])
+
+    def test_branch_of_another_tenant_is_rejected(self):
+        for url in ('/api/inventory/export/', '/api/sales/export/'):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'branch': self.foreign_branch.id})
+                self.assertEqual(response.status_code, 400)
+        rows = self.export('/api/sales/export/', branch=self.branch.id)
+        self.assertEqual([row['branch_id'] for row in rows], [self.branch.id])
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    """El latido de un trabajo (core/jobs.py Heartbeat) no depende de que informe avance."""
+
+    def test_heartbeat_keeps_silent_job_from_being_requeued(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        job = Job.objects.create(kind='dashboard', status='running', worker='w/0', heartbeat_at=long_ago)
+        with Heartbeat(job, interval=0.01):
+            time.sleep(0.2)  # el trabajo no llama a Progress
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, long_ago + timedelta(minutes=59))
+        self.assertEqual(requeue_stale(stale_after=60), 0)
+
+        Job.objects.filter(id=job.id).update(heartbeat_at=long_ago)
+        self.assertEqual(requeue_stale(stale_after=60), 1)
+        self.assertEqual(Job.objects.get(id=job.id).status, 'queued')
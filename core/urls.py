@@ -3,8 +3,9 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     ProductViewSet, BranchViewSet, SupplierViewSet, 
     InventoryViewSet, SaleViewSet, OrderViewSet, ReportViewSet,
-    SubscriptionViewSet, CartViewSet,
+    SubscriptionViewSet, CartViewSet, PosViewSet, JobViewSet,
 )
+from .async_views import dashboard_async, sales_report_async, stock_report_async, suppliers_report_async
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet)
@@ -15,9 +16,16 @@ router.register(r'sales', SaleViewSet)
 router.register(r'orders', OrderViewSet)
 router.register(r'subscriptions', SubscriptionViewSet)
 router.register(r'cart', CartViewSet, basename='cart')
+router.register(r'pos', PosViewSet, basename='pos')
 router.register(r'reports', ReportViewSet, basename='reports')
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    # Reportes async (ASGI): secciones en paralelo, ver core/async_views.py
+    path('async/reports/stock/', stock_report_async, name='async-reports-stock'),
+    path('async/reports/sales/', sales_report_async, name='async-reports-sales'),
+    path('async/reports/suppliers/', suppliers_report_async, name='async-reports-suppliers'),
+    path('async/reports/dashboard/', dashboard_async, name='async-reports-dashboard'),
 ]
 
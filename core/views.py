@@ -1,12 +1,15 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate, TruncMonth
-from django.utils.dateparse import parse_date
+from rest_framework.reverse import reverse
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django_filters.rest_framework import DjangoFilterBackend
+import csv
 import json
+from datetime import timedelta
 
 # Imports para Vistas Web (HTML)
 from django.shortcuts import render, redirect, get_object_or_404
@@ -14,15 +17,39 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 
-from .models import Product, Branch, Supplier, Inventory, Sale, Order, User, OrderItem, SaleItem, Subscription, Purchase, PurchaseItem, CartItem
+from .models import Product, Branch, Supplier, Inventory, InventoryMovement, ReorderAlert, DemandForecast, Sale, Order, User, OrderItem, SaleItem, Subscription, Purchase, PurchaseItem, CartItem, Tenant, Job, normalize_company
 from .serializers import (
     ProductSerializer, BranchSerializer, SupplierSerializer,
-    InventorySerializer, SaleSerializer, OrderSerializer, CartItemSerializer
+    InventorySerializer, SaleSerializer, OrderSerializer, CartItemSerializer,
+    SaleBatchEntrySerializer, SaleBatchItemSerializer, InventoryMovementSerializer, ReorderAlertSerializer,
+    DemandForecastSerializer, JobSerializer
 )
 from .permissions import IsAdminCliente, IsGerente, IsVendedor, HasAPIAccess
+from .allocation import get_strategy, place_order
+from .catalog import catalog_changes
+from .conditional import BRANCHES, INVENTORY, PRODUCTS, ConditionalGetMixin
+from .cycle_count import CountError, apply_count, parse_count_entries, parse_scanner_file
+from .dates import date_range_q, day_start, parse_date_range
+from .pagination import CreatedAtKeysetPagination, KeysetPagination
+from .sales import MAX_BATCH_SIZE, commit_sale_batch
+from .ledger import latest_snapshot, record_stock_change, stock_at
+from .stock import InsufficientStock, branch_stock_summary, transfer_stock
+from .exports import EXPORT_FORMATS, export_response
+from .instrumentation import query_budget
+from .jobs import JOB_RESULTS_DIR, REPORT_JOB_KINDS, JobError, enqueue, result_path, upload_path
+from .plans import get_tenant_plan
+from .product_import import ImportFormatError, import_products, read_rows
+from .product_cache import cached_product_list
+from .reservations import available_to_sell, live_reservations, release, reserve
+from .reports import (
+    build_dashboard, build_sales_report, dashboard_filters, dashboard_sections, run_sections,
+    sales_filters, sales_filters_echo, sales_sections, stock_detail_rows, stock_summaries,
+    stream_stock_detail, supplier_report,
+)
+from .search import search_products
 
 # ==========================================
 # LÍMITES POR PLAN DE SUSCRIPCIÓN
@@ -55,13 +82,10 @@ PLAN_FEATURES = {
 }
 
 def get_user_plan(user):
-    """Obtiene el plan activo de la empresa del usuario"""
-    if not user.is_authenticated or not user.company:
+    """Obtiene el plan activo de la empresa del usuario (desde el caché de planes)"""
+    if not user.is_authenticated:
         return None
-    subscription = Subscription.objects.filter(company=user.company, active=True).first()
-    if subscription:
-        return subscription.plan_name.lower()
-    return None
+    return get_tenant_plan(user.tenant_id)
 
 def check_plan_feature(user, feature):
     """Verifica si el usuario tiene acceso a una característica según su plan"""
@@ -77,38 +101,113 @@ def get_plan_limit(user, limit_name):
         return 0
     return PLAN_FEATURES[plan].get(limit_name, 0)
 
+def get_export_output(request):
+    """Formato pedido para una exportación (?output=csv|ndjson); None si no es válido"""
+    output = request.query_params.get('output', 'csv')
+    return output if output in EXPORT_FORMATS else None
+
+def get_user_branch(user, value):
+    """Sucursal `value` si pertenece a la empresa del usuario (cualquiera para super_admin); None si no."""
+    branches = Branch.objects.all()
+    if not (user.is_superuser or user.role == 'super_admin'):
+        branches = branches.for_tenant(user.tenant_id)
+    value = str(value or '')
+    return branches.filter(id=value).first() if value.isdigit() else None
+
 # ==========================================
 #              LÓGICA API (REST)
 # ==========================================
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    etag_tables = (PRODUCTS,)
+    query_budget = {'list': 5, 'retrieve': 5, 'search': 5}
     
     def get_permissions(self):
         # super_admin puede hacer todo
         if self.request.user.is_superuser or self.request.user.role == 'super_admin':
             return [permissions.IsAuthenticated()]
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'import_catalog']:
             return [IsGerente()]
         return [permissions.IsAuthenticated()]
 
-class BranchViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.user.tenant)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """GET /api/products/search/?q=&limit= — Búsqueda por nombre, SKU, categoría y descripción"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q es requerido"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"error": "limit debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Igual que en las vistas web: super_admin y superusuarios buscan en todo el catálogo
+        user = request.user
+        products = search_products(
+            query,
+            tenant_id=user.tenant_id,
+            all_tenants=user.is_superuser or user.role == 'super_admin',
+            limit=limit,
+        )
+        results = ProductSerializer(products, many=True).data
+        for product, data in zip(products, results):
+            data['rank'] = product.rank
+        return Response({"query": query, "count": len(results), "results": results})
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_catalog(self, request):
+        """
+        POST /api/products/import/ — Carga masiva del catálogo (multipart, campo `file`, CSV o XLSX)
+        Crea o actualiza por SKU; ?dry_run=1 sólo valida. Responde el detalle de errores por fila.
+        Con ?background=1 el archivo se procesa en un trabajo (ver /api/jobs/) y se responde 202.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "file es requerido"}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        if request.query_params.get('background') in ('1', 'true'):
+            relative = upload_path(upload.name)
+            (JOB_RESULTS_DIR / relative).parent.mkdir(parents=True, exist_ok=True)
+            with open(JOB_RESULTS_DIR / relative, 'wb') as destination:
+                for chunk in upload.chunks():
+                    destination.write(chunk)
+            job = enqueue('product_import', {
+                'upload': str(relative), 'filename': upload.name, 'dry_run': dry_run,
+            }, user=request.user)
+            return job_accepted(job, request)
+        try:
+            report = import_products(
+                read_rows(upload.file, upload.name),
+                request.user.tenant_id,
+                dry_run=dry_run,
+            )
+        except (ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+            return Response({"error": f"No se pudo leer el archivo: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+class BranchViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Branch.objects.all()
     serializer_class = BranchSerializer
+    etag_tables = (BRANCHES,)
+    query_budget = {'list': 6, 'retrieve': 6}
     
     def get_permissions(self):
         # super_admin tiene acceso total
         if self.request.user and (self.request.user.is_superuser or self.request.user.role == 'super_admin'):
             return [permissions.IsAuthenticated()]
-        return [IsAdminCliente, HasAPIAccess]
+        return [IsAdminCliente(), HasAPIAccess()]
     
     def create(self, request, *args, **kwargs):
         """Validar límite de sucursales según plan antes de crear"""
         # super_admin no tiene límite
         if not request.user.is_superuser and request.user.role != 'super_admin':
             max_branches = get_plan_limit(request.user, 'max_branches')
-            current_branches = Branch.objects.count()
+            current_branches = Branch.objects.for_tenant(request.user.tenant_id).count()
             
             if current_branches >= max_branches:
                 return Response(
@@ -118,48 +217,375 @@ class BranchViewSet(viewsets.ModelViewSet):
         
         return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        # La sucursal queda asociada a la empresa de quien la crea (la FK se sincroniza por señal)
+        if self.request.user.company and not serializer.validated_data.get('company'):
+            serializer.save(company=self.request.user.company)
+        else:
+            serializer.save()
+
 class SupplierViewSet(viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
+    query_budget = {'list': 5, 'retrieve': 5}
     
     def get_permissions(self):
         # super_admin tiene acceso total
         if self.request.user and (self.request.user.is_superuser or self.request.user.role == 'super_admin'):
             return [permissions.IsAuthenticated()]
-        return [IsGerente]
+        return [IsGerente()]
 
-class InventoryViewSet(viewsets.ModelViewSet):
-    queryset = Inventory.objects.all()
+class InventoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Inventory.objects.select_related('product', 'branch')
     serializer_class = InventorySerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['branch']
+    # Cada fila muestra el nombre del producto y de la sucursal
+    etag_tables = (INVENTORY, PRODUCTS, BRANCHES)
+    query_budget = {'list': 6, 'retrieve': 5}
+
+    def etag_selectors(self, request):
+        selectors = super().etag_selectors(request)
+        branch = request.query_params.get('branch', '')
+        if branch.isdigit():
+            # ?branch=: sólo las ventas de esa sucursal cambian el ETag
+            selectors[0] = (INVENTORY, int(branch))
+        return selectors
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?low_stock=1: sólo productos en o bajo su punto de reorden (índice parcial)
+        if self.request.query_params.get('low_stock') in ('1', 'true'):
+            queryset = queryset.filter(stock__lte=F('reorder_point'))
+        return queryset
 
     def get_permissions(self):
         # super_admin tiene acceso total
         if self.request.user and (self.request.user.is_superuser or self.request.user.role == 'super_admin'):
             return [permissions.IsAuthenticated()]
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'export', 'bulk_adjust',
+                           'transfer', 'movements', 'at']:
             return [IsGerente()]
         return [IsVendedor()]
 
+    # Los cambios manuales de stock quedan como ajustes en el libro de inventario
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            record_stock_change(None, serializer.save(), user=self.request.user)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            before = (
+                Inventory.objects.select_for_update().filter(pk=serializer.instance.pk)
+                .values_list('branch_id', 'product_id', 'stock').get()
+            )
+            record_stock_change(before, serializer.save(), user=self.request.user)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            before = (
+                Inventory.objects.select_for_update().filter(pk=instance.pk)
+                .values_list('branch_id', 'product_id', 'stock').get()
+            )
+            instance.delete()
+            record_stock_change(before, None, user=self.request.user)
+
+    def _user_branch(self, value):
+        return get_user_branch(self.request.user, value)
+
+    @action(detail=False, methods=['post'])
+    def bulk_adjust(self, request):
+        """
+        POST /api/inventory/bulk_adjust/ — Conteo físico de una sucursal
+        JSON: {"branch", "counts": [{"sku" | "product", "counted"}], "zero_missing", "dry_run"}
+        o multipart con `branch` y `file` (archivo del lector de códigos: sku[;cantidad] por línea).
+        Fija el stock contado en una transacción y responde el reporte de diferencias.
+        """
+        branch = self._user_branch(request.data.get('branch'))
+        if branch is None:
+            return Response({"error": "branch es requerido y debe ser una sucursal de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = request.FILES.get('file')
+        counts = request.data.get('counts')
+        if upload is None and not isinstance(counts, list):
+            return Response({"error": "Se requiere 'counts' como lista o un archivo 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        flags = {
+            flag: str(request.data.get(flag, request.query_params.get(flag, ''))).lower() in ('1', 'true')
+            for flag in ('zero_missing', 'dry_run')
+        }
+        try:
+            lines = parse_scanner_file(upload.file) if upload is not None else parse_count_entries(counts)
+            report = apply_count(branch, lines, user=request.user, **flags)
+        except CountError as exc:
+            return Response(
+                {"error": str(exc), "errors": exc.errors},
+                status=status.HTTP_409_CONFLICT if exc.retryable else status.HTTP_400_BAD_REQUEST,
+            )
+        except (UnicodeDecodeError, csv.Error) as exc:
+            return Response({"error": f"No se pudo leer el archivo: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+        report['summary']['dry_run'] = flags['dry_run']
+        return Response(report)
+
+    @action(detail=False, methods=['post'])
+    def transfer(self, request):
+        """
+        POST /api/inventory/transfer/ — Traslado de stock entre sucursales de la empresa
+        {"from_branch", "to_branch", "items": [{"product", "quantity"}]}
+        """
+        source = self._user_branch(request.data.get('from_branch'))
+        target = self._user_branch(request.data.get('to_branch'))
+        if source is None or target is None or source.tenant_id != target.tenant_id:
+            return Response({"error": "from_branch y to_branch deben ser sucursales de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+        if source.id == target.id:
+            return Response({"error": "Las sucursales de origen y destino deben ser distintas"}, status=status.HTTP_400_BAD_REQUEST)
+        items = request.data.get('items')
+        serializer = SaleBatchItemSerializer(data=items if isinstance(items, list) else None, many=True)
+        if not serializer.is_valid() or not serializer.validated_data:
+            return Response({"error": "Se requiere 'items' como lista de {product, quantity}", "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        lines = [(item['product'], item['quantity']) for item in serializer.validated_data]
+        known = set(Product.objects.for_tenant(source.tenant_id).filter(id__in=[p for p, _ in lines]).values_list('id', flat=True))
+        unknown = sorted({product_id for product_id, _ in lines} - known)
+        if unknown:
+            return Response({"error": f"Productos inexistentes: {unknown}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            transfer_stock(source.id, target.id, lines, user=request.user)
+        except InsufficientStock as exc:
+            return Response({"error": str(exc), "errors": exc.failures}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            "from_branch": source.id, "to_branch": target.id,
+            "products": len({product_id for product_id, _ in lines}),
+            "units": sum(quantity for _, quantity in lines),
+        })
+
+    @action(detail=False, methods=['get'])
+    def movements(self, request):
+        """
+        GET /api/inventory/movements/?branch=&product=&kind=&date_from=&date_to= — Libro de
+        movimientos de stock de una sucursal, más recientes primero (paginado por cursor)
+        """
+        branch = self._user_branch(request.query_params.get('branch'))
+        if branch is None:
+            return Response({"error": "branch es requerido y debe ser una sucursal de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+        date_from, date_to, error = parse_date_range(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        movements = (
+            InventoryMovement.objects.filter(branch=branch)
+            .filter(date_range_q('created_at', date_from, date_to))
+            .select_related('product', 'user')
+        )
+        product_id = request.query_params.get('product', '')
+        if product_id.isdigit():
+            movements = movements.filter(product_id=product_id)
+        kind = request.query_params.get('kind')
+        if kind:
+            movements = movements.filter(kind=kind)
+        paginator = CreatedAtKeysetPagination()
+        page = paginator.paginate_queryset(movements, request, view=self)
+        return paginator.get_paginated_response(InventoryMovementSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def at(self, request):
+        """
+        GET /api/inventory/at/?branch=&at=AAAA-MM-DD|fecha ISO — Stock de la sucursal en una
+        fecha (al cierre del día si se indica sólo la fecha), desde el libro de movimientos
+        """
+        branch = self._user_branch(request.query_params.get('branch'))
+        if branch is None:
+            return Response({"error": "branch es requerido y debe ser una sucursal de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+        value = request.query_params.get('at', '')
+        try:
+            day = parse_date(value)
+            when = day_start(day + timedelta(days=1)) - timedelta(microseconds=1) if day else parse_datetime(value)
+        except ValueError:
+            when = None
+        if not when:
+            return Response({"error": "at es requerido: AAAA-MM-DD o fecha y hora ISO 8601"}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        balances = stock_at(branch.id, when)
+        products = Product.objects.filter(id__in=list(balances)).order_by('sku').values_list('id', 'sku', 'name')
+        return Response({
+            "branch": branch.id,
+            "at": when,
+            "checkpoint": latest_snapshot(branch.id, when),
+            "items": [
+                {"product": product_id, "sku": sku, "name": name, "stock": balances[product_id]}
+                for product_id, sku, name in products
+            ],
+        })
+
+    @action(detail=False, methods=['get'])
+    def alerts(self, request):
+        """
+        GET /api/inventory/alerts/?branch=&status=out|below|cover — Alertas de reposición
+        (manage.py compute_reorder_alerts), más urgentes primero (paginado por cursor)
+        """
+        alerts = ReorderAlert.objects.select_related('product', 'branch')
+        user = request.user
+        if not (user.is_superuser or user.role == 'super_admin'):
+            alerts = alerts.for_tenant(user.tenant_id)
+        branch_id = request.query_params.get('branch')
+        if branch_id:
+            branch = self._user_branch(branch_id)
+            if branch is None:
+                return Response({"error": "branch debe ser una sucursal de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+            alerts = alerts.filter(branch=branch)
+        alert_status = request.query_params.get('status')
+        if alert_status:
+            if alert_status not in dict(ReorderAlert.STATUS_CHOICES):
+                return Response({"error": "status debe ser out, below o cover"}, status=status.HTTP_400_BAD_REQUEST)
+            alerts = alerts.filter(status=alert_status)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(alerts, request, view=self)
+        return paginator.get_paginated_response(ReorderAlertSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        """
+        GET /api/inventory/forecast/?branch=&product= — Pronóstico de demanda diaria por producto
+        y sucursal (manage.py refresh_forecasts), paginado por cursor
+        """
+        forecasts = DemandForecast.objects.select_related('product')
+        user = request.user
+        if not (user.is_superuser or user.role == 'super_admin'):
+            forecasts = forecasts.for_tenant(user.tenant_id)
+        branch_id = request.query_params.get('branch')
+        if branch_id:
+            branch = self._user_branch(branch_id)
+            if branch is None:
+                return Response({"error": "branch debe ser una sucursal de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+            forecasts = forecasts.filter(branch=branch)
+        product_id = request.query_params.get('product', '')
+        if product_id:
+            if not product_id.isdigit():
+                return Response({"error": "product debe ser un id"}, status=status.HTTP_400_BAD_REQUEST)
+            forecasts = forecasts.filter(product_id=product_id)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(forecasts, request, view=self)
+        return paginator.get_paginated_response(DemandForecastSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """GET /api/inventory/export/?output=csv|ndjson&branch= — Exporta inventario en streaming"""
+        output = get_export_output(request)
+        if not output:
+            return Response({"error": "output debe ser csv o ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        inventory = Inventory.objects.order_by('branch_id', 'product_id')
+        user = request.user
+        if not (user.is_superuser or user.role == 'super_admin'):
+            inventory = inventory.for_tenant(user.tenant_id)
+        branch_id = request.query_params.get('branch')
+        if branch_id:
+            branch = self._user_branch(branch_id)
+            if branch is None:
+                return Response({"error": "branch debe ser una sucursal de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+            inventory = inventory.filter(branch=branch)
+        header = ['branch_id', 'branch', 'sku', 'product', 'stock', 'reorder_point', 'price', 'value']
+        rows = inventory.values_list(
+            'branch_id', 'branch__name', 'product__sku', 'product__name',
+            'stock', 'reorder_point', 'product__price', F('stock') * F('product__price'),
+        )
+        return export_response('inventario', header, rows, output)
+
 class SaleViewSet(viewsets.ModelViewSet):
-    queryset = Sale.objects.all()
+    queryset = Sale.objects.prefetch_related('items__product')
     serializer_class = SaleSerializer
+    pagination_class = CreatedAtKeysetPagination
+    query_budget = {'list': 6, 'retrieve': 6}
     http_method_names = ['get', 'post', 'head']
 
     def get_permissions(self):
         # super_admin tiene acceso total
         if self.request.user and (self.request.user.is_superuser or self.request.user.role == 'super_admin'):
             return [permissions.IsAuthenticated()]
+        if self.action == 'export':
+            return [IsGerente()]
         return [IsVendedor()]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """GET /api/sales/export/?output=csv|ndjson&branch=&date_from=&date_to= — Exporta líneas de venta en streaming"""
+        output = get_export_output(request)
+        if not output:
+            return Response({"error": "output debe ser csv o ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+        date_from, date_to, error = parse_date_range(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = SaleItem.objects.order_by('sale_id', 'id')
+        user = request.user
+        if not (user.is_superuser or user.role == 'super_admin'):
+            items = items.filter(sale__branch__tenant_id=user.tenant_id)
+        branch_id = request.query_params.get('branch')
+        if branch_id:
+            branch = get_user_branch(user, branch_id)
+            if branch is None:
+                return Response({"error": "branch debe ser una sucursal de su empresa"}, status=status.HTTP_400_BAD_REQUEST)
+            items = items.filter(sale__branch=branch)
+        items = items.filter(date_range_q('sale__created_at', date_from, date_to))
+        header = [
+            'sale_id', 'created_at', 'branch_id', 'branch', 'seller', 'payment_method',
+            'sale_total', 'sku', 'product', 'quantity', 'price',
+        ]
+        rows = items.values_list(
+            'sale_id', 'sale__created_at', 'sale__branch_id', 'sale__branch__name', 'sale__user__username',
+            'sale__payment_method', 'sale__total', 'product__sku', 'product__name', 'quantity', 'price',
+        )
+        return export_response('ventas', header, rows, output)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """POST /api/sales/batch/ — Sincroniza en bloque las ventas encoladas offline por el POS"""
+        entries = request.data.get('sales') if isinstance(request.data, dict) else None
+        if not isinstance(entries, list) or not entries:
+            return Response(
+                {"error": "Se requiere 'sales' como lista de ventas"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(entries) > MAX_BATCH_SIZE:
+            return Response(
+                {"error": f"Máximo {MAX_BATCH_SIZE} ventas por lote"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Validación por venta: una entrada inválida no bloquea el resto del lote
+        results = [None] * len(entries)
+        valid = []
+        for index, entry in enumerate(entries):
+            serializer = SaleBatchEntrySerializer(data=entry)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                client_uuid = entry.get('client_uuid') if isinstance(entry, dict) else None
+                results[index] = {"client_uuid": client_uuid, "status": "invalid", "sale": None, "errors": serializer.errors}
+
+        committed = commit_sale_batch([data for _, data in valid], request.user)
+        for (index, _), result in zip(valid, committed):
+            results[index] = result
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        return Response({"summary": summary, "results": results})
+
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
+    queryset = Order.objects.prefetch_related('items__product')
     serializer_class = OrderSerializer
+    pagination_class = CreatedAtKeysetPagination
+    query_budget = {'list': 6, 'retrieve': 6}
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status']
+
+    def get_permissions(self):
+        if self.action == 'export':
+            return [IsGerente()]
+        return super().get_permissions()
 
     def perform_create(self, serializer):
         if self.request.user.is_authenticated:
@@ -167,6 +593,33 @@ class OrderViewSet(viewsets.ModelViewSet):
         else:
             serializer.save()
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """GET /api/orders/export/?output=csv|ndjson&date_from=&date_to= — Exporta líneas de pedido en streaming"""
+        output = get_export_output(request)
+        if not output:
+            return Response({"error": "output debe ser csv o ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+        date_from, date_to, error = parse_date_range(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Los pedidos web no están asociados a una sucursal: sólo aplican filtros de fecha.
+        # Un pedido puede incluir productos de varias empresas: cada una exporta sus líneas
+        items = OrderItem.objects.order_by('order_id', 'id')
+        user = request.user
+        if not (user.is_superuser or user.role == 'super_admin'):
+            items = items.filter(product__tenant_id=user.tenant_id)
+        items = items.filter(date_range_q('order__created_at', date_from, date_to))
+        header = [
+            'order_id', 'created_at', 'status', 'customer_name', 'customer_email',
+            'order_total', 'sku', 'product', 'quantity', 'price',
+        ]
+        rows = items.values_list(
+            'order_id', 'order__created_at', 'order__status', 'order__customer_name', 'order__customer_email',
+            'order__total', 'product__sku', 'product__name', 'quantity', 'price',
+        )
+        return export_response('pedidos', header, rows, output)
+
 class SubscriptionViewSet(viewsets.ModelViewSet):
     """API para gestionar suscripciones (solo super_admin puede crear)"""
     queryset = Subscription.objects.all()
@@ -195,139 +648,136 @@ class ReportViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['get'])
     def stock(self, request):
+        """
+        Valorización de stock por sucursal, calculada con una sola query agregada.
+        Con ?detail=1 se agrega el detalle por producto, transmitido en streaming.
+        """
         branch_id = request.query_params.get('branch')
-        branches = Branch.objects.all()
-        if branch_id:
-            branches = branches.filter(id=branch_id)
-
-        data = []
-        for branch in branches:
-            inventory = Inventory.objects.filter(branch=branch).select_related('product')
-            items = []
-            total_units = 0
-            total_value = 0
-            for inv in inventory:
-                value = inv.stock * inv.product.price
-                total_units += inv.stock
-                total_value += value
-                items.append({
-                    "product": inv.product.name,
-                    "sku": inv.product.sku,
-                    "stock": inv.stock,
-                    "value": value
-                })
-            data.append({
-                "branch_id": branch.id,
-                "branch": branch.name,
-                "total_items": len(items),
-                "total_units": total_units,
-                "total_value": total_value,
-                "inventory": items
-            })
-        return Response(data)
+        detail = request.query_params.get('detail') == '1'
+        summaries = stock_summaries(branch_id)
+        if not detail:
+            return Response(summaries)
+
+        rows = stock_detail_rows(branch_id).iterator(chunk_size=2000)
+        return StreamingHttpResponse(
+            stream_stock_detail(summaries, rows),
+            content_type='application/json'
+        )
 
     @action(detail=False, methods=['get'])
     def sales(self, request):
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        branch_id = request.query_params.get('branch')
-        granularity = request.query_params.get('granularity', 'day')  # day | month
-        
-        today = timezone.now().date()
-        
-        # Validar que las fechas no sean futuras
-        if date_from:
-            date_from_parsed = parse_date(date_from)
-            if date_from_parsed and date_from_parsed > today:
-                return Response(
-                    {"error": "La fecha 'desde' no puede ser mayor a hoy."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        if date_to:
-            date_to_parsed = parse_date(date_to)
-            if date_to_parsed and date_to_parsed > today:
-                return Response(
-                    {"error": "La fecha 'hasta' no puede ser mayor a hoy."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        sales_qs = Sale.objects.all()
-
-        if branch_id:
-            sales_qs = sales_qs.filter(branch_id=branch_id)
-        if date_from:
-            sales_qs = sales_qs.filter(created_at__date__gte=parse_date(date_from))
-        if date_to:
-            sales_qs = sales_qs.filter(created_at__date__lte=parse_date(date_to))
-        # Agrupación por día o mes
-        if granularity == 'month':
-            date_trunc = TruncMonth('created_at')
-            date_format = 'Y-m'
-        else:
-            date_trunc = TruncDate('created_at')
-            date_format = 'Y-m-d'
-
-        grouped = (
-            sales_qs
-            .annotate(period=date_trunc)
-            .values('branch_id', 'branch__name', 'period')
-            .annotate(total_amount=Sum('total'), total_transactions=Count('id'))
-            .order_by('branch_id', 'period')
-        )
-
-        # Estructura por sucursal
-        result = {}
-        for row in grouped:
-            bid = row['branch_id']
-            if bid not in result:
-                result[bid] = {
-                    "branch_id": bid,
-                    "branch": row['branch__name'],
-                    "periods": [],
-                    "total_amount": 0,
-                    "total_transactions": 0,
-                }
-            period_str = row['period'].strftime(date_format)
-            result[bid]["periods"].append({
-                "period": period_str,
-                "total_amount": row['total_amount'] or 0,
-                "total_transactions": row['total_transactions'],
-            })
-            result[bid]["total_amount"] += row['total_amount'] or 0
-            result[bid]["total_transactions"] += row['total_transactions']
-
+        """
+        Ventas por sucursal y período. Los días cerrados se leen del rollup diario
+        (SalesDailyRollup); sólo el día en curso se agrega desde la tabla Sale.
+        """
+        filters, error = sales_filters(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        results = run_sections(sales_sections(filters))
         return Response({
-            "filters": {
-                "date_from": date_from,
-                "date_to": date_to,
-                "branch": branch_id,
-                "granularity": granularity,
-            },
-            "branches": list(result.values()),
+            "filters": sales_filters_echo(request.query_params, filters),
+            "branches": build_sales_report(filters, results['closed'], results['today_totals'], results['today_units']),
         })
 
     @action(detail=False, methods=['get'])
     def suppliers(self, request):
         """Reporte simple de proveedores (sin pedidos asociados en el modelo actual)."""
-        suppliers = Supplier.objects.all()
-        data = []
-        for supplier in suppliers:
-            data.append({
-                "id": supplier.id,
-                "name": supplier.name,
-                "rut": supplier.rut,
-                "contact": supplier.contact,
-                # No hay relación producto-proveedor ni pedidos en el modelo actual
-                "products": [],
-                "last_orders": [],
-            })
-        return Response(data)
+        return Response(supplier_report())
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """
+        Panel de gerencia: stock, quiebres, ventas de los últimos 30 días,
+        proveedores y pedidos. Las secciones se calculan una tras otra; la versión
+        async (/api/async/reports/dashboard/) las lanza en paralelo.
+        """
+        filters = dashboard_filters()
+        return Response(build_dashboard(filters, run_sections(dashboard_sections(filters))))
+
+    @action(detail=False, methods=['post'], url_path=r'(?P<kind>[a-z_]+)/jobs')
+    def jobs(self, request, kind=None):
+        """
+        POST /api/reports/<sales|stock|suppliers|dashboard>/jobs/ — Encola el reporte
+        Los parámetros son los mismos del reporte (query string o cuerpo JSON).
+        Responde 202 con el trabajo; el avance y el resultado se consultan en /api/jobs/<id>/.
+        """
+        if kind not in REPORT_JOB_KINDS:
+            return Response({"error": f"Reporte desconocido: {kind}"}, status=status.HTTP_404_NOT_FOUND)
+        body = request.data if isinstance(request.data, dict) else {}
+        params = {key: str(value) for key, value in {**request.query_params.dict(), **body}.items()}
+        try:
+            job = enqueue(kind, params, user=request.user)
+        except JobError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return job_accepted(job, request)
+
+
+def job_accepted(job, request):
+    """202 con el trabajo encolado y su URL de seguimiento en Location."""
+    response = Response(JobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = reverse('job-detail', args=[job.id], request=request)
+    return response
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """GET /api/jobs/ y /api/jobs/<id>/ — Estado y avance de los trabajos en segundo plano del usuario"""
+    queryset = Job.objects.order_by('-created_at', '-id')
+    serializer_class = JobSerializer
+    pagination_class = None
+    query_budget = {'list': 4, 'retrieve': 4}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_superuser or user.role == 'super_admin':
+            return queryset
+        return queryset.filter(user=user)
+
+    def list(self, request, *args, **kwargs):
+        jobs = self.get_queryset()[:50]
+        return Response(self.get_serializer(jobs, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """GET /api/jobs/<id>/result/ — Descarga el archivo de resultado de un trabajo terminado"""
+        job = self.get_object()
+        path = result_path(job)
+        if job.status != 'done' or path is None:
+            return Response({"error": "El trabajo no ha terminado", "status": job.status}, status=status.HTTP_409_CONFLICT)
+        if not path.is_file():
+            return Response({"error": "El archivo de resultado ya no existe"}, status=status.HTTP_410_GONE)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{job.kind}-{job.id}{path.suffix}')
 
 
 # ==========================================
 #           CARRITO (API)
 # ==========================================
 
+class PosViewSet(viewsets.ViewSet):
+    """API de apoyo al punto de venta"""
+
+    permission_classes = [IsVendedor]
+    query_budget = {'catalog': 7}
+
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        """
+        GET /api/pos/catalog/?since=<versión> — Productos e inventario modificados
+        desde `since` (0 = catálogo completo). El POS guarda la `version` recibida
+        y la envía en la siguiente consulta. Los superusuarios reciben el catálogo
+        de todos los tenants; un usuario sin empresa recibe 403.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            return Response({"error": "since debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.user.is_superuser or request.user.role == 'super_admin':
+            return Response(catalog_changes(None, since))
+        if not request.user.tenant_id:
+            return Response({"error": "Su usuario no pertenece a una empresa"}, status=status.HTTP_403_FORBIDDEN)
+        return Response(catalog_changes(request.user.tenant_id, since))
+
 class CartViewSet(viewsets.ViewSet):
     """API para gestionar carrito de compras"""
     
@@ -366,24 +816,67 @@ class CartViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Obtener o crear CartItem para este usuario
-        cart_item, created = CartItem.objects.get_or_create(
-            user=request.user,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            # Si ya existe, aumentar quantity
-            cart_item.quantity += quantity
-            cart_item.save()
+        try:
+            with transaction.atomic():
+                # Obtener o crear CartItem para este usuario
+                cart_item, created = CartItem.objects.get_or_create(
+                    user=request.user,
+                    product=product,
+                    defaults={'quantity': quantity}
+                )
+
+                if not created:
+                    # Si ya existe, aumentar quantity
+                    cart_item.quantity += quantity
+                    cart_item.save()
+
+                # Reservar el total del carrito para este producto (renueva el vencimiento)
+                reservation = reserve(request.user, product, cart_item.quantity)
+        except InsufficientStock as exc:
+            return Response(exc.failures[0], status=status.HTTP_409_CONFLICT)
         
         serializer = CartItemSerializer(cart_item)
         return Response({
             "message": "Producto agregado al carrito",
             "cart_item": serializer.data,
+            "reserved_until": reservation.expires_at,
             "created": created
         }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def list(self, request):
+        """GET /api/cart/ — Items del carrito con su reserva y el disponible actual"""
+        cart_items = list(CartItem.objects.filter(user=request.user).select_related('product'))
+        product_ids = [item.product_id for item in cart_items]
+        available = available_to_sell(product_ids, exclude_user=request.user)
+        reserved_until = dict(
+            live_reservations().filter(user=request.user, product_id__in=product_ids)
+            .values_list('product_id', 'expires_at')
+        )
+        items = []
+        for cart_item, data in zip(cart_items, CartItemSerializer(cart_items, many=True).data):
+            data['available'] = available.get(cart_item.product_id, 0)
+            data['reserved_until'] = reserved_until.get(cart_item.product_id)
+            items.append(data)
+        return Response({"items": items, "total": sum(item['subtotal'] for item in items)})
+
+    @action(detail=False, methods=['post'])
+    def remove(self, request):
+        """POST /api/cart/remove/ — Quitar un producto del carrito y liberar su reserva"""
+        product_id = request.data.get('product_id')
+        if not product_id:
+            return Response(
+                {"error": "product_id es requerido"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with transaction.atomic():
+            deleted, _ = CartItem.objects.filter(user=request.user, product_id=product_id).delete()
+            release(request.user, [product_id])
+        if not deleted:
+            return Response(
+                {"error": "El producto no está en el carrito"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({"message": "Producto quitado del carrito"})
     
     @action(detail=False, methods=['post'])
     def checkout(self, request):
@@ -398,60 +891,48 @@ class CartViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # branch opcional: sucursal preferida para despachar
+        strategy = None
+        preferred_branch = request.data.get('branch')
+        if preferred_branch:
+            try:
+                strategy = get_strategy('preferred_branch', branch_ids=[int(preferred_branch)])
+            except (ValueError, TypeError):
+                return Response(
+                    {"error": "branch debe ser un número entero"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
         try:
-            total = 0
-            order_items_data = []
-            
-            # Procesar cada item del carrito
-            for cart_item in cart_items:
-                product = cart_item.product
-                quantity = cart_item.quantity
-                price = product.price
-                subtotal = price * quantity
-                
-                order_items_data.append({
-                    "product_id": product.id,
-                    "quantity": quantity,
-                    "price": price,
-                    "subtotal": subtotal
-                })
-                
-                total += subtotal
-            
-            # Crear Order
-            order = Order.objects.create(
-                user=request.user,
-                customer_name=request.user.get_full_name() or request.user.username,
-                customer_email=request.user.email,
-                status='pending',
-                total=total
-            )
-            
-            # Crear OrderItems
-            for item_data in order_items_data:
-                OrderItem.objects.create(
-                    order=order,
-                    product_id=item_data['product_id'],
-                    quantity=item_data['quantity'],
-                    price=item_data['price']
+            with transaction.atomic():
+                order = place_order(
+                    cart_items.values_list('product_id', 'quantity'),
+                    strategy=strategy,
+                    user=request.user,
+                    customer_name=request.user.get_full_name() or request.user.username,
+                    customer_email=request.user.email,
+                    status='pending',
                 )
-            
-            # Vaciar carrito del usuario
-            cart_items.delete()
-            
-            order_serializer = OrderSerializer(order)
-            return Response({
-                "message": "Orden creada exitosamente",
-                "order": order_serializer.data,
-                "total": total
-            }, status=status.HTTP_201_CREATED)
-            
+                # Vaciar carrito del usuario
+                cart_items.delete()
+        except InsufficientStock as exc:
+            return Response(
+                {"error": "Stock insuficiente", "items": exc.failures},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 {"error": f"Error al procesar la orden: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        order_serializer = OrderSerializer(order)
+        return Response({
+            "message": "Orden creada exitosamente",
+            "order": order_serializer.data,
+            "total": order.total
+        }, status=status.HTTP_201_CREATED)
+
 # ==========================================
 #           VISTAS WEB (TEMPLATES)
 # ==========================================
@@ -463,9 +944,8 @@ def home_view(request):
 
 def company_login_view(request):
     """Paso 1: seleccionar la empresa antes del login de usuario."""
-    # Obtener todas las empresas únicas que tienen usuarios
-    companies = User.objects.values_list('company', flat=True).distinct().order_by('company')
-    companies = [c for c in companies if c]  # Filtrar valores None o vacíos
+    # Obtener todas las empresas (tenants) que tienen usuarios
+    companies = Tenant.objects.filter(users__isnull=False).distinct().order_by('name').values_list('name', flat=True)
     
     if request.method == 'POST':
         company = request.POST.get('company', '').strip()
@@ -475,12 +955,14 @@ def company_login_view(request):
             return redirect('company_login')
 
         # Validamos que exista al menos un usuario asociado a la empresa
-        if not User.objects.filter(company__iexact=company).exists():
+        tenant = Tenant.objects.filter(code=normalize_company(company), users__isnull=False).first()
+        if not tenant:
             messages.error(request, "No existe ninguna cuenta asociada a esa empresa.")
             return redirect('company_login')
 
         # Guardamos la empresa seleccionada en sesión para usarla en el login de usuario
-        request.session['selected_company'] = company
+        request.session['selected_company'] = tenant.name
+        request.session['selected_tenant'] = tenant.id
         messages.success(request, f"Empresa '{company}' seleccionada. Ahora inicia sesión con tu usuario.")
         return redirect('login')
 
@@ -490,7 +972,8 @@ def company_login_view(request):
 def login_view(request):
     """Paso 2: login de usuario validando que pertenezca a la empresa elegida."""
     selected_company = request.session.get('selected_company')
-    if not selected_company:
+    selected_tenant = request.session.get('selected_tenant')
+    if not selected_company or not selected_tenant:
         return redirect('company_login')
 
     if request.method == 'POST':
@@ -499,12 +982,12 @@ def login_view(request):
             user = form.get_user()
 
             # Validar que el usuario pertenezca a la empresa elegida
-            if not user.company or user.company.lower() != selected_company.lower():
+            if user.tenant_id != selected_tenant:
                 messages.error(request, "El usuario no pertenece a la empresa seleccionada.")
                 return redirect('login')
 
             # Restringir super_admin solo a la empresa temucosoft
-            if user.role == 'super_admin' and selected_company.lower() != 'temucosoft':
+            if user.role == 'super_admin' and normalize_company(selected_company) != 'temucosoft':
                 messages.error(request, "El rol super_admin solo puede usarse con la empresa 'temucosoft'.")
                 return redirect('login')
 
@@ -535,13 +1018,15 @@ def logout_view(request):
         logout(request)
 
     # Limpiar la empresa seleccionada
-    if 'selected_company' in request.session:
-        del request.session['selected_company']
+    for key in ('selected_company', 'selected_tenant'):
+        if key in request.session:
+            del request.session[key]
     
     # Redirige a la página de login (la cual es un template limpio)
     return redirect('company_login')
 
 
+@query_budget(5)
 @login_required
 def product_list_view(request):
     # Super admin no gestiona productos (solo gestiona clientes/tenants)
@@ -549,13 +1034,10 @@ def product_list_view(request):
         messages.error(request, "Como super admin, gestiona clientes y suscripciones, no productos.")
         return redirect('subscription_list')
     
-    if request.user.is_superuser:
-        products = Product.objects.all().select_related('supplier').annotate(total_stock=Sum('inventory__stock'))
-    else:
-        products = Product.objects.filter(
-            inventory__branch__company=request.user.company
-        ).distinct().select_related('supplier').annotate(total_stock=Sum('inventory__stock'))
-    
+    # Cacheado por tenant y rol; se invalida al cambiar productos, inventario o proveedores
+    products = cached_product_list(
+        request.user.tenant_id, request.user.role, all_tenants=request.user.is_superuser,
+    )
     return render(request, 'core/product_list.html', {'products': products})
 
 
@@ -566,42 +1048,17 @@ def pos_view(request):
         messages.error(request, "No tiene acceso al POS.")
         return redirect('subscription_list' if request.user.role == 'super_admin' else 'product_list')
 
-    # super_admin y superusuarios ven todo; otros solo productos de su empresa
-    if request.user.is_superuser or request.user.role == 'super_admin':
-        products_data = Product.objects.all()
-    else:
-        products_data = Product.objects.filter(
-            inventory__branch__company=request.user.company
-        ).distinct()
-    
-    products_list = []
-    for p in products_data:
-        products_list.append({
-            'id': p.id,
-            'sku': p.sku,
-            'name': p.name,
-            'price': int(p.price),
-        })
-
-    # super_admin y superusuarios ven todas las sucursales; otros ven solo su empresa
+    # El catálogo (productos y stock) lo descarga el POS desde /api/pos/catalog/
+    # y lo mantiene al día con deltas; la página sólo lleva las sucursales
     if request.user.is_superuser or request.user.role == 'super_admin':
         branches = Branch.objects.all()
-        inventory_qs = Inventory.objects.select_related('branch', 'product')
     else:
-        branches = Branch.objects.filter(company=request.user.company)
-        inventory_qs = Inventory.objects.select_related('branch', 'product').filter(branch__company=request.user.company)
-    
-    # Mapa producto -> {branch_id: stock} para validar y mostrar stock en POS
-    inventory_map = {}
-    for inv in inventory_qs:
-        if inv.product_id not in inventory_map:
-            inventory_map[inv.product_id] = {}
-        inventory_map[inv.product_id][inv.branch_id] = inv.stock
-    
+        branches = Branch.objects.for_tenant(request.user.tenant_id)
+
     context = {
-        'products_json': json.dumps(products_list, default=str),
-        'inventory_json': json.dumps(inventory_map, default=str),
-        'branches': branches
+        'branches': branches,
+        'catalog_key': f"pos_catalog_{request.user.tenant_id or 'all'}",
+        'max_batch_size': MAX_BATCH_SIZE,
     }
     return render(request, 'core/pos.html', context)
 
@@ -617,7 +1074,7 @@ def user_list_view(request):
     if request.user.is_superuser or request.user.role == 'super_admin':
         users = User.objects.all().order_by('username')
     else:
-        users = User.objects.filter(company=request.user.company).order_by('username')
+        users = User.objects.filter(tenant_id=request.user.tenant_id).order_by('username')
     
     return render(request, 'core/user_list.html', {'users': users})
 
@@ -658,11 +1115,14 @@ def product_create_view(request):
                 price=float(price),
                 cost=float(cost),
                 description=description,
-                supplier=supplier
+                supplier=supplier,
+                tenant=request.user.tenant
             )
             
-            # Crear registros de inventario para todas las sucursales con stock 0
+            # Crear registros de inventario para las sucursales de la empresa con stock 0
             branches = Branch.objects.all()
+            if request.user.tenant_id:
+                branches = branches.for_tenant(request.user.tenant_id)
             for branch in branches:
                 Inventory.objects.create(
                     product=product,
@@ -790,9 +1250,7 @@ def user_create_view(request):
     # Obtener lista de empresas únicas para super_admin
     companies = []
     if request.user.role == 'super_admin':
-        companies_users = User.objects.exclude(company__isnull=True).exclude(company='').values_list('company', flat=True)
-        companies_subs = Subscription.objects.exclude(company__isnull=True).exclude(company='').values_list('company', flat=True)
-        companies = sorted(set(companies_users) | set(companies_subs))
+        companies = list(Tenant.objects.order_by('name').values_list('name', flat=True))
     
     return render(request, 'core/user_form.html', {
         'mode': 'create',
@@ -810,7 +1268,7 @@ def user_edit_view(request, user_id):
         return redirect('home')
     
     # admin_cliente solo puede editar usuarios de su empresa
-    if not request.user.is_superuser and request.user.role == 'admin_cliente' and user_obj.company != request.user.company:
+    if not request.user.is_superuser and request.user.role == 'admin_cliente' and user_obj.tenant_id != request.user.tenant_id:
         messages.error(request, "No puede editar usuarios de otra empresa.")
         return redirect('user_list')
     
@@ -878,9 +1336,9 @@ def inventory_view(request):
     branches = Branch.objects.all()
     
     # Filtrar por empresa si no es super_admin ni superuser
-    if not request.user.is_superuser and request.user.role != 'super_admin' and request.user.company:
-        branches = branches.filter(company=request.user.company)
-        inventory = inventory.filter(branch__company=request.user.company)
+    if not request.user.is_superuser and request.user.role != 'super_admin' and request.user.tenant_id:
+        branches = branches.for_tenant(request.user.tenant_id)
+        inventory = inventory.for_tenant(request.user.tenant_id)
     
     if branch_id:
         inventory = inventory.filter(branch_id=branch_id)
@@ -905,8 +1363,14 @@ def inventory_edit_view(request, inventory_id):
         new_stock = request.POST.get('stock')
         if new_stock is not None:
             try:
-                inv.stock = int(new_stock)
-                inv.save()
+                with transaction.atomic():
+                    before = (
+                        Inventory.objects.select_for_update().filter(pk=inv.pk)
+                        .values_list('branch_id', 'product_id', 'stock').get()
+                    )
+                    inv.stock = int(new_stock)
+                    inv.save()
+                    record_stock_change(before, inv, user=request.user)
                 messages.success(request, f"Stock actualizado para {inv.product.name}.")
                 return redirect('inventory')
             except Exception as e:
@@ -930,7 +1394,7 @@ def branch_list_view(request):
     if request.user.is_superuser:
         branches = Branch.objects.all()
     else:
-        branches = Branch.objects.filter(company=request.user.company)
+        branches = Branch.objects.for_tenant(request.user.tenant_id)
     
     return render(request, 'core/branch_list.html', {'branches': branches})
 
@@ -955,7 +1419,8 @@ def branch_create_view(request):
             Branch.objects.create(
                 name=name,
                 address=address,
-                phone=phone
+                phone=phone,
+                company=request.user.company
             )
             messages.success(request, f"Sucursal '{name}' creada exitosamente.")
             return redirect('branch_list')
@@ -1125,8 +1590,8 @@ def sales_list_view(request):
     sales = Sale.objects.select_related('branch', 'user').prefetch_related('items__product').order_by('-created_at')
     
     # Filtrar por empresa si no es super_admin ni superuser
-    if not request.user.is_superuser and request.user.role != 'super_admin' and request.user.company:
-        sales = sales.filter(branch__company=request.user.company)
+    if not request.user.is_superuser and request.user.role != 'super_admin' and request.user.tenant_id:
+        sales = sales.for_tenant(request.user.tenant_id)
     
     # Obtener compras e-commerce
     orders = Order.objects.prefetch_related('items__product').order_by('-created_at')
@@ -1147,8 +1612,8 @@ def sales_list_view(request):
                 messages.warning(request, "La fecha 'desde' no puede ser mayor a hoy.")
                 date_from = None
             else:
-                sales = sales.filter(created_at__date__gte=date_from)
-                orders = orders.filter(created_at__date__gte=date_from)
+                sales = sales.filter(date_range_q('created_at', date_from=date_from_parsed))
+                orders = orders.filter(date_range_q('created_at', date_from=date_from_parsed))
         except ValueError:
             messages.warning(request, "Formato de fecha 'desde' inválido.")
             date_from = None
@@ -1161,8 +1626,8 @@ def sales_list_view(request):
                 messages.warning(request, "La fecha 'hasta' no puede ser mayor a hoy.")
                 date_to = None
             else:
-                sales = sales.filter(created_at__date__lte=date_to)
-                orders = orders.filter(created_at__date__lte=date_to)
+                sales = sales.filter(date_range_q('created_at', date_to=date_to_parsed))
+                orders = orders.filter(date_range_q('created_at', date_to=date_to_parsed))
         except ValueError:
             messages.warning(request, "Formato de fecha 'hasta' inválido.")
             date_to = None
@@ -1174,7 +1639,7 @@ def sales_list_view(request):
     if request.user.is_superuser or request.user.role == 'super_admin':
         branches = Branch.objects.all()
     else:
-        branches = Branch.objects.filter(company=request.user.company)
+        branches = Branch.objects.for_tenant(request.user.tenant_id)
     
     return render(request, 'core/sales_list.html', {
         'sales': sales,
@@ -1209,31 +1674,41 @@ def stock_report_view(request):
     branches = Branch.objects.all()
     
     # Filtrar por empresa si no es super_admin ni superuser
-    if not request.user.is_superuser and request.user.role != 'super_admin' and request.user.company:
-        branches = branches.filter(company=request.user.company)
+    if not request.user.is_superuser and request.user.role != 'super_admin' and request.user.tenant_id:
+        branches = branches.for_tenant(request.user.tenant_id)
     
     if branch_id:
         selected_branches = branches.filter(id=branch_id)
     else:
         selected_branches = branches
     
-    report_data = []
-    for branch in selected_branches:
-        inventory = Inventory.objects.filter(branch=branch).select_related('product')
-        total_units = sum(inv.stock for inv in inventory)
-        total_value = sum(inv.stock * inv.product.price for inv in inventory)
-        
-        report_data.append({
+    # Totales por sucursal en una sola query; el detalle sólo se carga si se pide
+    detail = request.GET.get('detail') == '1'
+    report_data = [
+        {
             'branch': branch,
-            'inventory': inventory,
-            'total_units': total_units,
-            'total_value': total_value,
-        })
+            'inventory': [],
+            'total_items': branch.total_items,
+            'total_units': branch.total_units,
+            'total_value': branch.total_value,
+        }
+        for branch in branch_stock_summary(selected_branches)
+    ]
+    if detail:
+        by_branch = {data['branch'].id: data['inventory'] for data in report_data}
+        inventory = (
+            Inventory.objects.filter(branch__in=selected_branches)
+            .select_related('product')
+            .order_by('branch_id', 'product__name')
+        )
+        for inv in inventory.iterator(chunk_size=2000):
+            by_branch[inv.branch_id].append(inv)
     
     return render(request, 'core/stock_report.html', {
         'report_data': report_data,
         'branches': branches,
         'selected_branch': branch_id,
+        'detail': detail,
     })
 
 
@@ -1246,11 +1721,11 @@ def subscription_view(request):
         return redirect('home')
     
     # Obtener suscripción activa de la empresa del usuario
-    if not request.user.company:
+    if not request.user.tenant_id:
         messages.error(request, "No tienes una empresa asignada.")
         return redirect('home')
     
-    subscription = Subscription.objects.filter(company=request.user.company, active=True).first()
+    subscription = Subscription.objects.for_tenant(request.user.tenant_id).filter(active=True).first()
     
     # admin_cliente ve su suscripción pero no puede gestionarla
     # super_admin puede gestionar todas
@@ -1281,7 +1756,8 @@ def subscription_create_view(request):
         
         try:
             # Desactivar suscripción anterior de la empresa si existe
-            Subscription.objects.filter(company=company).update(active=False)
+            tenant = Tenant.objects.resolve(company)
+            Subscription.objects.for_tenant(tenant.id).update(active=False)
             
             # Crear nueva suscripción
             subscription = Subscription.objects.create(
@@ -1300,7 +1776,7 @@ def subscription_create_view(request):
             messages.error(request, f"Error: {str(e)}")
     
     # GET: mostrar formulario
-    companies = User.objects.filter(company__isnull=False).values_list('company', flat=True).distinct().order_by('company')
+    companies = Tenant.objects.order_by('name').values_list('name', flat=True)
     plans = Subscription.PLANS
     
     return render(request, 'core/subscription_form.html', {
@@ -1350,7 +1826,7 @@ def subscription_edit_view(request, subscription_id):
         except Exception as e:
             messages.error(request, f"Error: {str(e)}")
     
-    companies = User.objects.filter(company__isnull=False).values_list('company', flat=True).distinct().order_by('company')
+    companies = Tenant.objects.order_by('name').values_list('name', flat=True)
     plans = Subscription.PLANS
     
     return render(request, 'core/subscription_form.html', {
@@ -1393,58 +1869,26 @@ def checkout_view(request):
                 customer_email = request.user.email
         
         try:
-            # Crear pedido (user puede ser None para anónimos)
-            order = Order.objects.create(
+            lines = [(int(item['product_id']), int(item['quantity'])) for item in cart_data]
+            if any(quantity < 1 for _, quantity in lines):
+                raise ValueError("Cantidad inválida en el carrito")
+            # Crear pedido (user puede ser None para anónimos) repartiendo el stock
+            # entre sucursales; si algo no alcanza no se descuenta nada
+            place_order(
+                lines,
                 user=request.user if request.user.is_authenticated else None,
                 customer_name=customer_name,
                 customer_email=customer_email,
                 status='paid',  # Se marca como pagada al completar checkout
             )
-            
-            total = 0
-            for item in cart_data:
-                product = Product.objects.get(id=item['product_id'])
-                quantity = int(item['quantity'])
-                price = product.price
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price=price
-                )
-                
-                # Descontar stock de todas las sucursales (para compras online)
-                # Se descuenta proporcionalmente o de la primera disponible
-                inventories = Inventory.objects.filter(product=product).order_by('branch')
-                remaining_quantity = quantity
-                
-                for inventory in inventories:
-                    if remaining_quantity <= 0:
-                        break
-                    
-                    if inventory.stock >= remaining_quantity:
-                        inventory.stock -= remaining_quantity
-                        inventory.save()
-                        remaining_quantity = 0
-                    else:
-                        remaining_quantity -= inventory.stock
-                        inventory.stock = 0
-                        inventory.save()
-                
-                if remaining_quantity > 0:
-                    order.delete()
-                    messages.error(request, f"Stock insuficiente de {product.name}")
-                    return redirect('cart')
-                
-                total += price * quantity
-            
-            order.total = total
-            order.save()
-            
+
             messages.success(request, "Compra realizada correctamente.")
             return redirect('home')
-            
+
+        except InsufficientStock as exc:
+            for failure in exc.failures:
+                messages.error(request, failure['error'])
+            return redirect('cart')
         except Exception as e:
             messages.error(request, f"Error al procesar pedido: {str(e)}")
             return redirect('cart')
@@ -1455,11 +1899,11 @@ def checkout_view(request):
 @login_required
 def plan_status_view(request):
     """Vista para mostrar el estado del plan de la empresa"""
-    if not request.user.company:
+    if not request.user.tenant_id:
         messages.error(request, "No tienes una empresa asignada.")
         return redirect('home')
     
-    subscription = Subscription.objects.filter(company=request.user.company, active=True).first()
+    subscription = Subscription.objects.for_tenant(request.user.tenant_id).filter(active=True).first()
     
     plan_features = {}
     if subscription:
@@ -1476,11 +1920,11 @@ def plan_status_view(request):
 @login_required
 def plan_status_view(request):
     """Ver estado del plan de suscripción"""
-    if not request.user.company:
+    if not request.user.tenant_id:
         messages.error(request, "No tienes una empresa asignada.")
         return redirect('home')
     
-    subscription = Subscription.objects.filter(company=request.user.company, active=True).first()
+    subscription = Subscription.objects.for_tenant(request.user.tenant_id).filter(active=True).first()
     
     # Obtener características del plan
     plan_features = {}